@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""Time-to-full-viewport over HTTP/1.1 (Uvicorn) vs HTTP/2 (Hypercorn).
+
+Writes a synthetic sample whose `genes.bin` and `image.tif` stand in for the
+chunk and tile files. A "viewport" is the --requests byte ranges the viewer
+would fetch for one screen: random chunk ranges of 2-32 KiB plus 64 KiB tiles.
+Both backends serve it over TLS with the same self-signed certificate that
+`serve_samui` uses (`serve_directory(..., backend=...)`, non-blocking).
+
+The client behaves like a browser: over HTTP/1.1 at most six requests per
+origin are in flight (six connections), over HTTP/2 all of them are streams on
+one connection. Each request first waits --rtt-ms while holding its connection
+(HTTP/1.1) or stream slot (HTTP/2), modelling the network round trip that the
+per-origin connection cap makes expensive; use --rtt-ms 0 for raw local
+throughput. The time to full viewport is the wall time from the first request
+until every range has arrived, on a fresh client each time (TLS handshakes
+included); the fastest of --repeat runs is reported:
+
+  python benchmarks/bench_server.py --requests 300 --rtt-ms 20
+
+Needs httpx with HTTP/2 support and hypercorn: `pip install "httpx[http2]" hypercorn`.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import random
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from loopy.server import get_or_create_self_signed, serve_directory
+
+BROWSER_CONNECTIONS = 6  # per-origin HTTP/1.1 connection cap in Chrome and Firefox
+MAX_STREAMS = 100  # Hypercorn's default SETTINGS_MAX_CONCURRENT_STREAMS
+TILE_BYTES = 1 << 16
+
+
+def _sample(root: Path, chunk_mb: int, image_mb: int) -> Path:
+    sample = root / "bench"
+    sample.mkdir(parents=True)
+    (sample / "sample.json").write_text('{"name": "bench"}')
+    rng = random.Random(0)
+    (sample / "genes.bin").write_bytes(rng.randbytes(chunk_mb << 20))
+    (sample / "image.tif").write_bytes(rng.randbytes(image_mb << 20))
+    return sample
+
+
+def _viewport(sample: Path, n: int, seed: int = 0) -> list[tuple[str, int, int]]:
+    """(path, start, end) of `n` ranges: three quarters gene chunks, one quarter image tiles."""
+    rng = random.Random(seed)
+    chunks, image = (sample / "genes.bin").stat().st_size, (sample / "image.tif").stat().st_size
+    ranges = []
+    for i in range(n):
+        if i % 4 == 3:
+            start = rng.randrange(image // TILE_BYTES) * TILE_BYTES
+            ranges.append(("/bench/image.tif", start, start + TILE_BYTES - 1))
+        else:
+            length = rng.randrange(2 << 10, 32 << 10)
+            start = rng.randrange(chunks - length)
+            ranges.append(("/bench/genes.bin", start, start + length - 1))
+    return ranges
+
+
+async def _load(url: str, ranges: list[tuple[str, int, int]], http2: bool, rtt: float) -> float:
+    import httpx
+
+    slots = asyncio.Semaphore(MAX_STREAMS if http2 else BROWSER_CONNECTIONS)
+    limits = httpx.Limits(max_connections=1 if http2 else BROWSER_CONNECTIONS)
+    client = httpx.AsyncClient(base_url=url, http1=not http2, http2=http2, verify=False, limits=limits)
+    async with client as c:
+
+        async def fetch(path: str, start: int, end: int) -> None:
+            async with slots:
+                await asyncio.sleep(rtt)
+                r = await c.get(path, headers={"Range": f"bytes={start}-{end}"})
+                if r.status_code != 206 or len(r.content) != end - start + 1:
+                    raise RuntimeError(f"{path} {start}-{end}: HTTP {r.status_code}, {len(r.content)} bytes")
+                if r.http_version != ("HTTP/2" if http2 else "HTTP/1.1"):
+                    raise RuntimeError(f"expected {'HTTP/2' if http2 else 'HTTP/1.1'}, got {r.http_version}")
+
+        start = time.perf_counter()
+        await asyncio.gather(*(fetch(*r) for r in ranges))
+        return time.perf_counter() - start
+
+
+def run(args: argparse.Namespace) -> dict[str, Any]:
+    tmp = Path(tempfile.mkdtemp(prefix="loopy-bench-server-"))
+    root = tmp / "www"  # served; the certificate lives beside it, not in it
+    try:
+        sample = _sample(root, args.chunk_mb, args.image_mb)
+        ranges = _viewport(sample, args.requests)
+        total = sum(end - start + 1 for _, start, end in ranges)
+        print(f"viewport: {len(ranges)} ranges, {total / 2**20:.1f} MiB, rtt {args.rtt_ms} ms")
+        cert, key = get_or_create_self_signed(args.host, ssl_dir=tmp / "ssl")
+        results = {}
+        for backend, http2 in (("uvicorn", False), ("hypercorn", True)):
+            handle = serve_directory(
+                root,
+                host=args.host,
+                port=args.port,
+                open_browser=False,
+                block=False,
+                ssl_certfile=cert,
+                ssl_keyfile=key,
+                backend=backend,
+            )
+            assert handle is not None
+            try:
+                rtt = args.rtt_ms / 1000
+                runs = [asyncio.run(_load(handle.url, ranges, http2, rtt)) for _ in range(args.repeat)]
+            finally:
+                handle.stop()
+            label = "HTTP/2 (hypercorn)" if http2 else "HTTP/1.1 (uvicorn)"
+            results[label] = min(runs)
+            all_ms = ", ".join(f"{r * 1000:.0f}" for r in runs)
+            print(f"  {label:<20} {min(runs) * 1000:8.1f} ms  (runs: {all_ms})")
+        h1, h2 = results.values()
+        print(f"  HTTP/2 speedup: {h1 / h2:.2f}x")
+        return results
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--requests", type=int, default=300, help="byte ranges in one viewport")
+    p.add_argument("--rtt-ms", type=float, default=20.0, help="simulated round trip per request")
+    p.add_argument("--repeat", type=int, default=3, help="viewport loads per backend; the fastest is kept")
+    p.add_argument("--chunk-mb", type=int, default=64, help="size of the synthetic genes.bin")
+    p.add_argument("--image-mb", type=int, default=64, help="size of the synthetic image.tif")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    logging.getLogger("httpx").setLevel(logging.WARNING)  # one line per request otherwise
+    run(p.parse_args())
+
+
+if __name__ == "__main__":
+    main()
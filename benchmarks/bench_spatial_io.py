@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""End-to-end throughput benchmark for `loopy.spatial_io`: read + build_sample.
+
+For every (format, cells, genes) case, generates a platform-shaped synthetic
+input once (cached under --data-dir; see `synthetic.py`). It then runs the
+`preprocess` pipeline on it (`run_one`: reader, overrides, `build_sample`) in a
+fresh process, so peak RSS is per case. Each case is repeated --repeat times
+and its fastest run kept. Timings come from the `profile.json` that the run
+writes (see `loopy.profiling`); "read" is its "reader I/O" stage and "build" is
+the rest.
+
+Results go to --results/<commit>.json. With --compare, each case is checked
+against an earlier results file, and the script exits 1 if any case got slower
+by more than --threshold:
+
+  python benchmarks/bench_spatial_io.py --cells 10000 100000 --genes 500
+  python benchmarks/bench_spatial_io.py --compare benchmarks/results/<base>.json
+
+The default grid (all formats, 10k/100k/1M cells, 500/5k genes) takes hours and
+tens of GB; select a subset with --formats/--cells/--genes. CosMx cases whose
+dense expression CSV would exceed --dense-limit values are skipped.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from synthetic import MAKERS
+
+HERE = Path(__file__).resolve().parent
+
+
+def _commit() -> tuple[str, bool]:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=HERE, capture_output=True, text=True).stdout.strip()
+
+    return git("rev-parse", "--short", "HEAD") or "unknown", bool(git("status", "--porcelain", "--", "loopy"))
+
+
+def _case_name(fmt: str, n_cells: int, n_genes: int) -> str:
+    return f"{fmt}-{n_cells}x{n_genes}"
+
+
+def _input(fmt: str, n_cells: int, n_genes: int, density: float, data_dir: Path) -> Path:
+    """Generate the case's input under `data_dir` (once) and return the reader's path."""
+    root = data_dir / _case_name(fmt, n_cells, n_genes)
+    done = root / ".complete"
+    if not done.exists():
+        shutil.rmtree(root, ignore_errors=True)
+        start = time.perf_counter()
+        path = MAKERS[fmt](root, n_cells, n_genes, density)
+        done.write_text(path.name)
+        print(f"  generated {root.name} in {time.perf_counter() - start:.1f} s")
+    return root / done.read_text() if fmt == "spatialdata" else root
+
+
+def _run_case(fmt: str, path: Path, outdir: Path) -> dict[str, Any]:
+    """Run the preprocess pipeline on one input (in a worker process); return its profile."""
+    from loopy.profiling import PROFILE_FILE
+    from loopy.spatial_io.preprocess import _parser, run_one
+
+    source = ["--zarr", str(path)] if fmt == "spatialdata" else ["--folder", str(path)]
+    args = _parser().parse_args(
+        ["--format", fmt, "--outdir", str(outdir), "--sample-name", "bench", *source]
+    )
+    run_one(args)
+    profile = json.loads((outdir / "bench" / PROFILE_FILE).read_text())
+    profile["output_bytes"] = sum(f.stat().st_size for f in (outdir / "bench").iterdir())
+    return profile
+
+
+def run(args: argparse.Namespace) -> list[dict[str, Any]]:
+    cases = []
+    for fmt in args.formats:
+        for n_cells in args.cells:
+            for n_genes in args.genes:
+                name = _case_name(fmt, n_cells, n_genes)
+                if fmt == "cosmx" and n_cells * n_genes > args.dense_limit:
+                    print(f"{name}: skipped (dense exprMat over --dense-limit)")
+                    continue
+                print(f"{name}:")
+                path = _input(fmt, n_cells, n_genes, args.density, args.data_dir)
+                runs = []
+                for _ in range(args.repeat):
+                    outdir = args.data_dir / "out" / name
+                    shutil.rmtree(outdir, ignore_errors=True)
+                    with ProcessPoolExecutor(max_workers=1) as pool:
+                        runs.append(pool.submit(_run_case, fmt, path, outdir).result())
+                best = min(runs, key=lambda p: p["wall_s"])
+                read_s = next((s["wall_s"] for s in best["stages"] if s["stage"] == "reader I/O"), 0.0)
+                cases.append(
+                    {
+                        "case": name,
+                        "format": fmt,
+                        "cells": n_cells,
+                        "genes": n_genes,
+                        "total_s": best["wall_s"],
+                        "read_s": read_s,
+                        "build_s": round(best["wall_s"] - read_s, 4),
+                        "peak_rss_mb": best["peak_rss_mb"],
+                        "output_bytes": best["output_bytes"],
+                        "runs_s": [p["wall_s"] for p in runs],
+                        "stages": best["stages"],
+                    }
+                )
+                c = cases[-1]
+                print(f"  total {c['total_s']:.2f} s (read {c['read_s']:.2f} s, build {c['build_s']:.2f} s)")
+    return cases
+
+
+def compare(cases: list[dict[str, Any]], base_path: Path, threshold: float) -> bool:
+    """Print each case's time relative to `base_path`; return False on a regression."""
+    base = {c["case"]: c for c in json.loads(base_path.read_text())["cases"]}
+    ok = True
+    width = max([len("case"), *(len(c["case"]) for c in cases)])
+    print(f"\ncompared to {base_path.name}:")
+    print(f"{'case':<{width}}  {'base s':>8}  {'now s':>8}  {'ratio':>6}")
+    for c in cases:
+        if c["case"] not in base:
+            print(f"{c['case']:<{width}}  {'-':>8}  {c['total_s']:>8.2f}")
+            continue
+        before = base[c["case"]]["total_s"]
+        ratio = c["total_s"] / max(before, 1e-9)
+        flag = "  REGRESSION" if ratio > threshold else ""
+        ok &= ratio <= threshold
+        print(f"{c['case']:<{width}}  {before:>8.2f}  {c['total_s']:>8.2f}  {ratio:>6.2f}{flag}")
+    return ok
+
+
+def main() -> None:
+    p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    p.add_argument("--formats", nargs="+", choices=list(MAKERS), default=list(MAKERS))
+    p.add_argument("--cells", nargs="+", type=int, default=[10_000, 100_000, 1_000_000])
+    p.add_argument("--genes", nargs="+", type=int, default=[500, 5_000])
+    p.add_argument("--density", type=float, default=0.05, help="fraction of nonzero counts")
+    p.add_argument("--repeat", type=int, default=1, help="runs per case; the fastest is kept")
+    p.add_argument("--dense-limit", type=float, default=2e8, help="max cells x genes for CosMx's dense CSV")
+    p.add_argument("--data-dir", type=Path, default=HERE / ".data", help="cache of generated inputs")
+    p.add_argument("--results", type=Path, default=HERE / "results")
+    p.add_argument("--compare", type=Path, help="earlier results file to check for regressions")
+    p.add_argument("--threshold", type=float, default=1.2, help="slowdown ratio counted as a regression")
+    args = p.parse_args()
+
+    commit, dirty = _commit()
+    cases = run(args)
+    args.results.mkdir(parents=True, exist_ok=True)
+    out = args.results / f"{commit}{'-dirty' if dirty else ''}.json"
+    out.write_text(
+        json.dumps(
+            {
+                "commit": commit,
+                "dirty": dirty,
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "density": args.density,
+                "cases": cases,
+            },
+            indent=2,
+        )
+    )
+    print(f"\nresults written to {out}")
+    if args.compare and not compare(cases, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+"""Platform-shaped synthetic inputs for the `loopy.spatial_io` benchmarks.
+
+Each `make_<format>(root, n_cells, n_genes, density, seed)` writes a directory
+that the matching reader accepts, with the file layout and column names of the
+real platform output (see the readers' docstrings) and random sparse counts at
+`density`. Files are written directly (h5py / pyarrow / spatialdata) without
+going through pandas where the real data is large, so the 1M-cell cases can be
+generated in a reasonable time.
+
+`make_cosmx` writes the dense `exprMat` CSV the platform exports, so its size is
+n_cells x n_genes regardless of density (the runner caps it with --dense-limit).
+"""
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csc_matrix
+
+N_CONTROLS = 10  # negative-control probes mixed into the panel (filtered by the readers)
+PIXEL_SIZE = 0.2125  # microns/px (Xenium)
+HD_BIN_UM = 16
+HD_MICRONS_PER_PIXEL = 0.2738
+
+
+def random_counts(n_obs: int, n_features: int, density: float, rng: np.random.Generator) -> csc_matrix:
+    """Random observations x features counts with about `density` nonzeros, as CSC."""
+    nnz = int(n_obs * n_features * density)
+    keys = np.unique(rng.integers(0, n_obs * n_features, size=nnz, dtype=np.int64))
+    rows, cols = keys % n_obs, keys // n_obs  # sorted by column, then row
+    data = (1 + rng.poisson(2.0, size=len(keys))).astype(np.int32)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(cols, minlength=n_features))])
+    return csc_matrix((data, rows.astype(np.int32), indptr), shape=(n_obs, n_features))
+
+
+def feature_names(n_genes: int) -> tuple[list[str], list[str]]:
+    """Gene names plus trailing control probes, and their 10x feature types."""
+    names = [f"gene_{i}" for i in range(n_genes)] + [f"NegControlProbe_{i}" for i in range(N_CONTROLS)]
+    types = ["Gene Expression"] * n_genes + ["Negative Control Probe"] * N_CONTROLS
+    return names, types
+
+
+def write_10x_h5(
+    path: Path, counts: csc_matrix, barcodes: list[str], names: list[str], types: list[str]
+) -> None:
+    """Write `counts` (observations x features) as a 10x HDF5 matrix (features x observations, CSC)."""
+    import h5py
+
+    csr = counts.tocsr()  # rows of obs x features == columns of features x obs
+    with h5py.File(path, "w") as f:
+        g = f.create_group("matrix")
+        g.create_dataset("data", data=csr.data, compression="gzip", compression_opts=1)
+        g.create_dataset("indices", data=csr.indices, compression="gzip", compression_opts=1)
+        g["indptr"] = csr.indptr.astype(np.int64)
+        g["shape"] = np.array([counts.shape[1], counts.shape[0]], dtype=np.int32)
+        g["barcodes"] = np.array(barcodes, dtype="S")
+        feats = g.create_group("features")
+        feats["id"] = np.array(names, dtype="S")
+        feats["name"] = np.array(names, dtype="S")
+        feats["feature_type"] = np.array(types, dtype="S")
+
+
+def _clusters(path: Path, barcodes: list[str], rng: np.random.Generator) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    pd.DataFrame({"Barcode": barcodes, "Cluster": rng.integers(1, 12, len(barcodes))}).to_csv(
+        path / "clusters.csv", index=False
+    )
+
+
+def make_xenium(root: Path, n_cells: int, n_genes: int, density: float, seed: int = 0) -> Path:
+    rng = np.random.default_rng(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    ids = [f"cell{i:09d}" for i in range(n_cells)]
+    names, types = feature_names(n_genes)
+    counts = random_counts(n_cells, len(names), density, rng)
+
+    (root / "experiment.xenium").write_text(json.dumps({"pixel_size": PIXEL_SIZE}))
+    write_10x_h5(root / "cell_feature_matrix.h5", counts, ids, names, types)
+    total = np.asarray(counts.sum(axis=1)).ravel()
+    pd.DataFrame(
+        {
+            "cell_id": ids,
+            "x_centroid": rng.uniform(0, 10_000, n_cells),
+            "y_centroid": rng.uniform(0, 10_000, n_cells),
+            "transcript_counts": total,
+            "control_probe_counts": np.asarray(counts[:, n_genes:].sum(axis=1)).ravel(),
+            "total_counts": total,
+            "cell_area": rng.gamma(4.0, 20.0, n_cells),
+            "nucleus_area": rng.gamma(4.0, 8.0, n_cells),
+        }
+    ).to_parquet(root / "cells.parquet", index=False)
+    _clusters(root / "analysis" / "clustering" / "gene_expression_graphclust", ids, rng)
+    return root
+
+
+def make_visium_hd(root: Path, n_cells: int, n_genes: int, density: float, seed: int = 0) -> Path:
+    """`n_cells` in-tissue bins (plus 10% out-of-tissue positions) at the 16 µm bin size."""
+    rng = np.random.default_rng(seed)
+    bin_dir = root / "binned_outputs" / f"square_{HD_BIN_UM:03d}um"
+    (bin_dir / "spatial").mkdir(parents=True, exist_ok=True)
+    n_all = n_cells + n_cells // 10
+    side = int(np.ceil(np.sqrt(n_all)))
+    rows, cols = np.divmod(np.arange(n_all), side)
+    barcodes = [f"s_{HD_BIN_UM:03d}um_{r:05d}_{c:05d}-1" for r, c in zip(rows, cols)]
+    in_tissue = np.zeros(n_all, dtype=np.int32)
+    in_tissue[rng.choice(n_all, n_cells, replace=False)] = 1
+    pitch = HD_BIN_UM / HD_MICRONS_PER_PIXEL
+
+    pd.DataFrame(
+        {
+            "barcode": barcodes,
+            "in_tissue": in_tissue,
+            "array_row": rows,
+            "array_col": cols,
+            "pxl_row_in_fullres": rows * pitch,
+            "pxl_col_in_fullres": cols * pitch,
+        }
+    ).to_parquet(bin_dir / "spatial" / "tissue_positions.parquet", index=False)
+    (bin_dir / "spatial" / "scalefactors_json.json").write_text(
+        json.dumps({"microns_per_pixel": HD_MICRONS_PER_PIXEL, "spot_diameter_fullres": pitch})
+    )
+
+    tissue = [b for b, t in zip(barcodes, in_tissue) if t]
+    names, types = feature_names(n_genes)
+    write_10x_h5(
+        bin_dir / "filtered_feature_bc_matrix.h5",
+        random_counts(n_cells, len(names), density, rng),
+        tissue,
+        names,
+        types,
+    )
+    _clusters(bin_dir / "analysis" / "clustering" / "gene_expression_graphclust", tissue, rng)
+    return root
+
+
+def make_cosmx(root: Path, n_cells: int, n_genes: int, density: float, seed: int = 0) -> Path:
+    """Flat-file export: dense exprMat (fov, cell_ID, genes...) and per-cell metadata, both CSV."""
+    rng = np.random.default_rng(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    per_fov = 5_000
+    fov = np.arange(n_cells) // per_fov + 1
+    cell_id = np.arange(n_cells) % per_fov + 1
+    names = [f"gene_{i}" for i in range(n_genes)] + [f"NegPrb{i}" for i in range(N_CONTROLS)]
+    counts = random_counts(n_cells, len(names), density, rng)
+
+    # Write the dense matrix in row blocks so memory stays bounded.
+    with (root / "S1_exprMat_file.csv").open("w") as fh:
+        fh.write(",".join(["fov", "cell_ID", *names]) + "\n")
+        csr = counts.tocsr()
+        for start in range(0, n_cells, 10_000):
+            stop = min(start + 10_000, n_cells)
+            block = np.column_stack([fov[start:stop], cell_id[start:stop], csr[start:stop].toarray()])
+            np.savetxt(fh, block, fmt="%d", delimiter=",")
+
+    pd.DataFrame(
+        {
+            "fov": fov,
+            "cell_ID": cell_id,
+            "CenterX_global_px": rng.uniform(0, 50_000, n_cells),
+            "CenterY_global_px": rng.uniform(0, 50_000, n_cells),
+            "Area": rng.integers(500, 5_000, n_cells),
+            "Mean.DAPI": rng.uniform(0, 1_000, n_cells),
+        }
+    ).to_csv(root / "S1_metadata_file.csv", index=False)
+    return root
+
+
+def make_spatialdata(root: Path, n_cells: int, n_genes: int, density: float, seed: int = 0) -> Path:
+    """A `.zarr` store with one table (sparse X, obsm['spatial']) and a categorical obs column."""
+    import anndata as ad
+    import spatialdata as sd
+    from spatialdata.models import TableModel
+
+    rng = np.random.default_rng(seed)
+    root.mkdir(parents=True, exist_ok=True)
+    names, _ = feature_names(n_genes)
+    adata = ad.AnnData(
+        X=random_counts(n_cells, len(names), density, rng).tocsr().astype(np.float32),
+        obs=pd.DataFrame(
+            {"cell_type": pd.Categorical(rng.choice(list("ABCDEFGH"), n_cells))},
+            index=[f"cell{i}" for i in range(n_cells)],
+        ),
+        var=pd.DataFrame(index=names),
+        obsm={"spatial": rng.uniform(0, 10_000, (n_cells, 2))},
+    )
+    store = root / "sample.zarr"
+    sd.SpatialData(tables={"table": TableModel.parse(adata)}).write(store, overwrite=True)
+    return store
+
+
+MAKERS: dict[str, Callable[..., Path]] = {
+    "xenium": make_xenium,
+    "visium_hd": make_visium_hd,
+    "cosmx": make_cosmx,
+    "spatialdata": make_spatialdata,
+}
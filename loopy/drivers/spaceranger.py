@@ -1,54 +1,30 @@
 import json
 from pathlib import Path
 from shutil import copy
-from typing import Literal, cast
+from typing import TYPE_CHECKING, Literal, cast
 
 import numpy as np
 import pandas as pd
-from anndata import AnnData
-from scanpy import read_visium
+from anndata.utils import make_index_unique
 
+from loopy.feature import iter_csc_column_blocks
 from loopy.image import Colors
 from loopy.sample import Sample
+from loopy.spatial_io.common import GENE_EXPRESSION, read_10x_clusters, read_10x_h5_csc
+from loopy.spatial_io.visium import read_positions
 from loopy.utils.utils import Url
 
+if TYPE_CHECKING:
+    from anndata import AnnData
+
 #%% [markdown]
 
 # The directory contains spaceranger outputs.
 # The out directory contains folders of processed images and features.
 # These can be fed directly to "Add samples" in the Samui.
 
-analyses = {
-    "cluster_graph": "outs/analysis/clustering/graphclust/clusters.csv",
-    "kmeans2": "outs/analysis/clustering/kmeans_2_clusters/clusters.csv",
-    "kmeans3": "outs/analysis/clustering/kmeans_3_clusters/clusters.csv",
-    "kmeans4": "outs/analysis/clustering/kmeans_4_clusters/clusters.csv",
-    "kmeans5": "outs/analysis/clustering/kmeans_5_clusters/clusters.csv",
-    "kmeans6": "outs/analysis/clustering/kmeans_6_clusters/clusters.csv",
-    "kmeans7": "outs/analysis/clustering/kmeans_7_clusters/clusters.csv",
-    "kmeans8": "outs/analysis/clustering/kmeans_8_clusters/clusters.csv",
-    "kmeans9": "outs/analysis/clustering/kmeans_9_clusters/clusters.csv",
-    "kmeans10": "outs/analysis/clustering/kmeans_10_clusters/clusters.csv",
-}
-
-
-def better_visium(d: Path, features: dict[str, str]) -> AnnData:
-    """Need to include spaceranger analyses into the the AnnData object
-    to make sure that the indices match."""
-    vis = read_visium(d / "outs")
-    for k, v in features.items():
-        if not (d / v).exists():
-            continue
-        df = pd.read_csv(d / v, index_col=0)
-        if len(df.columns) == 1:
-            df.rename(columns={df.columns[0]: k}, inplace=True)
-        else:
-            df.rename(columns={c: f"{k}_{i}" for i, c in enumerate(df.columns, 1)}, inplace=True)
-        vis.obs = vis.obs.join(df, how="left")
-    return vis
-
-
-def gen_coords(vis: AnnData, path: Path | str) -> None:
+
+def gen_coords(vis: "AnnData", path: Path | str) -> None:
     spatial = cast(pd.DataFrame, vis.obsm["spatial"])
     coords = pd.DataFrame(
         spatial, columns=["x", "y"], index=pd.Series(vis.obs_names, name="id"), dtype="uint32"
@@ -65,26 +41,54 @@ def run_spaceranger(
     channels: list[str] | Literal["rgb"] | None = None,
     defaultChannels: dict[Colors, str] | None = None,
     spotDiam: float = 55e-6,
+    logTransform: bool = True,
 ) -> Sample:
-
+    """Convert the Space Ranger run at `path / name` into a Sample at `out / name`.
+
+    The filtered feature-barcode matrix is read as a sparse CSC matrix, restricted to
+    gene-expression features, log2(x+1)-transformed in place on its nonzeros and
+    streamed into the chunked-feature writer, so it is never densified. Spot
+    positions come from `spatial/tissue_positions*`, and 10x clusters (if present)
+    are added as a categorical feature.
+    """
+    outs = path / name / "outs"
     o = Path(out / name)
     o.mkdir(exist_ok=True, parents=True)
 
     # Count data
-    vis = better_visium(path / name, features=analyses)
-    vis.X.data = np.log2(vis.X.data + 1)  # type: ignore
-    vis.var_names_make_unique()
+    mat, barcodes, genes, ftype = read_10x_h5_csc(outs / "filtered_feature_bc_matrix.h5")
+    if ftype.notna().any():
+        keep = np.flatnonzero(ftype.to_numpy() == GENE_EXPRESSION)
+        mat, genes = mat[:, keep], [genes[i] for i in keep]
+    if logTransform:
+        data = mat.data.astype(np.float32, copy=False)
+        np.log1p(data, out=data)
+        data /= np.log(2)
+        mat.data = data
+    genes = make_index_unique(pd.Index(genes)).to_list()
+
+    positions = read_positions(outs / "spatial").set_index("barcode")
+    positions.index = positions.index.astype(str)
+    missing = barcodes.difference(positions.index)
+    if len(missing):
+        raise ValueError(f"{len(missing)} barcodes have no tissue position, e.g. {list(missing[:3])}")
+    spots = positions.loc[barcodes]
+    coords = pd.DataFrame(
+        {"x": spots["pxl_col_in_fullres"].to_numpy(), "y": spots["pxl_row_in_fullres"].to_numpy()},
+        index=pd.Series(barcodes, name="id"),
+        dtype="uint32",
+    )
 
     # Metadata
-    df = pd.read_csv(path / name / "outs" / "metrics_summary.csv")
+    df = pd.read_csv(outs / "metrics_summary.csv")
     metadata = "\n".join(
         f"{k}: {round(v, 3) if isinstance(v, float) else v}" for (k, v) in df.iloc[0].items()
     )
 
     Path(o / "metadata.md").write_text("```\n" + metadata + "\n```")
-    copy(Path(path / name / "outs" / "web_summary.html"), o / "web_summary.html")
+    copy(Path(outs / "web_summary.html"), o / "web_summary.html")
 
-    scales = json.loads((path / name / "outs" / "spatial" / "scalefactors_json.json").read_text())
+    scales = json.loads((outs / "spatial" / "scalefactors_json.json").read_text())
     mPerPx = 65e-6 / float(scales["spot_diameter_fullres"])
 
     sample = Sample(
@@ -95,19 +99,19 @@ def run_spaceranger(
     if tif is not None:
         sample = sample.add_image(tif, channels, mPerPx, defaultChannels=defaultChannels)
 
-    (
-        sample.add_coords(
-            pd.DataFrame(
-                cast(pd.DataFrame, vis.obsm["spatial"]),
-                columns=["x", "y"],
-                index=pd.Series(vis.obs_names, name="id"),
-                dtype="uint32",
-            ),
-            name="spots",
-            mPerPx=mPerPx,
-            size=spotDiam,
-        )
-        .add_chunked_feature(vis.to_df(), name="genes", coordName="spots", unit="Log counts", sparse=True)
-        .write()
+    sample = sample.add_coords(coords, name="spots", mPerPx=mPerPx, size=spotDiam)
+    sample = sample.add_chunked_feature_blocks(
+        lambda: iter_csc_column_blocks(mat),
+        index=barcodes,
+        names=genes,
+        name="genes",
+        coordName="spots",
+        unit="Log counts" if logTransform else "Counts",
     )
+    clusters = read_10x_clusters(outs / "analysis")
+    if clusters is not None:
+        sample = sample.add_chunked_feature(
+            clusters.df, name="clusters", coordName="spots", dataType="categorical"
+        )
+    sample.write()
     return sample
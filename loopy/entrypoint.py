@@ -4,7 +4,7 @@ import rich_click as click
 
 from loopy.logger import log
 from loopy.sample import Sample
-from loopy.server import serve_samui
+from loopy.server import OPTIONAL_ROUTES, serve_samui
 
 
 @click.group()
@@ -132,7 +132,7 @@ Assumes that Visium alignment has been done."""
     if out is None:
         out = spaceranger_output.parent / "loopy"
 
-    run_spaceranger(name, spaceranger_output, out, spotDiam=spotDiam)
+    run_spaceranger(name, spaceranger_output, out, spotDiam=spotDiam, logTransform=logTransform)
     # modify_sample(s, out, name)
 
 
@@ -160,6 +160,14 @@ def gui():
 @click.option("m_per_px", "--m-per-px", type=float, default=1.0, help="Meters per pixel for coords.")
 @click.option("size", "--size", type=float, default=None, help="Spot diameter in meters. Defaults to auto (heuristic).")
 @click.option("unit", "--unit", type=str, default="counts", help="Unit string for the feature values.")
+@click.option(
+    "block_size",
+    "--block-size",
+    type=int,
+    default=1024,
+    show_default=True,
+    help="Number of genes read from the .h5ad and encoded at a time.",
+)
 @click.option("--serve", is_flag=True, help="Start a local web server to browse the output after writing.")
 @click.option("--serve-host", default="127.0.0.1", show_default=True, help="Server host to bind.")
 @click.option(
@@ -184,99 +192,102 @@ def h5ad(
     m_per_px: float,
     size: float | None,
     unit: str,
+    block_size: int,
     serve: bool,
     serve_host: str,
     serve_port: int,
     serve_open: bool,
 ) -> None:
-    """Convert an .h5ad to a Sample using obsm['spatial'] for coordinates and X for features."""
+    """Convert an .h5ad to a Sample using obsm['spatial'] for coordinates and X for features.
+
+    The file is opened in backed mode: X is streamed from disk in blocks of genes
+    straight into the chunked-feature encoder instead of being loaded whole.
+    obs and obsm are still read into memory by anndata when the file is opened,
+    so peak memory is one block of X plus obsm, not the size of the file.
+    """
+    import anndata
     import numpy as np
     import pandas as pd
-    import scanpy as sc
-    from scipy import sparse as sp
 
+    from loopy.feature import iter_csc_column_blocks
     from loopy.utils.utils import estimate_spot_diameter, infer_feature_data_type
 
     try:
-        ad = sc.read_h5ad(h5ad)
-        if "spatial" not in ad.obsm:
-            raise click.ClickException("adata.obsm['spatial'] not found in the provided .h5ad")
-        if ad.obsm["spatial"] is None or ad.obsm["spatial"].shape[1] < 2:
-            raise click.ClickException("adata.obsm['spatial'] must have at least two columns (x,y)")
-
-        coords = pd.DataFrame(ad.obsm["spatial"][:, :2], columns=["x", "y"], index=ad.obs_names.astype(str))
-
-        # Warn if the overall physical extent is unusually large (> 10 cm).
+        ad = anndata.read_h5ad(h5ad, backed="r")
         try:
-            x_extent_px = float(coords["x"].max() - coords["x"].min())
-            y_extent_px = float(coords["y"].max() - coords["y"].min())
-            width_m = x_extent_px * m_per_px
-            height_m = y_extent_px * m_per_px
-            threshold_m = 0.10  # 10 cm
-            if max(width_m, height_m) > threshold_m:
-                width_cm = width_m * 100
-                height_cm = height_m * 100
-                log(
-                    "Large physical extent detected:",
-                    f"~{width_cm:.2f} cm × {height_cm:.2f} cm",
-                    f"(m_per_px={m_per_px:g}).",
-                    "If this looks wrong, check your coordinate units or pass --m-per-px accordingly.",
-                    type_="WARNING",
-                )
-        except Exception as e:
-            log("Failed to compute extent:", str(e), type_="WARNING")
+            if "spatial" not in ad.obsm:
+                raise click.ClickException("adata.obsm['spatial'] not found in the provided .h5ad")
+            if ad.obsm["spatial"] is None or ad.obsm["spatial"].shape[1] < 2:
+                raise click.ClickException("adata.obsm['spatial'] must have at least two columns (x,y)")
 
-        X = ad.X
-        is_sparse = sp.issparse(X)
-        if is_sparse:
-            X = sp.csc_matrix(X)
-            feat = pd.DataFrame.sparse.from_spmatrix(X, index=ad.obs_names.astype(str), columns=ad.var_names)
-        else:
-            X = np.asarray(X)
-            feat = pd.DataFrame(X, index=ad.obs_names.astype(str), columns=ad.var_names)
+            obs_names = ad.obs_names.astype(str)
+            coords = pd.DataFrame(np.asarray(ad.obsm["spatial"])[:, :2], columns=["x", "y"], index=obs_names)
 
-        if out is None:
-            out = h5ad.parent
-        sample_name = name or h5ad.stem
-        out_dir = out / sample_name
-        est_size_m = size or estimate_spot_diameter(coords, m_per_px=m_per_px)
-        if size is None:
-            log("Estimated spot diameter:", f"{est_size_m:.6e} m")
+            # Warn if the overall physical extent is unusually large (> 10 cm).
+            try:
+                x_extent_px = float(coords["x"].max() - coords["x"].min())
+                y_extent_px = float(coords["y"].max() - coords["y"].min())
+                width_m = x_extent_px * m_per_px
+                height_m = y_extent_px * m_per_px
+                threshold_m = 0.10  # 10 cm
+                if max(width_m, height_m) > threshold_m:
+                    width_cm = width_m * 100
+                    height_cm = height_m * 100
+                    log(
+                        "Large physical extent detected:",
+                        f"~{width_cm:.2f} cm × {height_cm:.2f} cm",
+                        f"(m_per_px={m_per_px:g}).",
+                        "If this looks wrong, check your coordinate units or pass --m-per-px accordingly.",
+                        type_="WARNING",
+                    )
+            except Exception as e:
+                log("Failed to compute extent:", str(e), type_="WARNING")
 
-        log("Writing sample to", out_dir)
-        s = Sample(name=sample_name, path=out_dir).add_coords(
-            coords, name=coords_name, mPerPx=m_per_px, size=est_size_m
-        )
-        # Gene expression as chunked sparse
-        s = s.add_chunked_feature(
-            feat,
-            name=feature_name,
-            coordName=coords_name,
-            sparse=True,
-            unit=unit,
-            dataType=infer_feature_data_type(feat),
-        )
-        # Add each obsm matrix as CSV features
-        for key, val in ad.obsm.items():
-            if isinstance(val, pd.DataFrame):
-                df = val.copy()
-                df.index = ad.obs_names.astype(str)
-            else:
-                arr = np.asarray(val)
-                if arr.ndim == 1:
-                    arr = arr.reshape(-1, 1)
-                if arr.shape[0] != ad.n_obs:
-                    continue
-                cols = [f"{key}_{i}" for i in range(arr.shape[1])]
-                df = pd.DataFrame(arr, index=ad.obs_names.astype(str), columns=cols)
-            s = s.add_csv_feature(
-                df,
-                name=key,
+            if out is None:
+                out = h5ad.parent
+            sample_name = name or h5ad.stem
+            out_dir = out / sample_name
+            est_size_m = size or estimate_spot_diameter(coords, m_per_px=m_per_px)
+            if size is None:
+                log("Estimated spot diameter:", f"{est_size_m:.6e} m")
+
+            log("Writing sample to", out_dir)
+            s = Sample(name=sample_name, path=out_dir).add_coords(
+                coords, name=coords_name, mPerPx=m_per_px, size=est_size_m
+            )
+            # Gene expression as chunked sparse, streamed from the backed file at write time
+            s = s.add_chunked_feature_blocks(
+                lambda: iter_csc_column_blocks(ad.X, block_size=block_size),
+                index=obs_names,
+                names=ad.var_names.astype(str).to_list(),
+                name=feature_name,
                 coordName=coords_name,
-                dataType=infer_feature_data_type(df),
+                unit=unit,
+                dataType="quantitative",
             )
+            # Add each obsm matrix as CSV features
+            for key, val in ad.obsm.items():
+                if isinstance(val, pd.DataFrame):
+                    df = val.copy()
+                    df.index = obs_names
+                else:
+                    arr = np.asarray(val)
+                    if arr.ndim == 1:
+                        arr = arr.reshape(-1, 1)
+                    if arr.shape[0] != ad.n_obs:
+                        continue
+                    cols = [f"{key}_{i}" for i in range(arr.shape[1])]
+                    df = pd.DataFrame(arr, index=obs_names, columns=cols)
+                s = s.add_csv_feature(
+                    df,
+                    name=key,
+                    coordName=coords_name,
+                    dataType=infer_feature_data_type(df),
+                )
 
-        s.write()
+            s.write()
+        finally:
+            ad.file.close()
         log("Done.")
 
         if serve:
@@ -300,18 +311,72 @@ def h5ad(
 )
 @click.option("--port", default=8000, type=int, show_default=True, help="Port to bind.")
 @click.option("--open/--no-open", "open_browser", default=True, show_default=True, help="Open browser on start.")
+@click.option(
+    "cache_mb",
+    "--cache-mb",
+    type=float,
+    default=None,
+    help="Keep hot byte ranges (sample.json, coords, default gene chunks) in an in-memory LRU of this size.",
+)
+@click.option(
+    "--workers",
+    default=1,
+    type=int,
+    show_default=True,
+    help="Worker processes for shared deployments (uses uvloop/httptools if installed).",
+)
+@click.option(
+    "keep_alive",
+    "--keep-alive",
+    default=5.0,
+    type=float,
+    show_default=True,
+    help="Seconds an idle connection is kept open for the viewer's next request.",
+)
+@click.option(
+    "routes",
+    "--api",
+    multiple=True,
+    type=click.Choice(OPTIONAL_ROUTES),
+    help=(
+        "Enable an optional API (repeatable). 'query': server-side chunked-feature queries under "
+        "/_loopy/query/; 'tiles': composited image tiles under /tiles/."
+    ),
+)
+@click.option(
+    "--http2/--http1",
+    default=False,
+    show_default=True,
+    help="Serve HTTP/2 through Hypercorn, multiplexing range requests over one connection.",
+)
 def serve(
     directory: Path,
     host: str,
     port: int,
     open_browser: bool,
+    cache_mb: float | None,
+    workers: int,
+    keep_alive: float,
+    routes: tuple[str, ...],
+    http2: bool,
 ) -> None:
     """Serve static files over HTTP.
 
     - Defaults to serving from ./static if it exists, otherwise the CWD.
-    - Uses FastAPI+Uvicorn. Install extras with `pip install .[server]` if missing.
+    - Uses FastAPI+Uvicorn (Hypercorn with --http2). Install extras with `pip install .[server]` if missing.
     """
     try:
-        serve_samui(directory, host=host, port=port, open_browser=open_browser, block=True)
+        serve_samui(
+            directory,
+            host=host,
+            port=port,
+            open_browser=open_browser,
+            block=True,
+            cache_mb=cache_mb,
+            routes=routes,
+            workers=workers,
+            keep_alive=keep_alive,
+            http2=http2,
+        )
     except (ImportError, OSError, ValueError) as e:
         raise click.ClickException(str(e))
@@ -1,13 +1,16 @@
+import tempfile
 from pathlib import Path
-from typing import Callable, Literal, cast
+from typing import Any, Callable, Iterable, Iterator, Literal, cast
 
+import numpy as np
 import pandas as pd
 from pandas.api.types import is_object_dtype, is_string_dtype
 from pydantic import validator
-from scipy.sparse import csc_matrix, csr_matrix
+from scipy.sparse import csc_matrix, csr_matrix, issparse
 from typing_extensions import Self
 
 from loopy.logger import log
+from loopy.profiling import stage
 
 from .utils.utils import Callback, ReadonlyModel, Url, Writable, concat
 
@@ -147,10 +150,12 @@ def compress_chunked_features(
 ) -> tuple[ChunkedCSVHeader, bytearray]:
 
     names = df.columns
-    objs = [df[[name]].T.to_csv(header=False, index=False).encode() for name in df.columns]
+    with stage("chunk encode"):
+        objs = [df[[name]].T.to_csv(header=False, index=False).encode() for name in df.columns]
 
     logger("Concatenating and compressing chunks")
-    ptr, outbytes = concat(objs)
+    with stage("gzip"):
+        ptr, outbytes = concat(objs)
     length = len(df)
 
     return (
@@ -164,6 +169,42 @@ def compress_chunked_features(
     )
 
 
+def _sparse_chunks(
+    cs: csc_matrix | csr_matrix, *, logger: Callback = log, start: int = 0, total: int | None = None
+) -> list[bytes | None]:
+    """Encode each major-axis slice of `cs` (a column of a CSC matrix) as an index,value CSV.
+
+    Empty slices are None so that `concat` gives them a zero-length chunk.
+    `start` and `total` only affect the progress messages when encoding in blocks.
+    """
+    with stage("chunk encode"):
+        total = total if total is not None else start + cs.indptr.size - 1
+        indices = cs.indices.astype(int)
+        indptr = cs.indptr.astype(int)
+        data = cs.data
+
+        objs: list[bytes | None] = []
+
+        for i in range(len(indptr) - 1):
+            if (start + i) % 1000 == 0:
+                logger(f"Processing {start + i} of {total} chunks")
+
+            if (indices[indptr[i] : indptr[i + 1]]).size == 0:
+                objs.append(None)
+            else:
+                objs.append(
+                    pd.DataFrame(
+                        {
+                            "index": indices[indptr[i] : indptr[i + 1]].tolist(),
+                            "value": [round(x, 3) for x in data[indptr[i] : indptr[i + 1]].tolist()],
+                        }
+                    )
+                    .to_csv(index=False)
+                    .encode()
+                )
+        return objs
+
+
 def sparse_compress_chunked_features(
     df: pd.DataFrame,
     *,
@@ -184,32 +225,11 @@ def sparse_compress_chunked_features(
 
     names = df.columns
 
-    indices = cs.indices.astype(int)
-    indptr = cs.indptr.astype(int)
-    data = cs.data
-
-    objs = []
-
-    for i in range(len(indptr) - 1):
-        if i % 1000 == 0:
-            logger(f"Processing {i} of {len(indptr) - 1} chunks")
-
-        if (indices[indptr[i] : indptr[i + 1]]).size == 0:
-            objs.append(None)
-        else:
-            objs.append(
-                pd.DataFrame(
-                    {
-                        "index": indices[indptr[i] : indptr[i + 1]].tolist(),
-                        "value": [round(x, 3) for x in data[indptr[i] : indptr[i + 1]].tolist()],
-                    }
-                )
-                .to_csv(index=False)
-                .encode()
-            )
+    objs = _sparse_chunks(cs, logger=logger)
 
     logger("Concatenating and compressing chunks")
-    ptr, outbytes = concat(objs)
+    with stage("gzip"):
+        ptr, outbytes = concat(objs)
     match mode:
         case "csr":
             length = cs.shape[1]
@@ -227,3 +247,98 @@ def sparse_compress_chunked_features(
         ),
         outbytes,
     )
+
+
+def sparse_compress_chunked_blocks(
+    blocks: Iterable[csc_matrix],
+    *,
+    names: list[str],
+    logger: Callback = log,
+) -> tuple[ChunkedCSVHeader, bytearray]:
+    """Same output as `sparse_compress_chunked_features(mode="csc")`, but from column blocks.
+
+    Each block is an observations x features CSC matrix holding the next columns of
+    the full matrix, so only one block (and its compressed bytes) is materialized at a time.
+    """
+    ptr = [0]
+    outbytes = bytearray()
+    length = 0
+    for block in blocks:
+        length = block.shape[0]
+        objs = _sparse_chunks(block, logger=logger, start=len(ptr) - 1, total=len(names))
+        with stage("gzip"):
+            bptr, bbytes = concat(objs)
+        ptr.extend((bptr[1:] + len(outbytes)).tolist())
+        outbytes += bbytes
+
+    if len(ptr) - 1 != len(names):
+        raise ValueError(f"Blocks hold {len(ptr) - 1} columns, but {len(names)} names were given")
+
+    return (
+        ChunkedCSVHeader(names=list(names), ptr=ptr, length=length, sparseMode="array"),
+        outbytes,
+    )
+
+
+def iter_csc_column_blocks(X: Any, *, block_size: int = 1024) -> Iterator[csc_matrix]:
+    """Yield `X` (observations x features) as CSC blocks of at most `block_size` columns.
+
+    `X` may be a scipy sparse matrix, a dense array, or the backed `X` of an AnnData
+    opened with `backed="r"` (a sparse dataset or an h5py dataset). Column-major
+    sources are sliced per block, so only the block is read from disk. A backed CSR
+    (AnnData's default layout) is transposed through a scratch file first (see
+    `_backed_csr_to_csc`); an in-memory one is converted to CSC once. Dense sources
+    are sparsified one block at a time.
+    """
+    if getattr(X, "format", None) == "csr" and hasattr(X, "to_memory"):
+        yield from _backed_csr_to_csc(X, block_size=block_size)
+        return
+    if issparse(X) and X.format != "csc":
+        X = X.tocsc()
+
+    n_vars = X.shape[1]
+    for start in range(0, n_vars, block_size):
+        block = X[:, start : start + block_size]
+        yield block if isinstance(block, csc_matrix) else csc_matrix(block)
+
+
+def _backed_csr_to_csc(X: Any, *, block_size: int) -> Iterator[csc_matrix]:
+    """Column blocks of a backed CSR matrix, holding about one block in memory at a time.
+
+    Two passes over row blocks of X (sized to hold as many cells as a column block
+    of `block_size`): the first counts the entries of each column, the second
+    writes every entry to its CSC position in memory-mapped scratch arrays. Column
+    blocks are then sliced from those. Rows are visited in order, so the row
+    indices within each column stay sorted.
+    """
+    n_obs, n_vars = X.shape
+    rows_per_read = max(1, block_size * n_obs // max(n_vars, 1))
+    row_starts = range(0, n_obs, rows_per_read)
+
+    counts = np.zeros(n_vars, dtype=np.int64)
+    for start in row_starts:
+        counts += np.bincount(X[start : start + rows_per_read].indices, minlength=n_vars)
+    indptr = np.concatenate([[0], np.cumsum(counts)])
+    nnz = int(indptr[-1])
+    index_dtype = np.int32 if max(n_obs, nnz) < 2**31 else np.int64
+
+    with tempfile.TemporaryDirectory(prefix="loopy-csc-", ignore_cleanup_errors=True) as tmp:
+        # mode w+ rejects empty maps, so allocate at least one element.
+        data = np.memmap(Path(tmp) / "data", dtype=X.dtype, mode="w+", shape=(max(nnz, 1),))
+        indices = np.memmap(Path(tmp) / "indices", dtype=index_dtype, mode="w+", shape=(max(nnz, 1),))
+        cursor = indptr[:-1].copy()
+        for start in row_starts:
+            rows = X[start : start + rows_per_read].tocsc()
+            per_col = np.diff(rows.indptr)
+            dest = np.repeat(cursor - rows.indptr[:-1], per_col) + np.arange(rows.nnz)
+            data[dest] = rows.data
+            indices[dest] = rows.indices + start
+            cursor += per_col
+
+        for start in range(0, n_vars, block_size):
+            end = min(start + block_size, n_vars)
+            lo, hi = indptr[start], indptr[end]
+            yield csc_matrix(
+                (np.array(data[lo:hi]), np.array(indices[lo:hi]), indptr[start : end + 1] - lo),
+                shape=(n_obs, end - start),
+            )
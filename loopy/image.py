@@ -16,6 +16,7 @@ from tifffile import imread
 from typing_extensions import Self
 
 from loopy.logger import log
+from loopy.profiling import stage
 from loopy.utils.utils import Callback, ReadonlyModel, Url
 
 Meter = Annotated[float, "meter"]
@@ -73,8 +74,10 @@ class GeoTiff(BaseModel):
         rgb: bool = False,
         convert_to_8bit: bool = False,
     ) -> Self:
+        with stage("image read"):
+            img = imread(tif)
         return cls.from_img(
-            imread(tif), scale=scale, translate=translate, rgb=rgb, convert_to_8bit=convert_to_8bit
+            img, scale=scale, translate=translate, rgb=rgb, convert_to_8bit=convert_to_8bit
         )
 
     @classmethod
@@ -200,7 +203,7 @@ class GeoTiff(BaseModel):
         if dtype != np.uint8 and dtype != np.uint16:
             raise ValueError(f"Unsupported dtype {dtype}. Expected uint8 or uint16.")
 
-        with rasterio.open(
+        with stage("COG write") as st, rasterio.open(
             path.with_suffix(".tif").as_posix(),
             "w",
             driver="GTiff",
@@ -219,5 +222,7 @@ class GeoTiff(BaseModel):
             logger("Writing compressed GeoTIFF", path.as_posix())
             for idx_out, idx_in in enumerate(channels, 1):
                 dst.write(self._get_slide(idx_in), idx_out)
-            dst.build_overviews([4, 8, 16, 32, 64], Resampling.nearest)
+            with stage("overview build"):
+                dst.build_overviews([4, 8, 16, 32, 64], Resampling.nearest)
+        st.add_file(path.with_suffix(".tif"))
         return dtype == np.uint16
@@ -0,0 +1,155 @@
+"""Per-stage wall time, CPU time, peak RSS and bytes written.
+
+Pipeline code marks its stages with `stage`, which is a no-op unless a
+`Profiler` is active (see `profiling`), so the library pays nothing when nobody
+is measuring. Repeated stages (e.g. one "gzip" per feature group) accumulate
+into one record. Stages may nest (e.g. "overview build" runs inside "COG
+write", and the readers' stages inside "reader I/O"), so their times do not sum
+to the total.
+
+    with profiling() as prof:
+        ...
+    prof.write(path / "profile.json")
+    prof.print_table()
+
+CPU time is that of the thread running the stage (`time.thread_time`), so
+concurrent stages are not double-counted; work done on GDAL's own threads is not
+included. Peak RSS is the process high-water mark when the stage finished, so it
+is an upper bound for the stage itself. Bytes written are reported by the stage
+(`Stage.add_bytes`), as the size of the files it produced.
+"""
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Generator
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def _peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+@dataclass
+class StageRecord:
+    stage: str
+    calls: int = 0
+    wall_s: float = 0.0
+    cpu_s: float = 0.0
+    peak_rss_mb: float | None = None
+    bytes_written: int = 0
+
+
+class Stage:
+    """Handle yielded by `stage`; lets the stage report what it wrote."""
+
+    def __init__(self, active: bool) -> None:
+        self.active = active
+        self.bytes_written = 0
+
+    def add_bytes(self, n: int) -> None:
+        self.bytes_written += n
+
+    def add_file(self, path: Path) -> None:
+        """Count the size of `path` (not even stat'ed when not profiling)."""
+        if self.active:
+            self.add_bytes(path.stat().st_size)
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.records: dict[str, StageRecord] = {}
+        self.started = time.perf_counter()
+        self.wall_s: float | None = None
+        self._lock = threading.Lock()
+
+    def add(self, name: str, *, wall_s: float, cpu_s: float, bytes_written: int = 0) -> None:
+        rss = _peak_rss_mb()
+        with self._lock:
+            rec = self.records.setdefault(name, StageRecord(name))
+            rec.calls += 1
+            rec.wall_s += wall_s
+            rec.cpu_s += cpu_s
+            rec.bytes_written += bytes_written
+            if rss is not None:
+                rec.peak_rss_mb = max(rec.peak_rss_mb or 0.0, rss)
+
+    def to_dict(self) -> dict:
+        wall = self.wall_s if self.wall_s is not None else time.perf_counter() - self.started
+        return {
+            "wall_s": round(wall, 4),
+            "peak_rss_mb": _peak_rss_mb(),
+            "stages": [
+                asdict(r) | {"wall_s": round(r.wall_s, 4), "cpu_s": round(r.cpu_s, 4)}
+                for r in self.records.values()
+            ],
+        }
+
+    def write(self, path: Path) -> None:
+        path.write_text(json.dumps(self.to_dict(), indent=2))
+
+    def print_table(self) -> None:
+        d = self.to_dict()
+        width = max([len("stage"), *(len(r["stage"]) for r in d["stages"])])
+        print(
+            f"{'stage':<{width}}  {'calls':>5}  {'wall s':>8}  {'cpu s':>8}  "
+            f"{'peak RSS MB':>11}  {'written MB':>10}"
+        )
+        for r in d["stages"]:
+            rss = "" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.0f}"
+            print(
+                f"{r['stage']:<{width}}  {r['calls']:>5}  {r['wall_s']:>8.2f}  {r['cpu_s']:>8.2f}  "
+                f"{rss:>11}  {r['bytes_written'] / 1024**2:>10.2f}"
+            )
+        print(f"{'total':<{width}}  {'':>5}  {d['wall_s']:>8.2f}")
+
+
+PROFILE_FILE = "profile.json"
+
+_active: Profiler | None = None
+
+
+@contextmanager
+def profiling() -> Generator[Profiler, None, None]:
+    """Make a new `Profiler` the active one for the duration of the block (all threads)."""
+    global _active
+    prev, _active = _active, Profiler()
+    prof = _active
+    try:
+        yield prof
+    finally:
+        prof.wall_s = time.perf_counter() - prof.started
+        _active = prev
+
+
+@contextmanager
+def stage(name: str) -> Generator[Stage, None, None]:
+    """Time the block as stage `name` of the active profiler, if any."""
+    prof = _active
+    handle = Stage(active=prof is not None)
+    if prof is None:
+        yield handle
+        return
+    wall, cpu = time.perf_counter(), time.thread_time()
+    try:
+        yield handle
+    finally:
+        prof.add(
+            name,
+            wall_s=time.perf_counter() - wall,
+            cpu_s=time.thread_time() - cpu,
+            bytes_written=handle.bytes_written,
+        )
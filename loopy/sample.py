@@ -1,13 +1,27 @@
 from __future__ import annotations
 
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Callable, Concatenate, Generic, Literal, ParamSpec, Protocol, TypeVar
+from typing import (
+    Any,
+    Callable,
+    Concatenate,
+    Generic,
+    Iterable,
+    Iterator,
+    Literal,
+    NamedTuple,
+    ParamSpec,
+    Protocol,
+    TypeVar,
+)
 
 import numpy as np
 import pandas as pd
 from pandas.api.types import is_object_dtype, is_string_dtype
 from pydantic import BaseModel
+from scipy.sparse import csc_matrix
 from typing_extensions import Self
 
 from loopy.feature import (
@@ -18,11 +32,14 @@ from loopy.feature import (
     PlainCSVParams,
     compress_chunked_features,
     join_idx,
+    sparse_compress_chunked_blocks,
     sparse_compress_chunked_features,
 )
 from loopy.image import Colors, GeoTiff, ImageParams
 from loopy.logger import log
-from loopy.utils.utils import Url
+from loopy.profiling import stage
+from loopy.utils.archive import pack_sample
+from loopy.utils.utils import SIDECAR_SUFFIXES, Url, write_sidecars
 
 
 class OverlayParams(BaseModel):
@@ -41,6 +58,14 @@ class Method(Protocol, Generic[P, R]):
         ...
 
 
+class Queued(NamedTuple):
+    """A deferred write of a lazy `Sample`; `kind` says what it writes (coords go first)."""
+
+    label: str
+    run: Callable[[], None]
+    kind: Literal["coords", "feature", "image", "other"] = "other"
+
+
 class Sample(BaseModel):
     name: str
     imgParams: ImageParams | None = None
@@ -52,7 +77,7 @@ class Sample(BaseModel):
 
     path: Path = None  # type: ignore
     lazy: bool = True
-    queue_: list[tuple[str, Callable[[], None]]] = []
+    queue_: list[Queued] = []
 
     @staticmethod
     def check_path(func: Callable[Concatenate[Sample, P], R]) -> Method[P, R]:
@@ -79,7 +104,7 @@ class Sample(BaseModel):
         notesMd: Url | None = None,
         metadataMd: Url | None = None,
         lazy: bool = True,
-        queue_: list[tuple[str, Callable[[], None]]] = [],
+        queue_: list[Queued] = [],
         **kwargs: Any,
     ) -> None:
         existing_kwargs = {}
@@ -110,22 +135,70 @@ class Sample(BaseModel):
 
         super().__init__(**(existing_kwargs | {k: v for k, v in curr.items() if v is not None}))
 
+    def _run_queued(self, task: Queued) -> None:
+        try:
+            task[1]()
+        except Exception as e:
+            raise Exception(f"Error executing queued functions: {task[0]}") from e
+
     @check_path
-    def write(self, execute: bool = True) -> Self:
-        """Write sample.json to disk"""
+    def write(
+        self, execute: bool = True, workers: int = 1, precompress: bool = False, pack: bool = False
+    ) -> Self:
+        """Write sample.json to disk
+
+        Args:
+            execute (bool, optional): Run the queued functions first. Defaults to True.
+            workers (int, optional): Threads to run the queued functions on. With more than one,
+                coords are written first (features are joined against them), then features and
+                images are written concurrently. Defaults to 1 (in queue order).
+            precompress (bool, optional): Also write `.br`/`.gz` sidecars of the text assets
+                (see `text_assets`) for `loopy serve` to send to browsers that accept them.
+                Defaults to False.
+            pack (bool, optional): Also pack the sample folder into one uncompressed
+                `<name>.zip` next to it (see `loopy.utils.archive`), which `loopy serve`
+                serves like the folder. Defaults to False.
+        """
         if execute and self.lazy:
             log(f"'{self.name}' Executing queued functions")
-            for f in self.queue_:
-                try:
-                    f[1]()
-                except Exception as e:
-                    raise Exception(f"Error executing queued functions: {f[0]}") from e
+            if workers <= 1:
+                for f in self.queue_:
+                    self._run_queued(f)
+            else:
+                # Entries queued by hand may be plain (label, run) pairs.
+                coords = [f for f in self.queue_ if getattr(f, "kind", None) == "coords"]
+                rest = [f for f in self.queue_ if getattr(f, "kind", None) != "coords"]
+                for f in coords:
+                    self._run_queued(f)
+                with ThreadPoolExecutor(max_workers=workers) as pool:
+                    # list() re-raises the first failure in queue order.
+                    list(pool.map(self._run_queued, rest))
             self.queue_ = []
 
         (self.path / "sample.json").write_text(self.json())
+        if precompress:
+            with stage("precompress") as st, ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+                for sidecars in pool.map(write_sidecars, [p for p in self.text_assets() if p.exists()]):
+                    for p in sidecars:
+                        st.add_file(p)
+        if pack:
+            with stage("pack") as st:
+                archive = pack_sample(self.path)
+                st.add_file(archive)
+            log(f"'{self.name}' packed into {archive}")
         log(f"'{self.name}' written to {self.path}")
         return self
 
+    def text_assets(self) -> list[Path]:
+        """Local text files of the sample: sample.json, coords, plain CSV features and chunk headers."""
+        urls = [c.url for c in self.coordParams or []]
+        for fp in self.featParams or []:
+            if isinstance(fp, PlainCSVParams):
+                urls.append(fp.url)
+            elif isinstance(fp, ChunkedCSVParams) and fp.headerUrl:
+                urls.append(fp.headerUrl)
+        return [self.path / "sample.json", *(self.path / u.url for u in urls if u.type == "local")]
+
     def set_path(self, path: Path) -> Self:
         self.path = path
         path.mkdir(exist_ok=True, parents=True)
@@ -173,7 +246,10 @@ class Sample(BaseModel):
 
         names, transform_func = geotiff.transform_tiff(self.path / f"{tiff.stem}.tif", quality=quality)
 
-        transform_func() if not self.lazy else self.queue_.append((f"Add image: {tiff}", transform_func))
+        if self.lazy:
+            self.queue_.append(Queued(f"Add image: {tiff}", transform_func, "image"))
+        else:
+            transform_func()
         if not self.imgParams:
             self.imgParams = ImageParams.from_names(
                 names,
@@ -214,13 +290,15 @@ class Sample(BaseModel):
                     Use `df.index = df.index.astype(str)` and verify that it's what you want."""
                 )
 
-            df.to_csv(self.path / f"{name}.csv", index_label="id", float_format="%.6e")
+            with stage("coord write") as st:
+                df.to_csv(self.path / f"{name}.csv", index_label="id", float_format="%.6e")
+                st.add_file(self.path / f"{name}.csv")
 
         self.coordParams = self.coordParams or []
         if name in [c.name for c in self.coordParams]:
             self.coordParams = [c for c in self.coordParams if c.name != name]
 
-        run() if not self.lazy else self.queue_.append((f"Add coords {name}", run))
+        run() if not self.lazy else self.queue_.append(Queued(f"Add coords {name}", run, "coords"))
         self.coordParams.append(
             CoordParams(url=Url(f"{name}.csv"), name=name, shape="circle", mPerPx=mPerPx, size=size)
         )
@@ -237,6 +315,19 @@ class Sample(BaseModel):
 
         self.coordParams = [c for c in self.coordParams if c.name != name]
         (self.path / f"{name}.csv").unlink()
+        for sidecar in SIDECAR_SUFFIXES.values():
+            (self.path / f"{name}.csv{sidecar}").unlink(missing_ok=True)
+
+    def _coord_template(self, coordName: str) -> pd.DataFrame:
+        """Read the written coordinate csv of `coordName` as an empty frame with its index."""
+        coord_params = [c for c in self.coordParams or [] if c.name == coordName][0]
+
+        try:
+            template = pd.read_csv(self.path / coord_params.url.url, index_col=0)
+            template.index = template.index.astype(str)
+            return pd.DataFrame(index=template.index)
+        except FileNotFoundError:
+            raise ValueError(f"Coord {coordName} not found. Use Sample.add_coords() before adding features.")
 
     def _join_with_coords(self, df: pd.DataFrame, *, coordName: str) -> pd.DataFrame:
         """Join a feature dataframe with its respective coordinate dataframe.
@@ -254,19 +345,13 @@ class Sample(BaseModel):
         if not self.coordParams or coordName not in [c.name for c in self.coordParams]:
             raise ValueError(f"Coord name {coordName}. Check coordName or add coords using Sample.add_coords() first")
 
-        coord_params = [c for c in self.coordParams if c.name == coordName][0]
+        with stage("join"):
+            template = self._coord_template(coordName)
 
-        try:
-            template = pd.read_csv(self.path / coord_params.url.url, index_col=0)
-            template.index = template.index.astype(str)
-            template = pd.DataFrame(index=template.index)
-        except FileNotFoundError:
-            raise ValueError(f"Coord {coordName} not found. Use Sample.add_coords() before adding features.")
-
-        try:
-            return join_idx(template, df)
-        except ValueError as exc:
-            raise ValueError(f"Sample {self.name} join error.") from exc
+            try:
+                return join_idx(template, df)
+            except ValueError as exc:
+                raise ValueError(f"Sample {self.name} join error.") from exc
 
     def _add_feature(self, fp: FeatureParams):
         if not self.coordParams or fp.coordName not in [c.name for c in self.coordParams]:
@@ -305,7 +390,7 @@ class Sample(BaseModel):
                 self.path / f"{name}.csv", index_label="id", float_format="%.6e"
             )
 
-        run() if not self.lazy else self.queue_.append((f"Add csv feature {name}", run))
+        run() if not self.lazy else self.queue_.append(Queued(f"Add csv feature {name}", run, "feature"))
         self._add_feature(PlainCSVParams(name=name, url=Url(url=f"{name}.csv"), dataType=dataType, coordName=coordName))
         return self
 
@@ -330,10 +415,79 @@ class Sample(BaseModel):
             else:
                 header, bytedict = compress_chunked_features(joined, logger=lambda *args: log(self.name, *args))
             log(f"Writing compressed chunks for {name}:", f"{len(bytedict)} bytes")
-            header.write(self.path / f"{name}.json")
-            (self.path / name).with_suffix(".bin").write_bytes(bytedict)
+            with stage("chunk write") as st:
+                header.write(self.path / f"{name}.json")
+                (self.path / name).with_suffix(".bin").write_bytes(bytedict)
+                st.add_file(self.path / f"{name}.json")
+                st.add_bytes(len(bytedict))
+
+        run() if not self.lazy else self.queue_.append(Queued(f"Add chunked {name}", run, "feature"))
+        self._add_feature(
+            ChunkedCSVParams(name=name, url=Url(f"{name}.bin"), unit=unit, dataType=dataType, coordName=coordName)
+        )
+        return self
+
+    @check_path
+    def add_chunked_feature_blocks(
+        self,
+        blocks: Callable[[], Iterable[csc_matrix]],
+        *,
+        index: pd.Index,
+        names: list[str],
+        name: str,
+        coordName: str,
+        unit: str | None = None,
+        dataType: Literal["quantitative", "categorical"] = "quantitative",
+    ) -> Self:
+        """Add a sparse chunked feature streamed as CSC column blocks.
+
+        For matrices too large to hold as a DataFrame (e.g. the `X` of a backed AnnData).
+
+        Args:
+            blocks (Callable[[], Iterable[csc_matrix]]): Called when the feature is written;
+                yields observations x features blocks covering `names` in order
+                (see `loopy.feature.iter_csc_column_blocks`).
+            index (pd.Index): String observation ids of the block rows.
+            names (list[str]): Feature names, one per column.
+            name (str): Name of the feature
+            coordName (str): Name of the coordinates to link to
+        """
+
+        def run():
+            log(self.name, "Adding chunked feature", f"'{name}'")
+            with stage("join"):
+                template = self._coord_template(coordName)
+                try:
+                    join_idx(template, pd.DataFrame(index=index))
+                except ValueError as exc:
+                    raise ValueError(f"Sample {self.name} join error.") from exc
+                # Rows are placed at their coordinate's position; ids absent from the coords are dropped.
+                rows = template.index.get_indexer(index)
+                identity = len(rows) == len(template) and bool((rows == np.arange(len(rows))).all())
+
+            def aligned() -> Iterator[csc_matrix]:
+                for block in blocks():
+                    if identity:
+                        yield block
+                        continue
+                    coo = block.tocoo()
+                    r = rows[coo.row]
+                    keep = r >= 0
+                    yield csc_matrix(
+                        (coo.data[keep], (r[keep], coo.col[keep])), shape=(len(template), block.shape[1])
+                    )
+
+            header, bytedict = sparse_compress_chunked_blocks(
+                aligned(), names=names, logger=lambda *args: log(self.name, *args)
+            )
+            log(f"Writing compressed chunks for {name}:", f"{len(bytedict)} bytes")
+            with stage("chunk write") as st:
+                header.write(self.path / f"{name}.json")
+                (self.path / name).with_suffix(".bin").write_bytes(bytedict)
+                st.add_file(self.path / f"{name}.json")
+                st.add_bytes(len(bytedict))
 
-        run() if not self.lazy else self.queue_.append((f"Add chunked {name}", run))
+        run() if not self.lazy else self.queue_.append(Queued(f"Add chunked {name}", run, "feature"))
         self._add_feature(
             ChunkedCSVParams(name=name, url=Url(f"{name}.bin"), unit=unit, dataType=dataType, coordName=coordName)
         )
@@ -349,9 +503,11 @@ class Sample(BaseModel):
             raise ValueError(f"Feature {name} not found.")
 
         self.featParams = [f for f in self.featParams if f.name != name]
-        (self.path / name).with_suffix(".csv").unlink(missing_ok=True)
-        (self.path / name).with_suffix(".bin").unlink(missing_ok=True)
-        (self.path / name).with_suffix(".json").unlink(missing_ok=True)
+        for suffix in (".csv", ".bin", ".json"):
+            path = (self.path / name).with_suffix(suffix)
+            path.unlink(missing_ok=True)
+            for sidecar in SIDECAR_SUFFIXES.values():
+                path.with_name(path.name + sidecar).unlink(missing_ok=True)
 
     def set_default_feature(self, *, group: str, feature: str) -> Self:
         self.overlayParams = self.overlayParams or OverlayParams()
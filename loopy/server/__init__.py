@@ -0,0 +1,792 @@
+from __future__ import annotations
+
+import errno
+import importlib.util
+import ipaddress
+import json
+import os
+import shutil
+import socket
+import subprocess
+import time
+import webbrowser
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from threading import Event, Thread
+from typing import Any, Callable, Iterable, Literal, Optional
+from urllib.parse import quote
+
+from loopy.logger import log
+
+OPTIONAL_ROUTES = ("query", "tiles")  # APIs beyond static files, enabled with `routes`
+
+
+def _build_app(
+    directory: Path,
+    public_host: Optional[str],
+    cache_mb: Optional[float] = None,
+    routes: Iterable[str] = (),
+) -> tuple[Any, Path, Callable[[str], str]]:
+    """Build the FastAPI app serving `directory` (a sample, or a folder of samples).
+
+    Returns the app, the static root it serves and the function building the
+    Samui link for a `host:port`. Files are served by `RangeFiles` (byte ranges,
+    ETag/Last-Modified revalidation), through a `cache_mb` MiB `RangeCache` if
+    given (kept on `app.state.range_cache`); `/` redirects to the Samui link.
+    The sample list is a polling `SampleRegistry` (`app.state.registry`, stopped
+    by `_shutdown`), so samples written while serving appear in the link and in
+    the `/_loopy/samples` JSON index. Request counts, bytes, range sizes, latency
+    quantiles and cache counters are served at `/metrics` (Prometheus format).
+
+    `routes` opts into the `OPTIONAL_ROUTES`, which do work per request rather
+    than serve files: `"query"` queries chunked features server-side under
+    `/_loopy/query/` (see `_feature_routes`) and `"tiles"` renders images as
+    composited tiles under `/tiles/` (see `_tile_routes`).
+    """
+    from fastapi import FastAPI
+    from fastapi.middleware.cors import CORSMiddleware
+    from starlette.responses import RedirectResponse, Response
+
+    from loopy.server.cache import RangeCache
+    from loopy.server.metrics import MetricsMiddleware, ServerMetrics
+    from loopy.server.registry import SampleRegistry
+    from loopy.server.static import RangeFiles
+
+    routes = set(routes)
+    if unknown := routes - set(OPTIONAL_ROUTES):
+        raise ValueError(f"Unknown routes: {', '.join(sorted(unknown))} (expected any of {OPTIONAL_ROUTES})")
+
+    app = FastAPI()
+    app.state.range_cache = RangeCache(int(cache_mb * 2**20)) if cache_mb else None
+
+    # Determine static root and the (live) sample list
+    if (directory / "sample.json").exists():
+        static_root = directory.parent
+        registry = SampleRegistry(static_root, only=directory.name)
+    else:
+        static_root = directory
+        registry = SampleRegistry(static_root)
+    registry.start()
+    app.state.registry = registry
+
+    # Build redirect link per-request to ensure correct host:port; cached per sample-list version
+    @lru_cache(maxsize=64)
+    def _samui_link(netloc: str, version: str) -> str:
+        # Respect public_host override (replace host, keep port)
+        if public_host and ":" in netloc:
+            _, portpart = netloc.split(":", 1)
+            base = f"{public_host}:{portpart}"
+        else:
+            base = public_host or netloc
+        if samples := registry.names:
+            s_params = "&".join(f"s={quote(n, safe='')}" for n in samples)
+            return f"https://samuibrowser.com/from?url={quote(base, safe='')}&{s_params}"
+        return f"https://samuibrowser.com/from?url={quote(base, safe='')}"
+
+    def _samui_link_for_netloc(netloc: str) -> str:
+        return _samui_link(netloc, registry.etag)
+
+    async def _sample_index(request):  # type: ignore[no-untyped-def]
+        body, etag = registry.index()
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if request.headers.get("if-none-match") == etag:
+            return Response(status_code=304, headers=headers)
+        return Response(body, media_type="application/json", headers=headers)
+
+    app.add_route("/_loopy/samples", _sample_index, methods=["GET", "HEAD"])
+
+    metrics = ServerMetrics(app.state.range_cache)
+
+    async def _metrics(request):  # type: ignore[no-untyped-def]
+        return Response(metrics.render(), media_type="text/plain; version=0.0.4")
+
+    app.add_route("/metrics", _metrics, methods=["GET"])
+    if "query" in routes:
+        _feature_routes(app, static_root, registry)
+    if "tiles" in routes:
+        _tile_routes(app, static_root, registry)
+
+    @app.middleware("http")
+    async def _root_redirect(request, call_next):  # type: ignore[no-redef]
+        if request.url.path == "/" and request.method in {"GET", "HEAD"}:
+            return RedirectResponse(url=_samui_link_for_netloc(request.url.netloc), status_code=307)
+        return await call_next(request)
+
+    app.mount("/", RangeFiles(static_root, html=True, cache=app.state.range_cache), name="static")
+    # Hardcoded CORS for Samui domains
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["https://samuibrowser.com", "https://dev.samuibrowser.com"],
+        allow_credentials=False,
+        allow_methods=["GET", "HEAD", "OPTIONS"],
+        allow_headers=["*"],
+        expose_headers=[
+            "Content-Range",
+            "Content-Length",
+            "Accept-Ranges",
+            "ETag",
+            "Last-Modified",
+            "X-Loopy-Count",
+        ],
+        max_age=3000,
+    )
+    app.add_middleware(MetricsMiddleware, metrics=metrics)  # outermost: times the whole request
+    return app, static_root, _samui_link_for_netloc
+
+
+def _feature_routes(app: Any, static_root: Path, registry: Any) -> None:
+    """Add the chunked feature query API (`loopy.server.query`) to `app`.
+
+    - `GET /_loopy/query/{sample}/{feature}/values?name=G[&bbox=x0,y0,x1,y1][&ids=a,b]`:
+      the values of column `G` for the selected cells, as `pack_values` binary
+      (`X-Loopy-Count` holds the number of cells).
+    - `GET /_loopy/query/{sample}/{feature}/top?n=10[&bbox=...][&ids=...]`:
+      JSON `{"cells": n, "top": [{"name", "mean"}, ...]}`.
+
+    Unknown samples/features/columns are `404`, malformed parameters `400`.
+    Decoding runs in worker threads.
+    """
+    import anyio
+    from starlette.responses import JSONResponse, Response
+
+    from loopy.server.query import FeatureQuery, pack_values, parse_bbox
+
+    query = FeatureQuery(static_root)
+    app.state.feature_query = query
+
+    def _selection(params: Any) -> dict[str, Any]:
+        ids = params.get("ids")
+        return {"bbox": parse_bbox(params.get("bbox")), "ids": ids.split(",") if ids else None}
+
+    async def _run(request, fn: Callable[..., Response]) -> Response:  # type: ignore[no-untyped-def]
+        sample, feature = request.path_params["sample"], request.path_params["feature"]
+        if sample not in registry.names:
+            return JSONResponse({"detail": f"Unknown sample {sample!r}"}, status_code=404)
+        try:
+            return await anyio.to_thread.run_sync(fn, sample, feature, dict(request.query_params))
+        except KeyError as e:
+            return JSONResponse({"detail": e.args[0]}, status_code=404)
+        except ValueError as e:
+            return JSONResponse({"detail": str(e)}, status_code=400)
+
+    def _values(sample: str, feature: str, params: dict[str, str]) -> Response:
+        if not (name := params.get("name")):
+            raise ValueError("Missing column name (?name=)")
+        rows, values = query.values(sample, feature, name, **_selection(params))
+        return Response(
+            pack_values(rows, values),
+            media_type="application/octet-stream",
+            headers={"X-Loopy-Count": str(len(rows)), "Cache-Control": "no-cache"},
+        )
+
+    def _top(sample: str, feature: str, params: dict[str, str]) -> Response:
+        feat = query.resolve(sample, feature)
+        rows = query.select(feat, **_selection(params))
+        top = query.rank(feat, rows, n=int(params.get("n", 10)))
+        return JSONResponse({"cells": len(rows), "top": [{"name": k, "mean": v} for k, v in top]})
+
+    async def _values_route(request):  # type: ignore[no-untyped-def]
+        return await _run(request, _values)
+
+    async def _top_route(request):  # type: ignore[no-untyped-def]
+        return await _run(request, _top)
+
+    app.add_route("/_loopy/query/{sample}/{feature}/values", _values_route, methods=["GET"])
+    app.add_route("/_loopy/query/{sample}/{feature}/top", _top_route, methods=["GET"])
+
+
+def _tile_routes(app: Any, static_root: Path, registry: Any) -> None:
+    """Add `GET /tiles/{sample}/{z}/{x}/{y}[.webp|.png]?c=name:color[:max]&c=...` (`loopy.server.tiles`).
+
+    `c` selects and colors channels (the sample's defaults if absent); the
+    format is the `y` suffix or `?format=`, WebP by default. Tiles carry an
+    ETag, checked against `If-None-Match` before rendering; unknown
+    samples/channels/tiles are `404`, bad selections `400`.
+    """
+    import anyio
+    from starlette.responses import JSONResponse, Response
+
+    from loopy.server.tiles import FORMATS, TileRenderer
+
+    renderer = TileRenderer(static_root)
+    app.state.tile_renderer = renderer
+
+    async def _tile(request):  # type: ignore[no-untyped-def]
+        p = request.path_params
+        y, _, suffix = p["y"].partition(".")
+        fmt = request.query_params.get("format") or suffix or "webp"
+        channels = request.query_params.getlist("c")
+        if p["sample"] not in registry.names:
+            return JSONResponse({"detail": f"Unknown sample {p['sample']!r}"}, status_code=404)
+        try:
+            etag = await anyio.to_thread.run_sync(
+                lambda: renderer.etag(p["sample"], channels=channels, fmt=fmt)
+            )
+            headers = {"ETag": etag, "Cache-Control": "no-cache"}
+            if request.headers.get("if-none-match") == etag:
+                return Response(status_code=304, headers=headers)
+            data, _ = await anyio.to_thread.run_sync(
+                lambda: renderer.render(p["sample"], p["z"], p["x"], int(y), channels=channels, fmt=fmt)
+            )
+        except KeyError as e:
+            return JSONResponse({"detail": e.args[0]}, status_code=404)
+        except ValueError as e:
+            return JSONResponse({"detail": str(e)}, status_code=400)
+        return Response(data, media_type=FORMATS[fmt], headers=headers)
+
+    app.add_route("/tiles/{sample}/{z:int}/{x:int}/{y}", _tile, methods=["GET"])
+
+
+def serve_directory_fastapi(
+    directory: Path,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    open_browser: bool = True,
+    *,
+    ssl_certfile: Optional[str] = None,
+    ssl_keyfile: Optional[str] = None,
+    max_port_tries: int = 20,
+    public_host: Optional[str] = None,
+    cache_mb: Optional[float] = None,
+    routes: Iterable[str] = (),
+    workers: int = 1,
+    keep_alive: float = 5.0,
+    graceful_timeout: float = 10.0,
+) -> None:
+    """Serve files using FastAPI + Uvicorn if available.
+
+    With `workers > 1`, Uvicorn forks that many worker processes sharing the
+    listening socket; each builds its own app from `_worker_app`, so the range
+    cache, sample registry and `/metrics` are per worker. uvloop and httptools
+    are used when installed. `keep_alive` is how long (s) an idle connection is
+    held open for the viewer's next range request; on SIGINT/SIGTERM, in-flight
+    requests get `graceful_timeout` seconds to finish.
+
+    Raises ImportError if fastapi/uvicorn is not installed.
+    """
+    directory = directory.resolve()
+    if not directory.exists() or not directory.is_dir():
+        raise ValueError(f"Directory does not exist: {directory}")
+
+    try:
+        import uvicorn
+        from fastapi import FastAPI  # noqa: F401
+    except Exception as e:  # noqa: BLE001
+        raise ImportError(
+            "FastAPI/Uvicorn not available. Install with `pip install fastapi uvicorn` or `uv add fastapi uvicorn`."
+        ) from e
+
+    sock = _bind_socket(host, port, max_port_tries)
+    app, static_root, _samui_link_for_netloc = _build_app(directory, public_host, cache_mb, routes)
+    bound_port = sock.getsockname()[1]
+    scheme = "https" if ssl_certfile and ssl_keyfile else "http"
+    url = f"{scheme}://{host}:{bound_port}/"
+    log("Serving", static_root, "at", url)
+    log("Open in Samui:", _samui_link_for_netloc(f"{host}:{bound_port}"))
+
+    if open_browser:
+
+        def _open() -> None:
+            try:
+                webbrowser.open(url)
+            except Exception as e:  # pragma: no cover
+                log("Failed to open browser:", e, type_="WARNING")
+
+        Thread(target=_open, daemon=True).start()
+
+    options = _uvicorn_options(keep_alive, graceful_timeout)
+    ssl = {"ssl_certfile": ssl_certfile, "ssl_keyfile": ssl_keyfile}
+    try:
+        if workers > 1:
+            # Workers are separate processes: they rebuild the app from this config,
+            # so this process's app only produced the link above.
+            app.state.registry.stop()
+            os.environ[WORKER_CONFIG_ENV] = json.dumps(
+                {
+                    "directory": str(directory),
+                    "public_host": public_host,
+                    "cache_mb": cache_mb,
+                    "routes": sorted(routes),
+                }
+            )
+            log(f"Starting {workers} workers ({options['loop']} loop, {options['http']} parser).")
+            uvicorn.run(
+                "loopy.server:_worker_app",
+                factory=True,
+                workers=workers,
+                fd=sock.fileno(),
+                log_level="info",
+                **ssl,
+                **options,
+            )
+        else:
+            uvicorn.Server(uvicorn.Config(app, log_level="info", **ssl, **options)).run(sockets=[sock])
+    except KeyboardInterrupt:  # re-raised by Uvicorn after its graceful shutdown on Ctrl+C
+        pass
+    finally:
+        sock.close()
+        log("Stopped serving:", url)
+        _shutdown(app)
+
+
+WORKER_CONFIG_ENV = "LOOPY_SERVE_CONFIG"
+ADDRESS_IN_USE = {errno.EADDRINUSE, 10048}  # 10048: WSAEADDRINUSE
+
+
+def _bind_socket(host: str, port: int, max_port_tries: int = 20) -> socket.socket:
+    """A listening socket on the first free port from `port` on.
+
+    Binding here, before the server starts, is what detects a busy port: the
+    servers would otherwise bind inside their own startup (Uvicorn exits the
+    process when that fails). Port 0 picks any free port.
+
+    `SO_REUSEADDR` lets a restarted server rebind a port still in TIME_WAIT on
+    POSIX, but on Windows it lets two sockets bind the same busy port, so there
+    `SO_EXCLUSIVEADDRUSE` is set instead and a busy port fails to bind.
+    """
+    last_err: Optional[OSError] = None
+    for try_port in range(port, port + max_port_tries) if port else [0]:
+        sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+        if hasattr(socket, "SO_EXCLUSIVEADDRUSE"):  # Windows only
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_EXCLUSIVEADDRUSE, 1)
+        else:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((host, try_port))
+        except OSError as e:
+            sock.close()
+            if e.errno not in ADDRESS_IN_USE:
+                raise
+            log(f"Port {try_port} in use; trying {try_port + 1}.", type_="WARNING")
+            last_err = e
+            continue
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+    assert last_err is not None
+    raise last_err
+
+
+def _worker_app() -> Any:
+    """App factory for multi-worker serving; the config comes from `WORKER_CONFIG_ENV`."""
+    cfg = json.loads(os.environ[WORKER_CONFIG_ENV])
+    app, _, _ = _build_app(Path(cfg["directory"]), cfg["public_host"], cfg["cache_mb"], cfg["routes"])
+    return app
+
+
+def _uvicorn_options(keep_alive: float, graceful_timeout: float) -> dict[str, Any]:
+    """Event loop / HTTP parser (uvloop and httptools when installed) and connection timeouts."""
+
+    def installed(module: str) -> bool:
+        return importlib.util.find_spec(module) is not None
+
+    return {
+        "loop": "uvloop" if installed("uvloop") else "asyncio",
+        "http": "httptools" if installed("httptools") else "h11",
+        "timeout_keep_alive": keep_alive,
+        "timeout_graceful_shutdown": graceful_timeout,
+    }
+
+
+def _shutdown(app: Any) -> None:
+    """Stop the app's background sample polling and log its cache stats."""
+    app.state.registry.stop()
+    cache = app.state.range_cache
+    if cache is not None:
+        st = cache.stats
+        log(
+            f"Range cache: {st.hits} hits, {st.misses} misses ({st.hit_ratio:.0%}),",
+            f"{st.entries} entries / {st.bytes / 2**20:.1f} MiB, {st.evictions} evictions",
+        )
+
+
+def prefer_fastapi_available() -> bool:
+    try:
+        import fastapi  # noqa: F401
+        import uvicorn  # noqa: F401
+
+        return True
+    except Exception:
+        return False
+
+
+@dataclass
+class ServerHandle:
+    """Handle for a background HTTP server, returned once it accepts connections.
+
+    `port` is the port actually bound (after fallback, or the one picked for
+    port 0). Use `stop()` to terminate. Supports context manager usage.
+    """
+
+    url: str
+    backend: Literal["fastapi", "hypercorn"]
+    port: int
+    _stopper: Callable[[], None]
+    _thread: Thread
+
+    def stop(self) -> None:
+        self._stopper()
+
+    def is_alive(self) -> bool:
+        return self._thread.is_alive()
+
+    def __enter__(self) -> "ServerHandle":  # pragma: no cover - convenience
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:  # pragma: no cover - convenience
+        self.stop()
+
+
+def _signal_ready(app: Any, ready: Event) -> Any:
+    """Wrap `app` to set `ready` once the server has run its lifespan startup (and so serves requests)."""
+
+    async def wrapped(scope: dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "lifespan":
+            return await app(scope, receive, send)
+
+        async def _send(message: dict[str, Any]) -> None:
+            await send(message)
+            if message["type"] == "lifespan.startup.complete":
+                ready.set()
+
+        await app(scope, receive, _send)
+
+    return wrapped
+
+
+def _run_in_background(run: Callable[[], None], ready: Event, timeout: float) -> Thread:
+    """Start `run` (a server's blocking loop) in a daemon thread and wait until it is `ready`.
+
+    Raises the server's own error if it exits during startup, TimeoutError if
+    it is not ready within `timeout` seconds.
+    """
+    errors: list[BaseException] = []
+
+    def _target() -> None:
+        try:
+            run()
+        except BaseException as e:  # noqa: BLE001 - re-raised in the caller's thread
+            errors.append(e)
+        finally:
+            ready.set()  # unblock the caller if the server exits before startup completes
+
+    thread = Thread(target=_target, daemon=True)
+    thread.start()
+    if not ready.wait(timeout):
+        raise TimeoutError(f"Server not ready after {timeout} s")
+    if errors:
+        raise RuntimeError("Server failed to start") from errors[0]
+    if not thread.is_alive():
+        raise RuntimeError("Server exited during startup")
+    return thread
+
+
+def _start_fastapi_server(
+    directory: Path,
+    host: str,
+    port: int,
+    *,
+    ssl_certfile: Optional[str] = None,
+    ssl_keyfile: Optional[str] = None,
+    public_host: Optional[str] = None,
+    cache_mb: Optional[float] = None,
+    routes: Iterable[str] = (),
+    keep_alive: float = 5.0,
+    startup_timeout: float = 10.0,
+) -> ServerHandle:
+    import uvicorn
+
+    sock = _bind_socket(host, port)
+    app, static_root, _samui_link_for_netloc = _build_app(directory, public_host, cache_mb, routes)
+    bound_port = sock.getsockname()[1]
+    ready = Event()
+    config = uvicorn.Config(
+        _signal_ready(app, ready),
+        lifespan="on",
+        log_level="info",
+        ssl_certfile=ssl_certfile,
+        ssl_keyfile=ssl_keyfile,
+        **_uvicorn_options(keep_alive, graceful_timeout=3),
+    )
+    server = uvicorn.Server(config)
+    scheme = "https" if ssl_certfile and ssl_keyfile else "http"
+    url = f"{scheme}://{host}:{bound_port}/"
+
+    try:
+        thread = _run_in_background(lambda: server.run(sockets=[sock]), ready, startup_timeout)
+    except BaseException:
+        server.should_exit = True
+        sock.close()
+        _shutdown(app)
+        raise
+    log("Serving", static_root, "at", url)
+    log("Open in Samui:", _samui_link_for_netloc(f"{host}:{bound_port}"))
+
+    def _stop() -> None:
+        server.should_exit = True
+        thread.join(timeout=5)
+        sock.close()
+        log("Server stopped.")
+        _shutdown(app)
+
+    return ServerHandle(url=url, backend="fastapi", port=bound_port, _stopper=_stop, _thread=thread)
+
+
+def serve_directory(
+    directory: Path | str,
+    *,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    open_browser: bool = True,
+    block: bool = True,
+    ssl_certfile: Optional[str] = None,
+    ssl_keyfile: Optional[str] = None,
+    public_host: Optional[str] = None,
+    cache_mb: Optional[float] = None,
+    routes: Iterable[str] = (),
+    workers: int = 1,
+    keep_alive: float = 5.0,
+    backend: Literal["uvicorn", "hypercorn"] = "uvicorn",
+) -> Optional[ServerHandle]:
+    """Serve `directory` over HTTP as a library function.
+
+    - `backend='uvicorn'` serves HTTP/1.1; `backend='hypercorn'` serves HTTP/2
+      when given a certificate, multiplexing the viewer's many range requests
+      over one connection (see `loopy.server.http2`).
+    - If `block=True` (default), runs until interrupted and returns `None`.
+      If `block=False`, returns a `ServerHandle` you can stop later, once the
+      server accepts connections; `handle.port` is the port actually bound
+      (`port=0` picks a free one).
+    - `cache_mb` enables an in-memory LRU of hot byte ranges of that size.
+    - `routes` enables optional APIs (`OPTIONAL_ROUTES`, e.g. `["query", "tiles"]`).
+    - `workers > 1` serves from that many processes (blocking mode only);
+      `keep_alive` is the idle connection timeout in seconds.
+
+    Example:
+        >>> from loopy.server import serve_directory
+        >>> serve_directory("./loopy/sample")  # blocks
+    """
+    directory = Path(directory).resolve()
+    if not directory.exists() or not directory.is_dir():
+        raise ValueError(f"Directory does not exist: {directory}")
+
+    if backend == "hypercorn":
+        if workers > 1:
+            raise ValueError("Multiple workers are only supported with backend='uvicorn'.")
+        from loopy.server.http2 import _start_hypercorn_server, serve_directory_hypercorn
+
+        options: dict[str, Any] = dict(
+            ssl_certfile=ssl_certfile,
+            ssl_keyfile=ssl_keyfile,
+            public_host=public_host,
+            cache_mb=cache_mb,
+            routes=routes,
+            keep_alive=keep_alive,
+        )
+        if block:
+            serve_directory_hypercorn(directory, host=host, port=port, open_browser=open_browser, **options)
+            return None
+        return _start_hypercorn_server(directory, host, port, **options)
+    if backend != "uvicorn":
+        raise ValueError(f"Unknown backend: {backend!r} (expected 'uvicorn' or 'hypercorn')")
+
+    if block:
+        try:
+            serve_directory_fastapi(
+                directory,
+                host=host,
+                port=port,
+                open_browser=open_browser,
+                ssl_certfile=ssl_certfile,
+                ssl_keyfile=ssl_keyfile,
+                public_host=public_host,
+                cache_mb=cache_mb,
+                routes=routes,
+                workers=workers,
+                keep_alive=keep_alive,
+            )
+        except ImportError:
+            raise ImportError("FastAPI/Uvicorn not available. Install extras with `pip install loopy-browser[server]`.")
+        return None
+    else:
+        if workers > 1:
+            raise ValueError("Multiple workers need block=True (worker processes cannot run in a thread).")
+        try:
+            return _start_fastapi_server(
+                directory,
+                host,
+                port,
+                ssl_certfile=ssl_certfile,
+                ssl_keyfile=ssl_keyfile,
+                public_host=public_host,
+                cache_mb=cache_mb,
+                routes=routes,
+                keep_alive=keep_alive,
+            )
+        except ImportError:
+            raise ImportError("FastAPI/Uvicorn not available. Install extras with `pip install loopy-browser[server]`.")
+
+
+def detect_client_host(bind_host: str) -> str:
+    if bind_host not in ("0.0.0.0", "::"):
+        return bind_host
+    try:
+        import socket
+
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+    except Exception:
+        try:
+            import socket as _s
+
+            return _s.gethostbyname(_s.gethostname())
+        except Exception:
+            return "127.0.0.1"
+
+
+def serve_samui(
+    directory: Path | str,
+    *,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    open_browser: bool = True,
+    block: bool = True,
+    cache_mb: Optional[float] = None,
+    routes: Iterable[str] = (),
+    workers: int = 1,
+    keep_alive: float = 5.0,
+    http2: bool = False,
+) -> Optional[ServerHandle]:
+    directory = Path(directory).resolve()
+    client_host = detect_client_host(host)
+    cert, key = get_or_create_self_signed(str(host), alt_hosts=[client_host] if client_host else None)
+    scheme = "https"
+    bound_url = f"{scheme}://{host}:{port}/"
+    log("URL (bound):", bound_url)
+    if client_host != host:
+        log("Client URL:", f"{scheme}://{client_host}:{port}/")
+    return serve_directory(
+        directory,
+        host=host,
+        port=port,
+        open_browser=open_browser,
+        block=block,
+        ssl_certfile=cert,
+        ssl_keyfile=key,
+        public_host=client_host,
+        cache_mb=cache_mb,
+        routes=routes,
+        workers=workers,
+        keep_alive=keep_alive,
+        backend="hypercorn" if http2 else "uvicorn",
+    )
+
+
+def get_or_create_self_signed(
+    host: str,
+    *,
+    days: int = 3650,
+    alt_hosts: Optional[Iterable[str]] = None,
+    ssl_dir: Optional[Path] = None,
+) -> tuple[str, str]:
+    """Create or reuse a cached self-signed cert for `host`.
+
+    - Caches under `ssl_dir` (default .loopy-ssl/ in the CWD) as <host>.cert.pem and .key.pem.
+    - Returns (cert_path, key_path). Requires the `openssl` binary for first-time generation.
+    """
+    openssl = shutil.which("openssl")
+    if not openssl:
+        raise RuntimeError("OpenSSL not found. Cannot generate a self-signed certificate. Please install OpenSSL.")
+
+    ssl_dir = ssl_dir if ssl_dir is not None else Path.cwd() / ".loopy-ssl"
+    ssl_dir.mkdir(parents=True, exist_ok=True)
+    # Sanitize filename components
+    safe_host = host.replace("/", "_").replace("\\", "_").replace(":", "_")
+    cert_path = ssl_dir / f"{safe_host}.cert.pem"
+    key_path = ssl_dir / f"{safe_host}.key.pem"
+    conf_path = ssl_dir / f"openssl-{safe_host}.cnf"
+
+    dns_idx = 1
+    ip_idx = 1
+
+    def add_dns(name: str) -> str:
+        nonlocal dns_idx
+        line = f"DNS.{dns_idx} = {name}"
+        dns_idx += 1
+        return line
+
+    def add_ip(addr: str) -> str:
+        nonlocal ip_idx
+        line = f"IP.{ip_idx} = {addr}"
+        ip_idx += 1
+        return line
+
+    alt_lines: list[str] = []
+    try:
+        ipaddress.ip_address(host)
+        alt_lines.append(add_ip(host))
+    except ValueError:
+        alt_lines.append(add_dns(host))
+    # Always include common loopback names
+    alt_lines.append(add_dns("localhost"))
+    alt_lines.append(add_ip("127.0.0.1"))
+    # Include any provided alt hosts (IPs or DNS)
+    if alt_hosts:
+        for h in alt_hosts:
+            try:
+                ipaddress.ip_address(h)
+                alt_lines.append(add_ip(h))
+            except ValueError:
+                alt_lines.append(add_dns(h))
+
+    conf = (
+        "[ req ]\n"
+        "default_bits       = 2048\n"
+        "distinguished_name = dn\n"
+        "x509_extensions    = v3_req\n"
+        "prompt             = no\n\n"
+        "[ dn ]\n"
+        f"CN = {host}\n\n"
+        "[ v3_req ]\n"
+        "subjectAltName = @alt_names\n"
+        "basicConstraints = CA:FALSE\n"
+        "keyUsage = digitalSignature, keyEncipherment\n"
+        "extendedKeyUsage = serverAuth\n\n"
+        "[ alt_names ]\n" + "\n".join(alt_lines) + "\n"
+    )
+    conf_path.write_text(conf)
+
+    # Reuse if exists
+    if cert_path.exists() and key_path.exists():
+        log("Using cached TLS cert:", cert_path, type_="DEBUG")
+        return str(cert_path), str(key_path)
+
+    # Generate new key+cert
+    cmd = [
+        openssl,
+        "req",
+        "-x509",
+        "-newkey",
+        "rsa:2048",
+        "-sha256",
+        "-days",
+        str(days),
+        "-nodes",
+        "-keyout",
+        str(key_path),
+        "-out",
+        str(cert_path),
+        "-config",
+        str(conf_path),
+    ]
+    try:
+        subprocess.run(cmd, check=True, capture_output=True)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(
+            f"Failed to generate self-signed certificate for {host}: {e.stderr.decode(errors='ignore')}"
+        ) from e
+    log("Generated self-signed TLS cert:", cert_path)
+
+    return str(cert_path), str(key_path)
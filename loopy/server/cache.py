@@ -0,0 +1,83 @@
+"""Memory-bounded LRU cache of file byte ranges for the sample server.
+
+When a lab opens the same sample at once, every viewer fetches the same
+`sample.json`, coordinates and default gene chunks. `RangeCache` keeps those
+byte ranges in RAM so repeats skip the disk (or NFS) entirely. Entries are
+keyed by (path, ETag, start, end); the ETag encodes mtime and size, so a
+rewritten file never serves stale bytes and its old entries simply age out.
+Other users (decoded feature columns, rendered tiles) key their own instance
+the same way, with whatever tuple identifies the bytes.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Hashable, Optional
+
+Key = tuple[Hashable, ...]
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class RangeCache:
+    """LRU of byte strings bounded by their total size.
+
+    Spans longer than `max_item_bytes` (default: an eighth of the budget) are
+    never cached, so one full download of a large COG cannot flush the hot set.
+    Safe to share between threads.
+    """
+
+    def __init__(self, max_bytes: int, *, max_item_bytes: Optional[int] = None) -> None:
+        if max_bytes <= 0:
+            raise ValueError(f"max_bytes must be positive, got {max_bytes}")
+        self.max_bytes = max_bytes
+        self.max_item_bytes = max_item_bytes if max_item_bytes is not None else max_bytes // 8
+        self._items: OrderedDict[Key, bytes] = OrderedDict()
+        self._lock = Lock()
+        self.stats = CacheStats()
+
+    def cacheable(self, length: int) -> bool:
+        return 0 < length <= self.max_item_bytes
+
+    def get(self, key: Key) -> Optional[bytes]:
+        with self._lock:
+            data = self._items.get(key)
+            if data is None:
+                self.stats.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.stats.hits += 1
+            return data
+
+    def put(self, key: Key, data: bytes) -> None:
+        if not self.cacheable(len(data)):
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.stats.bytes -= len(old)
+            self._items[key] = data
+            self.stats.bytes += len(data)
+            while self.stats.bytes > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.stats.bytes -= len(evicted)
+                self.stats.evictions += 1
+            self.stats.entries = len(self._items)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self.stats.bytes = self.stats.entries = 0
@@ -0,0 +1,150 @@
+"""HTTP/2 serving through Hypercorn, an alternative to the Uvicorn backend.
+
+Browsers open at most six HTTP/1.1 connections per origin, so a viewport that
+needs hundreds of small chunk and tile ranges queues behind them. Over HTTP/2
+those requests are multiplexed as concurrent streams on one connection.
+Browsers only speak HTTP/2 over TLS (negotiated with ALPN), which `serve_samui`
+always sets up; without a certificate Hypercorn still serves HTTP/1.1 and h2c.
+
+The app is the same `_build_app` app as with Uvicorn. The listening socket is
+bound up front (`_bind_socket`) and handed over to Hypercorn (which then owns
+it) as `fd://`.
+"""
+from __future__ import annotations
+
+import asyncio
+import socket
+import webbrowser
+from pathlib import Path
+from threading import Event, Thread
+from typing import Any, Iterable, Optional
+
+from loopy.logger import log
+from loopy.server import ServerHandle, _bind_socket, _build_app, _run_in_background, _shutdown, _signal_ready
+
+
+def _config(
+    sock: socket.socket, ssl_certfile: Optional[str], ssl_keyfile: Optional[str], keep_alive: float
+) -> Any:
+    from hypercorn.config import Config
+
+    config = Config()
+    config.bind = [f"fd://{sock.detach()}"]
+    if ssl_certfile and ssl_keyfile:
+        config.certfile = ssl_certfile
+        config.keyfile = ssl_keyfile
+    config.alpn_protocols = ["h2", "http/1.1"]
+    config.keep_alive_timeout = keep_alive
+    config.graceful_timeout = 3
+    config.accesslog = None
+    return config
+
+
+def _prepare(
+    directory: Path,
+    host: str,
+    port: int,
+    ssl_certfile: Optional[str],
+    ssl_keyfile: Optional[str],
+    public_host: Optional[str],
+    cache_mb: Optional[float],
+    keep_alive: float,
+    max_port_tries: int = 20,
+    routes: Iterable[str] = (),
+) -> tuple[Any, Any, str, int]:
+    try:
+        import hypercorn  # noqa: F401
+    except Exception as e:  # noqa: BLE001
+        raise ImportError("Hypercorn not available. Install with `pip install hypercorn`.") from e
+
+    sock = _bind_socket(host, port, max_port_tries)
+    app, static_root, _samui_link_for_netloc = _build_app(directory, public_host, cache_mb, routes)
+    selected_port = sock.getsockname()[1]
+    scheme = "https" if ssl_certfile and ssl_keyfile else "http"
+    url = f"{scheme}://{host}:{selected_port}/"
+    log("Serving", static_root, "at", url, "(HTTP/2)" if scheme == "https" else "(h2c/HTTP/1.1)")
+    log("Open in Samui:", _samui_link_for_netloc(f"{host}:{selected_port}"))
+    return app, _config(sock, ssl_certfile, ssl_keyfile, keep_alive), url, selected_port
+
+
+def serve_directory_hypercorn(
+    directory: Path,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    open_browser: bool = True,
+    ssl_certfile: Optional[str] = None,
+    ssl_keyfile: Optional[str] = None,
+    public_host: Optional[str] = None,
+    cache_mb: Optional[float] = None,
+    routes: Iterable[str] = (),
+    keep_alive: float = 5.0,
+) -> None:
+    """Serve files over HTTP/2 (with a certificate) using Hypercorn, until interrupted.
+
+    Raises ImportError if hypercorn is not installed.
+    """
+    from hypercorn.asyncio import serve
+
+    app, config, url, _ = _prepare(
+        directory.resolve(),
+        host,
+        port,
+        ssl_certfile,
+        ssl_keyfile,
+        public_host,
+        cache_mb,
+        keep_alive,
+        routes=routes,
+    )
+    if open_browser:
+        Thread(target=webbrowser.open, args=(url,), daemon=True).start()
+    try:
+        asyncio.run(serve(app, config))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log("Stopped serving:", url)
+        _shutdown(app)
+
+
+def _start_hypercorn_server(
+    directory: Path,
+    host: str,
+    port: int,
+    *,
+    ssl_certfile: Optional[str] = None,
+    ssl_keyfile: Optional[str] = None,
+    public_host: Optional[str] = None,
+    cache_mb: Optional[float] = None,
+    routes: Iterable[str] = (),
+    keep_alive: float = 5.0,
+    startup_timeout: float = 10.0,
+) -> ServerHandle:
+    from hypercorn.asyncio import serve
+
+    app, config, url, bound_port = _prepare(
+        directory, host, port, ssl_certfile, ssl_keyfile, public_host, cache_mb, keep_alive, routes=routes
+    )
+    loop = asyncio.new_event_loop()
+    stop = asyncio.Event()
+    ready = Event()
+
+    def _run() -> None:
+        try:
+            loop.run_until_complete(serve(_signal_ready(app, ready), config, shutdown_trigger=stop.wait))
+        finally:
+            loop.close()
+
+    try:
+        thread = _run_in_background(_run, ready, startup_timeout)
+    except BaseException:
+        _shutdown(app)
+        raise
+
+    def _stop() -> None:
+        loop.call_soon_threadsafe(stop.set)
+        thread.join(timeout=5)
+        log("Server stopped.")
+        _shutdown(app)
+
+    return ServerHandle(url=url, backend="hypercorn", port=bound_port, _stopper=_stop, _thread=thread)
@@ -0,0 +1,153 @@
+"""Request metrics for the sample server, exposed at `/metrics` in Prometheus text format.
+
+`MetricsMiddleware` wraps the whole app and records, per asset type (see
+`asset_type`): request counts by status, bytes sent, the sizes of `206` range
+responses (histogram) and request latency. Latency is reported as a summary
+whose p50/p95/p99 are computed at scrape time over the last `WINDOW` requests
+of each type, so they reflect current behavior rather than the whole uptime.
+The `RangeCache` counters, if the server has a cache, are exported alongside.
+"""
+from __future__ import annotations
+
+import os
+import time
+from collections import defaultdict, deque
+from pathlib import PurePosixPath
+from threading import Lock
+from typing import Any, Optional
+
+import numpy as np
+
+from loopy.server.cache import RangeCache
+from loopy.server.static import Receive, Scope, Send
+
+WINDOW = 4096
+QUANTILES = (0.5, 0.95, 0.99)
+RANGE_BUCKETS = (1 << 10, 1 << 12, 1 << 14, 1 << 16, 1 << 18, 1 << 20, 1 << 22, 1 << 24)
+ASSET_TYPES = {
+    ".json": "json",
+    ".csv": "csv",
+    ".bin": "chunks",
+    ".tif": "image",
+    ".tiff": "image",
+    ".png": "image",
+    ".jpg": "image",
+    ".md": "text",
+}
+
+
+def asset_type(path: str) -> str:
+    """Coarse label for a request path: the kind of sample asset, or `api` for `/_loopy` and `/metrics`."""
+    if path.startswith("/_loopy/") or path == "/metrics":
+        return "api"
+    return ASSET_TYPES.get(PurePosixPath(path).suffix.lower(), "other")
+
+
+class ServerMetrics:
+    def __init__(self, cache: Optional[RangeCache] = None) -> None:
+        self.cache = cache
+        self._lock = Lock()
+        self.requests: defaultdict[tuple[str, int], int] = defaultdict(int)
+        self.bytes_sent: defaultdict[str, int] = defaultdict(int)
+        self.range_counts: defaultdict[str, list[int]] = defaultdict(lambda: [0] * (len(RANGE_BUCKETS) + 1))
+        self.range_sum: defaultdict[str, int] = defaultdict(int)
+        self.latency: defaultdict[str, deque[float]] = defaultdict(lambda: deque(maxlen=WINDOW))
+        self.latency_sum: defaultdict[str, float] = defaultdict(float)
+        self.latency_count: defaultdict[str, int] = defaultdict(int)
+
+    def observe(self, asset: str, status: int, sent: int, seconds: float) -> None:
+        with self._lock:
+            self.requests[asset, status] += 1
+            self.bytes_sent[asset] += sent
+            self.latency[asset].append(seconds)
+            self.latency_sum[asset] += seconds
+            self.latency_count[asset] += 1
+            if status == 206:
+                self.range_counts[asset][int(np.searchsorted(RANGE_BUCKETS, sent))] += 1
+                self.range_sum[asset] += sent
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+        out: list[str] = []
+
+        def family(name: str, kind: str, help_: str) -> None:
+            out.append(f"# HELP {name} {help_}")
+            out.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            family("loopy_requests_total", "counter", "Requests served, by asset type and HTTP status.")
+            for (asset, status), n in sorted(self.requests.items()):
+                out.append(f'loopy_requests_total{{asset="{asset}",status="{status}"}} {n}')
+
+            family("loopy_response_bytes_total", "counter", "Body bytes sent, by asset type.")
+            for asset, n in sorted(self.bytes_sent.items()):
+                out.append(f'loopy_response_bytes_total{{asset="{asset}"}} {n}')
+
+            family("loopy_range_response_bytes", "histogram", "Body size of 206 (range) responses.")
+            for asset, counts in sorted(self.range_counts.items()):
+                cumulative = np.cumsum(counts)
+                for le, c in zip([*map(str, RANGE_BUCKETS), "+Inf"], cumulative):
+                    out.append(f'loopy_range_response_bytes_bucket{{asset="{asset}",le="{le}"}} {c}')
+                out.append(f'loopy_range_response_bytes_sum{{asset="{asset}"}} {self.range_sum[asset]}')
+                out.append(f'loopy_range_response_bytes_count{{asset="{asset}"}} {cumulative[-1]}')
+
+            family(
+                "loopy_request_duration_seconds",
+                "summary",
+                f"Request latency; quantiles over the last {WINDOW} requests of each asset type.",
+            )
+            name = "loopy_request_duration_seconds"
+            for asset, window in sorted(self.latency.items()):
+                qs = np.quantile(np.fromiter(window, dtype=float), QUANTILES)
+                for q, v in zip(QUANTILES, qs):
+                    out.append(f'{name}{{asset="{asset}",quantile="{q}"}} {v:.6g}')
+                out.append(f'{name}_sum{{asset="{asset}"}} {self.latency_sum[asset]:.6g}')
+                out.append(f'{name}_count{{asset="{asset}"}} {self.latency_count[asset]}')
+
+        if self.cache is not None:
+            st = self.cache.stats
+            for name, kind, help_, value in (
+                ("loopy_cache_hits_total", "counter", "Range cache hits.", st.hits),
+                ("loopy_cache_misses_total", "counter", "Range cache misses.", st.misses),
+                ("loopy_cache_evictions_total", "counter", "Range cache evictions.", st.evictions),
+                ("loopy_cache_hit_ratio", "gauge", "Range cache hits / lookups.", f"{st.hit_ratio:.6g}"),
+                ("loopy_cache_bytes", "gauge", "Bytes held by the range cache.", st.bytes),
+                ("loopy_cache_entries", "gauge", "Entries held by the range cache.", st.entries),
+            ):
+                family(name, kind, help_)
+                out.append(f"{name} {value}")
+        return "\n".join(out) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware feeding every HTTP request into a `ServerMetrics`."""
+
+    def __init__(self, app: Any, metrics: ServerMetrics) -> None:
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        sent = 0
+
+        async def _send(message: dict[str, Any]) -> None:
+            nonlocal status, sent
+            kind = message["type"]
+            if kind == "http.response.start":
+                status = message["status"]
+            elif kind == "http.response.body":
+                sent += len(message.get("body", b""))
+            elif kind == "http.response.zerocopysend":
+                sent += message.get("count") or 0
+            elif kind == "http.response.pathsend":
+                sent += os.stat(message["path"]).st_size
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            self.metrics.observe(asset_type(scope["path"]), status, sent, time.perf_counter() - start)
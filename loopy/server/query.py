@@ -0,0 +1,241 @@
+"""Server-side queries over chunked features, so clients need not download whole chunks.
+
+A chunked feature (`Sample.add_chunked_feature`) is a `.bin` of gzipped CSV
+chunks, one per feature column, located by the `ptr` offsets in its header
+`.json`. The viewer normally fetches and gunzips whole chunks; `FeatureQuery`
+instead reads one chunk by its `ptr` span, decodes it on the server and answers:
+
+- `values`: one column's values for the cells in a bounding box and/or a list
+  of ids (returned to clients as packed binary, see `pack_values`);
+- `top`: the columns with the highest mean over such a region (e.g. the top-N
+  genes of an ROI), decoding every column once.
+
+Decoded columns are kept in a `RangeCache` keyed by the chunk's byte span and
+the file's ETag, so a rewritten `.bin` is never answered from stale arrays.
+Packed samples (`<sample>.zip`) are read in place, through their members' spans
+(`loopy.server.static.sample_file`).
+Sparse columns (`sparseMode="array"`) stay sparse in the cache (int32 rows +
+float32 values), dense ones are float32. Per-cell (`"record"`) layouts store
+rows, not columns, and are not supported.
+"""
+from __future__ import annotations
+
+import gzip
+import io
+import json
+from functools import lru_cache
+from pathlib import Path
+from typing import NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from loopy.server.cache import RangeCache
+from loopy.server.static import FileInfo, sample_file
+
+CACHE_BYTES = 256 * 2**20
+BBox = tuple[float, float, float, float]  # x0, y0, x1, y1, in the coordinates' units
+
+
+class Column(NamedTuple):
+    """One decoded feature column; `index` is None for dense columns."""
+
+    index: Optional[np.ndarray]
+    value: np.ndarray
+
+    def to_bytes(self) -> bytes:
+        return self.value.tobytes() if self.index is None else self.index.tobytes() + self.value.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, sparse: bool) -> "Column":
+        if not sparse:
+            return cls(None, np.frombuffer(data, dtype=np.float32))
+        n = len(data) // 8
+        index = np.frombuffer(data, dtype=np.int32, count=n)
+        return cls(index, np.frombuffer(data, dtype=np.float32, offset=4 * n))
+
+    def take(self, rows: np.ndarray, length: int) -> np.ndarray:
+        """Values at `rows` (positions in the coordinates file); absent sparse entries are 0."""
+        if self.index is None:
+            return self.value[rows]
+        dense = np.zeros(length, dtype=np.float32)
+        dense[self.index] = self.value
+        return dense[rows]
+
+    def total(self, mask: np.ndarray) -> float:
+        """Sum over the cells selected by the boolean `mask`, ignoring NaNs."""
+        if self.index is None:
+            return float(np.nansum(self.value[mask]))
+        return float(np.nansum(self.value[mask[self.index]]))
+
+
+class Header(NamedTuple):
+    names: list[str]
+    ptr: np.ndarray
+    length: int
+    sparse: bool
+
+
+class Feature(NamedTuple):
+    bin: FileInfo
+    header: Header
+    coords: FileInfo
+
+
+@lru_cache(maxsize=64)
+def _read_header(info: FileInfo) -> Header:
+    h = json.loads(info.read())
+    if h.get("sparseMode") == "record":
+        raise ValueError(f"{info.name} stores rows (sparseMode='record'); columns cannot be queried")
+    names = h.get("names") or []
+    return Header(names, np.asarray(h["ptr"], dtype=np.int64), h["length"], h.get("sparseMode") == "array")
+
+
+@lru_cache(maxsize=16)
+def _read_coords(info: FileInfo) -> pd.DataFrame:
+    df = pd.read_csv(io.BytesIO(info.read()), index_col=0)
+    df.index = df.index.astype(str)
+    return df[["x", "y"]]
+
+
+@lru_cache(maxsize=64)
+def _read_sample(info: FileInfo) -> dict:
+    return json.loads(info.read())
+
+
+def _decode(raw: bytes, sparse: bool) -> Column:
+    if not raw:  # an all-zero sparse column is stored as an empty chunk
+        return Column(np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32))
+    text = gzip.decompress(raw)
+    if sparse:
+        df = pd.read_csv(io.BytesIO(text), dtype={"index": np.int32, "value": np.float32})
+        return Column(df["index"].to_numpy(), df["value"].to_numpy())
+    # A dense chunk is one CSV line of `length` values; one value per line parses the same, faster.
+    values = pd.read_csv(io.BytesIO(text.strip().replace(b",", b"\n")), header=None, dtype=np.float32)
+    return Column(None, values[0].to_numpy())
+
+
+def pack_values(rows: np.ndarray, values: np.ndarray) -> bytes:
+    """`n` little-endian uint32 row positions followed by their `n` float32 values."""
+    return rows.astype("<u4").tobytes() + values.astype("<f4").tobytes()
+
+
+class FeatureQuery:
+    """Queries over the chunked features of the samples under `root`.
+
+    `sample` is a sample name (a folder, or packed) and `feature` the name of a chunked
+    feature in its `sample.json`; unknown names raise KeyError, malformed or
+    unsupported requests ValueError. The `lru_cache`s of parsed files are keyed
+    by `FileInfo`, whose ETag changes when the file (or archive) is rewritten.
+    """
+
+    def __init__(self, root: Path, *, cache: Optional[RangeCache] = None) -> None:
+        self.root = root
+        self.cache = cache if cache is not None else RangeCache(CACHE_BYTES)
+
+    def resolve(self, sample: str, feature: str) -> Feature:
+        """Locate the feature's files through the sample's `sample.json` and read its header."""
+        info = sample_file(self.root, sample, "sample.json")
+        if info is None:
+            raise KeyError(f"Unknown sample {sample!r}")
+        meta = _read_sample(info)
+        params = {f["name"]: f for f in meta.get("featParams") or [] if f.get("type") == "chunkedCSV"}
+        if feature not in params:
+            raise KeyError(f"No chunked feature {feature!r} in sample {sample!r}")
+        fp = params[feature]
+        if fp.get("dataType", "quantitative") != "quantitative":
+            raise ValueError(f"{feature!r} is {fp['dataType']}; only quantitative features can be queried")
+        coords = {c["name"]: c for c in meta.get("coordParams") or []}
+        if fp["coordName"] not in coords:
+            raise KeyError(f"Coordinates {fp['coordName']!r} of {feature!r} not found")
+        default_header = Path(fp["url"]["url"]).with_suffix(".json").as_posix()
+        header = (fp.get("headerUrl") or {}).get("url", default_header)
+        urls = (fp["url"]["url"], header, coords[fp["coordName"]]["url"]["url"])
+        bin_, header_, coords_ = (sample_file(self.root, sample, url) for url in urls)
+        if bin_ is None or header_ is None or coords_ is None:
+            raise KeyError(f"Files of {feature!r} missing from sample {sample!r}")
+        return Feature(bin_, _read_header(header_), coords_)
+
+    def column(self, feat: Feature, i: int) -> Column:
+        """The decoded `i`-th column of `feat`, from the cache if possible."""
+        start, end = int(feat.header.ptr[i]), int(feat.header.ptr[i + 1])
+        key = (str(feat.bin.path), feat.bin.etag, start, end)
+        if (data := self.cache.get(key)) is not None:
+            return Column.from_bytes(data, feat.header.sparse)
+        raw = feat.bin.read(start, end)  # a descriptor per read, see `static.pread`
+        column = _decode(raw, feat.header.sparse)
+        if not feat.header.sparse and len(column.value) != feat.header.length:
+            n = feat.header.length
+            raise ValueError(f"Chunk {i} of {feat.bin.name} holds {len(column.value)} values, expected {n}")
+        self.cache.put(key, column.to_bytes())
+        return column
+
+    def select(
+        self, feat: Feature, *, bbox: Optional[BBox] = None, ids: Optional[Sequence[str]] = None
+    ) -> np.ndarray:
+        """Sorted row positions of the cells inside `bbox` and among `ids` (all cells if neither)."""
+        coords = _read_coords(feat.coords)
+        mask = np.ones(len(coords), dtype=bool)
+        if bbox is not None:
+            x0, y0, x1, y1 = bbox
+            x, y = coords["x"].to_numpy(), coords["y"].to_numpy()
+            mask &= (x >= min(x0, x1)) & (x <= max(x0, x1)) & (y >= min(y0, y1)) & (y <= max(y0, y1))
+        if ids is not None:
+            wanted = np.zeros(len(coords), dtype=bool)
+            rows = coords.index.get_indexer(pd.Index(ids, dtype=str))
+            wanted[rows[rows >= 0]] = True
+            mask &= wanted
+        return np.flatnonzero(mask)
+
+    def values(
+        self,
+        sample: str,
+        feature: str,
+        name: str,
+        *,
+        bbox: Optional[BBox] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Row positions of the selected cells and the values of column `name` there."""
+        feat = self.resolve(sample, feature)
+        try:
+            i = feat.header.names.index(name)
+        except ValueError:
+            raise KeyError(f"{name!r} is not a column of {feature!r}") from None
+        rows = self.select(feat, bbox=bbox, ids=ids)
+        return rows, self.column(feat, i).take(rows, feat.header.length)
+
+    def top(
+        self,
+        sample: str,
+        feature: str,
+        *,
+        n: int = 10,
+        bbox: Optional[BBox] = None,
+        ids: Optional[Sequence[str]] = None,
+    ) -> list[tuple[str, float]]:
+        """The `n` columns with the highest mean over the selected cells, as (name, mean)."""
+        feat = self.resolve(sample, feature)
+        return self.rank(feat, self.select(feat, bbox=bbox, ids=ids), n=n)
+
+    def rank(self, feat: Feature, rows: np.ndarray, *, n: int = 10) -> list[tuple[str, float]]:
+        """`top` over already selected `rows` of a resolved `feat`."""
+        if not len(rows) or n <= 0:
+            return []
+        mask = np.zeros(feat.header.length, dtype=bool)
+        mask[rows] = True
+        means = np.array([self.column(feat, i).total(mask) for i in range(len(feat.header.names))])
+        means /= len(rows)
+        best = np.argsort(-means, kind="stable")[:n]
+        return [(feat.header.names[i], float(means[i])) for i in best]
+
+
+def parse_bbox(value: Optional[str]) -> Optional[BBox]:
+    """`"x0,y0,x1,y1"` from a query string."""
+    if not value:
+        return None
+    parts = value.split(",")
+    if len(parts) != 4:
+        raise ValueError(f"bbox must be x0,y0,x1,y1, got {value!r}")
+    x0, y0, x1, y1 = (float(p) for p in parts)
+    return x0, y0, x1, y1
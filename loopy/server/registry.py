@@ -0,0 +1,169 @@
+"""Live index of the samples under a served directory.
+
+`SampleRegistry` keeps the list of sample folders (subdirectories with a
+`sample.json`) current while the server runs, so samples written after startup
+show up in the Samui link and in the `/_loopy/samples` index without a restart.
+
+It polls rather than using inotify: inotify does not see changes made by other
+hosts on NFS, where shared sample directories usually live. Each poll is one
+listing of the root plus one `stat` of each `sample.json`; a sample's folder is
+only re-listed (to total its size) when its `sample.json` changed, so polling
+stays cheap with hundreds of samples. The serialized index is rebuilt only when
+something changed and carries an ETag so clients can revalidate for free.
+
+Samples packed into `<name>.zip` (`Sample.write(pack=True)`) are listed too,
+from the archive's central directory; a folder of the same name wins, as it
+does when `RangeFiles` serves the files. A `.zip` that is not a sample is
+remembered by name, mtime and size, and not re-read until one of them changes.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import zipfile
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from threading import Event, Lock, Thread
+from typing import Optional
+
+from loopy.logger import log
+from loopy.utils.archive import ARCHIVE_SUFFIX, read_index
+
+
+@dataclass(frozen=True)
+class SampleEntry:
+    name: str
+    modified: float  # mtime of sample.json (of the archive for a packed sample)
+    bytes: int  # total size of the files directly in the sample folder (or of the archive)
+    files: int
+
+
+def _scan_sample(path: Path, modified: float) -> SampleEntry:
+    if path.suffix == ARCHIVE_SUFFIX:
+        index = read_index(path)
+        if "sample.json" not in index:
+            raise ValueError(f"{path} is not a packed sample")
+        return SampleEntry(path.stem, modified, path.stat().st_size, len(index))
+    size = files = 0
+    with os.scandir(path) as it:
+        for e in it:
+            if e.is_file():
+                size += e.stat().st_size
+                files += 1
+    return SampleEntry(path.name, modified, size, files)
+
+
+class SampleRegistry:
+    """Samples under `root`, refreshed every `interval` seconds once `start`ed.
+
+    With `only`, the registry tracks that single sample folder (serving one
+    sample whose parent is the static root).
+    """
+
+    def __init__(self, root: Path, *, only: Optional[str] = None, interval: float = 2.0) -> None:
+        self.root = root
+        self.only = only
+        self.interval = interval
+        self._entries: dict[str, SampleEntry] = {}
+        self._index = b""
+        self.etag = ""
+        self._lock = Lock()
+        self._stop = Event()
+        self._thread: Optional[Thread] = None
+        self._rejected: dict[str, tuple[int, int]] = {}  # archive name -> (st_mtime_ns, st_size)
+        self.refresh()
+
+    @property
+    def names(self) -> list[str]:
+        return sorted(self._entries)
+
+    def index(self) -> tuple[bytes, str]:
+        """The JSON index and its ETag, as of the last refresh."""
+        with self._lock:
+            return self._index, self.etag
+
+    def _candidates(self) -> dict[str, tuple[Path, float, Optional[tuple[int, int]]]]:
+        """Sample name -> (its folder or archive, mtime of its sample.json or of the archive, stamp).
+
+        The stamp identifies an archive's version for `_rejected` (None for folders);
+        archives already rejected in that version are left out.
+        """
+        names = [self.only] if self.only else None
+        archives = [self.only + ARCHIVE_SUFFIX] if self.only else None
+        if names is None or archives is None:
+            try:
+                with os.scandir(self.root) as it:
+                    entries = [e for e in it if not e.name.startswith(".")]
+                names = [e.name for e in entries if e.is_dir()]
+                archives = [e.name for e in entries if e.is_file() and e.name.endswith(ARCHIVE_SUFFIX)]
+            except OSError:
+                names, archives = [], []
+        found = {}
+        for name in archives:
+            path = self.root / name
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            stamp = (st.st_mtime_ns, st.st_size)
+            if self._rejected.get(name) != stamp:
+                found[name.removesuffix(ARCHIVE_SUFFIX)] = (path, st.st_mtime, stamp)
+        for name in names:
+            try:
+                found[name] = (self.root / name, (self.root / name / "sample.json").stat().st_mtime, None)
+            except OSError:
+                continue
+        return found
+
+    def refresh(self) -> bool:
+        """Re-poll the root; return True if the set of samples or any sample changed."""
+        found = self._candidates()
+        entries = {}
+        for name, (path, modified, stamp) in found.items():
+            old = self._entries.get(name)
+            if old is not None and old.modified == modified:
+                entries[name] = old
+                continue
+            try:
+                entries[name] = _scan_sample(path, modified)
+            except OSError:  # removed meanwhile
+                continue
+            except (ValueError, zipfile.BadZipFile):  # not a sample archive (in this version)
+                if stamp is not None:
+                    self._rejected[path.name] = stamp
+        if entries == self._entries and self.etag:
+            return False
+
+        added = entries.keys() - self._entries.keys()
+        removed = self._entries.keys() - entries.keys()
+        body = json.dumps({"samples": [asdict(entries[n]) for n in sorted(entries)]}).encode()
+        with self._lock:
+            self._entries = entries
+            self._index = body
+            self.etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        if self._thread is not None and (added or removed):
+            log("Samples updated:", *(f"+{n}" for n in sorted(added)), *(f"-{n}" for n in sorted(removed)))
+        return True
+
+    def _poll(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:  # keep serving with the last good index
+                log("Sample registry refresh failed:", e, type_="WARNING")
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = Thread(target=self._poll, name="sample-registry", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.interval + 1)
+            self._thread = None
+
+    def __repr__(self) -> str:
+        return f"SampleRegistry({self.root}, {len(self._entries)} samples)"
@@ -0,0 +1,467 @@
+"""Range-aware static file serving for sample directories (a plain ASGI app).
+
+The viewer reads chunked features and COG tiles as thousands of small `Range`
+requests against a handful of large files, and reopens the same samples across
+sessions. `RangeFiles` serves those with:
+
+- single ranges as `206` and multiple ranges as `multipart/byteranges`
+  (overlapping/adjacent spans coalesced, unsatisfiable ranges answered `416`);
+- a strong `ETag` (mtime + size) and `Last-Modified` on every response, so
+  `If-None-Match` / `If-Modified-Since` are answered `304` from one `stat`, and
+  `If-Range` falls back to the full file when the asset changed;
+- `Cache-Control: immutable` only under an explicit `immutable/` directory
+  (`IMMUTABLE`, e.g. the viewer's hashed `_app/immutable/` bundle) and `no-cache`
+  (always revalidate, which is a cheap `304`) for everything else, since sample
+  assets are rewritten in place under the same names;
+- the `.br`/`.gz` sidecar written by `Sample.write(precompress=True)` for
+  JSON/CSV assets when the client accepts that encoding (`Vary: Accept-Encoding`);
+- optionally, hot spans served from an in-process `RangeCache`;
+- zero-copy bodies when the ASGI server offers the `http.response.pathsend` or
+  `http.response.zerocopysend` extension; otherwise `pread` in worker threads on
+  a file descriptor opened per request (`os.pread` where available, else seek +
+  read, which is safe because no other request shares the descriptor);
+- files of a sample packed with `Sample.write(pack=True)`: when `<sample>/<file>`
+  is not on disk but `<sample>.zip` is, the file is served as the byte range
+  of its stored member (see `loopy.utils.archive`), with the same headers.
+"""
+from __future__ import annotations
+
+import mimetypes
+import os
+import re
+import secrets
+import zipfile
+from dataclasses import dataclass
+from email.utils import formatdate, parsedate_to_datetime
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+import anyio
+
+from loopy.server.cache import RangeCache
+from loopy.utils.archive import ARCHIVE_SUFFIX, read_index
+from loopy.utils.utils import SIDECAR_SUFFIXES
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+
+CHUNK_SIZE = 256 * 1024
+MAX_RANGES = 64  # more spans than this are answered with the whole file (RFC 9110 §14.2)
+IMMUTABLE = re.compile(r"(^|/)immutable/")
+RANGE_SPEC = re.compile(r"^(\d*)-(\d*)$")
+COMPRESSIBLE = {".json", ".csv"}  # assets `Sample.write(precompress=True)` writes sidecars for
+CACHE_IMMUTABLE = "public, max-age=31536000, immutable"
+CACHE_REVALIDATE = "no-cache"
+OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_BINARY", 0)  # no newline translation on Windows
+_os_pread = getattr(os, "pread", None)  # missing on Windows; see `pread`
+
+mimetypes.add_type("application/octet-stream", ".bin")
+mimetypes.add_type("image/tiff", ".tif")
+
+
+@dataclass(frozen=True)
+class FileInfo:
+    """What the response headers need from one `stat` of a file."""
+
+    path: Path
+    size: int
+    mtime: float
+    etag: str
+    encoding: Optional[str] = None  # set when `path` is a precompressed sidecar being negotiated
+    member: Optional[str] = None  # set when `path` is an archive and this is one of its members
+    offset: int = 0  # of the member's bytes in the archive
+
+    @classmethod
+    def from_path(cls, path: Path, encoding: Optional[str] = None) -> "FileInfo":
+        st = path.stat()
+        return cls(path, st.st_size, st.st_mtime, f'"{st.st_mtime_ns:x}-{st.st_size:x}"', encoding)
+
+    def member_info(self, member: str, encoding: Optional[str] = None) -> Optional["FileInfo"]:
+        """The stored `member` of this archive, or None if it has no such member."""
+        span = _archive_index(self.path, self.etag).get(member)
+        if span is None:
+            return None
+        offset, size = span
+        etag = f'{self.etag[:-1]}-{offset:x}"'  # members of one archive version differ by offset
+        return FileInfo(self.path, size, self.mtime, etag, encoding, member, offset)
+
+    def read(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Bytes `start` up to `end` (exclusive; default: all) of the file, or of the member."""
+        end = self.size if end is None else end
+        return _read_span(self.path, (start, end - 1), self.offset) if end > start else b""
+
+    @property
+    def name(self) -> str:
+        return self.member.rpartition("/")[2] if self.member is not None else self.path.name
+
+    @property
+    def last_modified(self) -> str:
+        return formatdate(self.mtime, usegmt=True)
+
+    @property
+    def content_type(self) -> str:
+        kind, encoding = mimetypes.guess_type(self.name)
+        if encoding and self.encoding is None:  # a .gz/.br asked for by name is opaque bytes
+            return "application/gzip" if encoding == "gzip" else "application/octet-stream"
+        kind = kind or "application/octet-stream"
+        return f"{kind}; charset=utf-8" if kind.startswith("text/") or kind.endswith("json") else kind
+
+
+@lru_cache(maxsize=128)
+def _archive_index(path: Path, etag: str) -> dict[str, tuple[int, int]]:
+    return read_index(path)
+
+
+def sample_file(root: Path, sample: str, name: str) -> Optional[FileInfo]:
+    """The file `name` of `sample` under `root`: from its folder, else as a member of `<sample>.zip`.
+
+    This is the lookup `RangeFiles` does for `/<sample>/<name>`, for server code
+    reading sample files itself. None if there is no such file, or `sample` is
+    not a plain folder name.
+    """
+    if sample in ("", ".", "..") or "/" in sample or "\\" in sample:
+        return None
+    path = root / sample / name
+    if path.is_file():
+        return FileInfo.from_path(path)
+    archive = root / (sample + ARCHIVE_SUFFIX)
+    if not archive.is_file():
+        return None
+    try:
+        return FileInfo.from_path(archive).member_info(name)
+    except (OSError, ValueError, zipfile.BadZipFile):  # removed meanwhile, or not a readable ZIP
+        return None
+
+
+def parse_range(header: str, size: int) -> Optional[list[tuple[int, int]]]:
+    """Parse a `Range: bytes=...` header into sorted, coalesced inclusive spans.
+
+    Returns None when the header should be ignored (not a well-formed bytes
+    range, or more than `MAX_RANGES` spans) and the whole file served, and an
+    empty list when it is well-formed but no span is satisfiable (`416`).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+    parts = spec.split(",")
+    if len(parts) > MAX_RANGES:
+        return None
+    spans = []
+    for part in parts:
+        m = RANGE_SPEC.match(part.strip())
+        if m is None or m.groups() == ("", ""):
+            return None
+        first, last = m.groups()
+        if not first:  # suffix range: the last N bytes
+            if int(last) > 0 and size > 0:
+                spans.append((max(size - int(last), 0), size - 1))
+            continue
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        if start < size:
+            spans.append((start, min(int(last), size - 1) if last else size - 1))
+
+    merged: list[tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def accepted_encodings(header: str) -> set[str]:
+    """Content codings an `Accept-Encoding` header allows (q > 0), lowercased."""
+    accepted = set()
+    for item in header.split(","):
+        name, _, params = item.partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name.strip() and q > 0:
+            accepted.add(name.strip().lower())
+    return accepted
+
+
+def _etag_matches(header: str, etag: str, *, weak: bool) -> bool:
+    if header.strip() == "*":
+        return True
+    tags = [t.strip() for t in header.split(",")]
+    if weak:
+        return etag in (t.removeprefix("W/") for t in tags)
+    return etag in tags
+
+
+def _not_older(header: str, info: FileInfo) -> bool:
+    """True if the HTTP date `header` is at or after the file's mtime (second precision)."""
+    try:
+        return int(info.mtime) <= parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def not_modified(headers: dict[str, str], info: FileInfo) -> bool:
+    """Whether a GET/HEAD with these request headers can be answered `304`."""
+    if "if-none-match" in headers:  # takes precedence over If-Modified-Since
+        return _etag_matches(headers["if-none-match"], info.etag, weak=True)
+    return "if-modified-since" in headers and _not_older(headers["if-modified-since"], info)
+
+
+def range_applies(headers: dict[str, str], info: FileInfo) -> bool:
+    """Whether the request's `Range` should be honored given its `If-Range` (if any)."""
+    if "range" not in headers:
+        return False
+    validator = headers.get("if-range")
+    if validator is None:
+        return True
+    if validator.strip().startswith(('"', "W/")):
+        return _etag_matches(validator, info.etag, weak=False)
+    try:
+        return int(info.mtime) == int(parsedate_to_datetime(validator).timestamp())
+    except (TypeError, ValueError):
+        return False
+
+
+class RangeFiles:
+    """Serve the files under `root`; directories serve their `index.html` when `html`.
+
+    With a `cache`, spans small enough for it are served from RAM after the first
+    read (see `loopy.server.cache`); larger spans always stream from disk.
+    """
+
+    def __init__(self, root: Path | str, *, html: bool = True, cache: Optional[RangeCache] = None) -> None:
+        self.root = Path(root).resolve()
+        self.html = html
+        self.cache = cache
+
+    def resolve(self, url_path: str) -> Optional[Path]:
+        """Map a request path to a regular file under `root`, or None (no traversal out of it)."""
+        target = (self.root / url_path.lstrip("/")).resolve()
+        if os.path.commonpath([self.root, target]) != str(self.root):
+            return None
+        if target.is_dir() and self.html:
+            target = target / "index.html"
+        return target if target.is_file() else None
+
+    def resolve_packed(self, url_path: str) -> Optional[FileInfo]:
+        """Map `<sample>/<file>` to the member `<file>` of the archive `<sample>.zip`, or None."""
+        target = (self.root / url_path.lstrip("/")).resolve()
+        archive = target.parent.with_name(target.parent.name + ARCHIVE_SUFFIX)
+        if os.path.commonpath([self.root, archive]) != str(self.root) or not archive.is_file():
+            return None
+        try:
+            return FileInfo.from_path(archive).member_info(target.name)
+        except (OSError, ValueError):  # removed meanwhile, or not a readable ZIP
+            return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        assert scope["type"] == "http"
+        if scope["method"] not in ("GET", "HEAD"):
+            await _respond(send, 405, [(b"allow", b"GET, HEAD")], b"Method Not Allowed")
+            return
+        path = self.resolve(scope["path"])
+        info = FileInfo.from_path(path) if path is not None else self.resolve_packed(scope["path"])
+        if info is None:
+            await _respond(send, 404, [], b"Not Found")
+            return
+        headers = {k.decode("latin-1").lower(): v.decode("latin-1") for k, v in scope["headers"]}
+        if Path(info.name).suffix in COMPRESSIBLE:
+            info = self.negotiate(info, headers)
+        await self.serve(scope, send, info, headers)
+
+    def negotiate(self, info: FileInfo, headers: dict[str, str]) -> FileInfo:
+        """Swap in the preferred acceptable `.br`/`.gz` sidecar of `info`, if one is up to date.
+
+        Only whole-file requests are negotiated; a `Range` always refers to the
+        identity bytes. Sidecars older than the file (it was rewritten without
+        `precompress`) are ignored.
+        """
+        if "range" in headers:
+            return info
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        for encoding, suffix in SIDECAR_SUFFIXES.items():  # br first
+            if encoding not in accepted:
+                continue
+            if info.member is not None:  # packed together, so never stale
+                sidecar = FileInfo.from_path(info.path).member_info(info.member + suffix, encoding)
+                if sidecar is not None:
+                    return sidecar
+                continue
+            try:
+                sidecar = FileInfo.from_path(info.path.with_name(info.path.name + suffix), encoding)
+            except FileNotFoundError:
+                continue
+            if sidecar.mtime >= info.mtime:
+                return sidecar
+        return info
+
+    async def serve(self, scope: Scope, send: Send, info: FileInfo, headers: dict[str, str]) -> None:
+        """Answer one GET/HEAD for `info` with a 200, 206, 304 or 416."""
+        rel = info.member if info.member is not None else info.path.relative_to(self.root).as_posix()
+        common = [
+            (b"etag", info.etag.encode()),
+            (b"last-modified", info.last_modified.encode()),
+            (b"cache-control", (CACHE_IMMUTABLE if IMMUTABLE.search(rel) else CACHE_REVALIDATE).encode()),
+            (b"accept-ranges", b"bytes"),
+        ]
+        if info.encoding:
+            common.append((b"content-encoding", info.encoding.encode()))
+        if info.encoding or Path(info.name).suffix in COMPRESSIBLE:
+            common.append((b"vary", b"Accept-Encoding"))
+        if not_modified(headers, info):
+            await _respond(send, 304, common, b"")
+            return
+
+        head = scope["method"] == "HEAD"
+        spans = parse_range(headers["range"], info.size) if range_applies(headers, info) else None
+        content_type = info.content_type.encode()
+        if spans is None:
+            await _start(send, 200, [*common, (b"content-type", content_type), _length(info.size)])
+            await self._send_body(scope, send, info, [(0, info.size - 1)] if info.size and not head else [])
+        elif not spans:
+            await _respond(send, 416, [*common, (b"content-range", f"bytes */{info.size}".encode())], b"")
+        elif len(spans) == 1:
+            start, end = spans[0]
+            content_range = f"bytes {start}-{end}/{info.size}".encode()
+            headers = [*common, (b"content-type", content_type), (b"content-range", content_range)]
+            await _start(send, 206, [*headers, _length(end - start + 1)])
+            await self._send_body(scope, send, info, [] if head else spans)
+        else:
+            await self._send_multipart(scope, send, info, spans, common, head)
+
+    async def _send_multipart(
+        self,
+        scope: Scope,
+        send: Send,
+        info: FileInfo,
+        spans: list[tuple[int, int]],
+        common: list[tuple[bytes, bytes]],
+        head: bool,
+    ) -> None:
+        boundary = secrets.token_hex(12)
+        parts = [
+            (
+                f"--{boundary}\r\nContent-Type: {info.content_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{info.size}\r\n\r\n"
+            ).encode()
+            for start, end in spans
+        ]
+        closing = f"--{boundary}--\r\n".encode()
+        length = sum(map(len, parts)) + sum(e - s + 1 for s, e in spans) + 2 * len(spans) + len(closing)
+        content_type = f"multipart/byteranges; boundary={boundary}".encode()
+        await _start(send, 206, [*common, (b"content-type", content_type), _length(length)])
+        if head:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+        fd = await anyio.to_thread.run_sync(os.open, info.path, OPEN_FLAGS)
+        try:
+            for part, span in zip(parts, spans):
+                await send({"type": "http.response.body", "body": part, "more_body": True})
+                if self._caches(span):
+                    data = await self._cached(info, span)
+                    await send({"type": "http.response.body", "body": data, "more_body": True})
+                else:
+                    await _pread_span(send, fd, span, info.offset)
+                await send({"type": "http.response.body", "body": b"\r\n", "more_body": True})
+        finally:
+            os.close(fd)
+        await send({"type": "http.response.body", "body": closing, "more_body": False})
+
+    def _caches(self, span: tuple[int, int]) -> bool:
+        return self.cache is not None and self.cache.cacheable(span[1] - span[0] + 1)
+
+    async def _cached(self, info: FileInfo, span: tuple[int, int]) -> bytes:
+        """Bytes `span` of the file, from the cache or read (and cached) on a miss."""
+        assert self.cache is not None
+        key = (str(info.path), info.etag, *span)
+        data = self.cache.get(key)
+        if data is None:
+            data = await anyio.to_thread.run_sync(_read_span, info.path, span, info.offset)
+            self.cache.put(key, data)
+        return data
+
+    async def _send_body(
+        self, scope: Scope, send: Send, info: FileInfo, spans: list[tuple[int, int]]
+    ) -> None:
+        """Send the body for at most one span: cached, zero-copy if the server offers it, else pread."""
+        extensions = scope.get("extensions") or {}
+        if not spans:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        elif self._caches(spans[0]):
+            data = await self._cached(info, spans[0])
+            await send({"type": "http.response.body", "body": data, "more_body": False})
+        elif "http.response.pathsend" in extensions and info.member is None and spans == [(0, info.size - 1)]:
+            await send({"type": "http.response.pathsend", "path": str(info.path)})
+        elif "http.response.zerocopysend" in extensions:
+            start, end = spans[0]
+            with open(info.path, "rb") as fh:
+                message = {"type": "http.response.zerocopysend", "file": fh, "offset": info.offset + start}
+                await send({**message, "count": end - start + 1})
+        else:
+            fd = await anyio.to_thread.run_sync(os.open, info.path, OPEN_FLAGS)
+            try:
+                await _pread_span(send, fd, spans[0], info.offset)
+            finally:
+                os.close(fd)
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _length(n: int) -> tuple[bytes, bytes]:
+    return (b"content-length", str(n).encode())
+
+
+async def _start(send: Send, status: int, headers: list[tuple[bytes, bytes]]) -> None:
+    await send({"type": "http.response.start", "status": status, "headers": headers})
+
+
+async def _respond(send: Send, status: int, headers: list[tuple[bytes, bytes]], body: bytes) -> None:
+    await _start(send, status, headers if status == 304 else [*headers, _length(len(body))])
+    await send({"type": "http.response.body", "body": body, "more_body": False})
+
+
+def pread(fd: int, n: int, pos: int) -> bytes:
+    """Read up to `n` bytes of `fd` at `pos`: `os.pread`, or seek + read where it is missing (Windows).
+
+    The fallback moves the descriptor's offset, so `fd` must not be shared between
+    concurrent readers; every caller here opens its own.
+    """
+    if _os_pread is not None:
+        return _os_pread(fd, n, pos)
+    os.lseek(fd, pos, os.SEEK_SET)
+    return os.read(fd, n)
+
+
+def _read_span(path: Path, span: tuple[int, int], offset: int = 0) -> bytes:
+    """Read bytes `span` (inclusive, shifted by `offset`) of `path` in full (pread may return short reads)."""
+    pos, end = span[0] + offset, span[1] + offset
+    out = bytearray()
+    fd = os.open(path, OPEN_FLAGS)
+    try:
+        while pos <= end:
+            chunk = pread(fd, end - pos + 1, pos)
+            if not chunk:
+                raise OSError(f"unexpected end of file in {path} at byte {pos}")
+            out += chunk
+            pos += len(chunk)
+    finally:
+        os.close(fd)
+    return bytes(out)
+
+
+async def _pread_span(send: Send, fd: int, span: tuple[int, int], offset: int = 0) -> None:
+    """Send bytes `span` (inclusive, shifted by `offset`) of `fd` as non-final body messages."""
+    pos, end = span[0] + offset, span[1] + offset
+    while pos <= end:
+        chunk = await anyio.to_thread.run_sync(pread, fd, min(CHUNK_SIZE, end - pos + 1), pos)
+        if not chunk:  # truncated under us; the declared length can no longer be met
+            raise OSError(f"unexpected end of file at byte {pos}")
+        await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        pos += len(chunk)
@@ -0,0 +1,228 @@
+"""Server-side tile rendering from a sample's COGs, for clients too slow to composite them.
+
+`Sample.add_image` writes an image of many channels as several 3-band COGs
+(`GeoTiff._write_compressed_geotiff`, with 4x-64x overviews). To show a few of
+30 channels, the viewer would fetch and decode a tile of every COG holding one
+of them. `TileRenderer` instead reads the needed bands of one tile window with
+rasterio (which picks the overview matching the zoom), colors and adds them up,
+and encodes a single WebP or PNG.
+
+Tiles are 256 px in a z/x/y pyramid whose deepest level (`max_zoom`) is the full
+resolution; each level above halves it. Channels are chosen as `name:color` (or
+`name:color:max`, the value mapped to full intensity; by default the image's
+`maxVal` or the dtype's maximum). Without a selection, the sample's
+`defaultChannels` are used, or the first band of each of the first three COGs.
+RGB images are rendered as they are. The COGs of a packed sample
+(`<sample>.zip`) are opened in place, as GDAL `/vsisubfile/` spans of the
+archive. Encoded tiles are kept in a bounded
+in-memory `RangeCache` keyed by tile, selection and the COGs' ETags. The ETag
+depends only on the selection and those files (`TileRenderer.etag`), so a
+revalidation is answered without rendering.
+"""
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Optional, Sequence
+
+import numpy as np
+
+from loopy.server.cache import RangeCache
+from loopy.server.static import FileInfo, sample_file
+
+TILE = 256
+CACHE_BYTES = 128 * 2**20
+FORMATS = {"webp": "image/webp", "png": "image/png"}
+WEBP_QUALITY = 85
+COLORS: dict[str, tuple[float, float, float]] = {  # the `loopy.image.Colors`
+    "blue": (0, 0, 1),
+    "green": (0, 1, 0),
+    "red": (1, 0, 0),
+    "magenta": (1, 0, 1),
+    "yellow": (1, 1, 0),
+    "cyan": (0, 1, 1),
+    "white": (1, 1, 1),
+}
+
+
+@dataclass(frozen=True)
+class Band:
+    path: str  # what rasterio opens: a file, or the span of a packed member (`_gdal_path`)
+    index: int  # 1-based rasterio band
+
+
+@dataclass(frozen=True)
+class Image:
+    """A sample's image as rendered: where each named channel lives and the pyramid geometry."""
+
+    bands: dict[str, Band]
+    rgb: bool
+    width: int
+    height: int
+    max_value: float
+    defaults: tuple[tuple[str, str], ...]  # (channel, color)
+    etag: str  # of sample.json and every COG
+
+    @property
+    def max_zoom(self) -> int:
+        return max(0, math.ceil(math.log2(max(self.width, self.height) / TILE)))
+
+
+@dataclass(frozen=True)
+class Channel:
+    name: str
+    color: tuple[float, float, float]
+    max: float
+
+
+def _gdal_path(info: FileInfo) -> str:
+    if info.member is None:
+        return str(info.path)
+    return f"/vsisubfile/{info.offset}_{info.size},{info.path}"
+
+
+@lru_cache(maxsize=32)
+def _load_image(root: Path, sample: str, meta_info: FileInfo) -> Image:
+    import rasterio
+
+    meta = json.loads(meta_info.read())
+    params = meta.get("imgParams")
+    if not params:
+        raise KeyError(f"Sample {sample!r} has no image")
+    names = params["channels"]
+    rgb = names == "rgb"
+    bands: dict[str, Band] = {}
+    etags = [meta_info.etag]
+    width = height = 0
+    dtype_max = 255.0
+    for url in params["urls"]:
+        info = sample_file(root, sample, url["url"])
+        if info is None:
+            raise KeyError(f"Image {url['url']!r} missing from sample {sample!r}")
+        path = _gdal_path(info)
+        etags.append(info.etag)
+        with rasterio.open(path) as src:
+            width, height = src.width, src.height
+            dtype_max = float(np.iinfo(src.dtypes[0]).max)
+            for i in range(1, src.count + 1):
+                name = ("r", "g", "b")[i - 1] if rgb else names[len(bands)]
+                bands[name] = Band(path, i)
+    max_value = float(params.get("maxVal") or dtype_max)
+    defaults = tuple((name, color) for color, name in (params.get("defaultChannels") or {}).items())
+    if not defaults and not rgb:
+        # The first band of each of the first three COGs, so one read per file.
+        firsts = [n for n, b in bands.items() if b.index == 1][:3]
+        defaults = tuple(zip(firsts, ("blue", "green", "red")))
+    return Image(bands, rgb, width, height, max_value, defaults, "-".join(etags))
+
+
+def parse_channels(specs: Sequence[str], image: Image) -> list[Channel]:
+    """`name:color[:max]` selections (the image's defaults when empty) to `Channel`s."""
+    pairs = [tuple(s.split(":")) for s in specs] or list(image.defaults)
+    channels = []
+    for pair in pairs:
+        if len(pair) not in (2, 3):
+            raise ValueError(f"Channel must be name:color[:max], got {':'.join(pair)!r}")
+        name, color = pair[0], pair[1]
+        if name not in image.bands:
+            raise KeyError(f"Unknown channel {name!r}")
+        if color not in COLORS:
+            raise ValueError(f"Unknown color {color!r}; expected one of {', '.join(COLORS)}")
+        channels.append(Channel(name, COLORS[color], float(pair[2]) if len(pair) == 3 else image.max_value))
+    return channels
+
+
+def _encode(rgb: np.ndarray, fmt: str) -> bytes:
+    from PIL import Image as PILImage
+
+    buf = io.BytesIO()
+    if fmt == "webp":
+        PILImage.fromarray(rgb).save(buf, format="WEBP", quality=WEBP_QUALITY, method=2)
+    else:
+        PILImage.fromarray(rgb).save(buf, format="PNG", compress_level=3)
+    return buf.getvalue()
+
+
+class TileRenderer:
+    """Renders z/x/y tiles of the images of the samples under `root`.
+
+    Unknown samples, channels and out-of-range tiles raise KeyError; malformed
+    selections ValueError.
+    """
+
+    def __init__(self, root: Path, *, cache: Optional[RangeCache] = None) -> None:
+        self.root = root
+        self.cache = cache if cache is not None else RangeCache(CACHE_BYTES)
+
+    def image(self, sample: str) -> Image:
+        info = sample_file(self.root, sample, "sample.json")
+        if info is None:
+            raise KeyError(f"Unknown sample {sample!r}")
+        return _load_image(self.root, sample, info)
+
+    def _read(self, image: Image, names: list[str], z: int, x: int, y: int) -> np.ndarray:
+        """Bands `names` of tile z/x/y as a (len(names), TILE, TILE) float32 array; 0 off the image."""
+        import rasterio
+        from rasterio.enums import Resampling
+        from rasterio.windows import Window
+
+        f = 2 ** (image.max_zoom - z)  # image px per tile px
+        col, row = x * TILE * f, y * TILE * f
+        if z < 0 or z > image.max_zoom or x < 0 or y < 0 or col >= image.width or row >= image.height:
+            raise KeyError(f"No tile {z}/{x}/{y}")
+        w, h = min(TILE * f, image.width - col), min(TILE * f, image.height - row)
+        out_w, out_h = max(1, round(w / f)), max(1, round(h / f))
+        window = Window(col, row, w, h)
+
+        tile = np.zeros((len(names), TILE, TILE), dtype=np.float32)
+        by_file: dict[str, list[int]] = {}
+        for i, name in enumerate(names):
+            by_file.setdefault(image.bands[name].path, []).append(i)
+        for path, slots in by_file.items():
+            indexes = [image.bands[names[i]].index for i in slots]
+            with rasterio.open(path) as src:
+                shape = (len(indexes), out_h, out_w)
+                data = src.read(indexes, window=window, out_shape=shape, resampling=Resampling.nearest)
+            tile[slots, :out_h, :out_w] = data
+        return tile
+
+    def _select(self, sample: str, channels: Sequence[str], fmt: str) -> tuple[Image, list[Channel], str]:
+        """The sample's image, the chosen channels and the ETag of tiles rendered with them."""
+        if fmt not in FORMATS:
+            raise ValueError(f"Unknown format {fmt!r}; expected one of {', '.join(FORMATS)}")
+        image = self.image(sample)
+        chosen = [] if image.rgb else parse_channels(channels, image)
+        selection = ",".join(f"{c.name}:{c.color}:{c.max}" for c in chosen)
+        etag = f'"{hashlib.sha1(f"{image.etag}|{selection}|{fmt}".encode()).hexdigest()[:16]}"'
+        return image, chosen, etag
+
+    def etag(self, sample: str, *, channels: Sequence[str] = (), fmt: str = "webp") -> str:
+        """The ETag `render` gives tiles of this selection, without reading or encoding any."""
+        return self._select(sample, channels, fmt)[2]
+
+    def render(
+        self, sample: str, z: int, x: int, y: int, *, channels: Sequence[str] = (), fmt: str = "webp"
+    ) -> tuple[bytes, str]:
+        """The encoded tile and its ETag."""
+        image, chosen, etag = self._select(sample, channels, fmt)
+        key = (sample, z, x, y, etag)
+        if (data := self.cache.get(key)) is not None:
+            return data, etag
+
+        if image.rgb:
+            tile = self._read(image, ["r", "g", "b"], z, x, y)
+            rgb = np.moveaxis(tile, 0, -1) * (255 / image.max_value)
+        else:
+            tile = self._read(image, [c.name for c in chosen], z, x, y)
+            rgb = np.zeros((TILE, TILE, 3), dtype=np.float32)
+            for band, c in zip(tile, chosen):
+                rgb += np.multiply.outer(np.clip(band / c.max, 0, 1), c.color)
+            rgb *= 255
+        data = _encode(np.clip(rgb, 0, 255).astype(np.uint8), fmt)
+        self.cache.put(key, data)
+        return data, etag
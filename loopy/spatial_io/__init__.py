@@ -5,7 +5,9 @@ module lazily so heavy per-format dependencies are only pulled when used.
 """
 from __future__ import annotations
 
+import fnmatch
 import importlib
+import os
 from argparse import Namespace
 from pathlib import Path
 from typing import Callable
@@ -20,6 +22,7 @@ FORMATS = (
     "spatialdata",
     "files",
 )
+VISIUM_POSITIONS = {"tissue_positions.parquet", "tissue_positions.csv", "tissue_positions_list.csv"}
 
 
 def get_reader(fmt: str) -> Callable[[Namespace], SpatialSample]:
@@ -33,35 +36,78 @@ def get_reader(fmt: str) -> Callable[[Namespace], SpatialSample]:
     return importlib.import_module(f"loopy.spatial_io.{fmt}").read
 
 
+def _listing(folder: Path) -> dict[str, bool]:
+    """Map each entry of `folder` to whether it is a directory, from a single `os.scandir`.
+
+    `DirEntry.is_dir` comes from the listing itself on most filesystems, so this
+    is one round trip however many signatures are then matched against it.
+    """
+    with os.scandir(folder) as it:
+        return {e.name: e.is_dir() for e in it}
+
+
+def _matches(entries: dict[str, bool], *patterns: str) -> bool:
+    return any(fnmatch.fnmatchcase(name, pat) for name in entries for pat in patterns)
+
+
+def _is_xenium(folder: Path, entries: dict[str, bool]) -> bool:
+    return "experiment.xenium" in entries or (
+        ("cell_feature_matrix" in entries or "cell_feature_matrix.h5" in entries)
+        and ("cells.parquet" in entries or "cells.csv.gz" in entries)
+    )
+
+
+def _is_visium_hd(folder: Path, entries: dict[str, bool]) -> bool:
+    return (
+        entries.get("binned_outputs", False)
+        or entries.get("segmented_outputs", False)
+        or any(is_dir and fnmatch.fnmatchcase(name, "square_0*um") for name, is_dir in entries.items())
+    )
+
+
+def _is_visium(folder: Path, entries: dict[str, bool]) -> bool:
+    # A single Visium HD bin folder has the same spatial/ layout; it is read via its run folder.
+    if not entries.get("spatial", False) or fnmatch.fnmatchcase(folder.name, "square_0*um"):
+        return False
+    return bool(VISIUM_POSITIONS & _listing(folder / "spatial").keys())
+
+
+def _is_cosmx(folder: Path, entries: dict[str, bool]) -> bool:
+    return _matches(entries, "*exprMat*.csv")
+
+
+# Checked in order; the first match wins.
+SIGNATURES: tuple[tuple[str, Callable[[Path, dict[str, bool]], bool]], ...] = (
+    ("xenium", _is_xenium),
+    ("visium_hd", _is_visium_hd),
+    ("visium", _is_visium),
+    ("cosmx", _is_cosmx),
+)
+
+
 def detect_format(folder: Path) -> str:
     """Sniff a folder for a platform signature. Raises if nothing matches.
 
+    The folder is listed once and each entry of `SIGNATURES` is matched against
+    that listing (Visium additionally lists `spatial/`), which keeps sniffing
+    cheap on network filesystems and in batch runs over many folders.
+
     Space Ranger nests its outputs under `outs/`; if the given folder is just a
     wrapper around `outs/`, sniff that instead.
     """
-    if (folder / "outs").is_dir() and not (folder / "spatial").is_dir():
-        only = [p.name for p in folder.iterdir() if not p.name.startswith(".")]
-        if only == ["outs"]:
-            folder = folder / "outs"
-
-    names = {p.name for p in folder.iterdir()}
-
-    def has_glob(pat: str) -> bool:
-        return any(folder.glob(pat))
-
-    if "experiment.xenium" in names or (
-        "cell_feature_matrix" in names and ("cells.parquet" in names or "cells.csv.gz" in names)
-    ):
-        return "xenium"
-    if "binned_outputs" in names or "segmented_outputs" in names or has_glob("square_0*um"):
-        return "visium_hd"
-    if "spatial" in names and (folder / "spatial").is_dir() and (
-        (folder / "spatial" / "tissue_positions.csv").exists()
-        or (folder / "spatial" / "tissue_positions_list.csv").exists()
-    ):
-        return "visium"
-    if has_glob("*_exprMat_file.csv") or has_glob("*exprMat*.csv"):
-        return "cosmx"
+    entries = _listing(folder)
+    if [name for name in entries if not name.startswith(".")] == ["outs"] and entries["outs"]:
+        folder = folder / "outs"
+        entries = _listing(folder)
+
+    for fmt, matches in SIGNATURES:
+        if matches(folder, entries):
+            return fmt
+    if fnmatch.fnmatchcase(folder.name, "square_0*um"):
+        raise SystemExit(
+            f"{folder} is a single Visium HD bin folder; pass the run folder holding binned_outputs/ "
+            "with --format visium_hd (or auto)."
+        )
     raise SystemExit(
         f"could not auto-detect a spatial platform under {folder}. "
         f"Pass --format explicitly (one of: {', '.join(FORMATS)})."
@@ -0,0 +1,225 @@
+"""Batch (cohort) mode for the `preprocess` entrypoint.
+
+A manifest lists one sample per row (CSV with a header, or a JSON list of
+objects) using the same option names as the single-sample CLI, e.g.
+
+    sample_name,format,folder,pixel_size
+    slide01,xenium,runs/slide01,
+    slide02,auto,runs/slide02,0.2125
+
+Options given on the command line (``--outdir``, ``--convert-8bit``, ...) are the
+defaults every row can override. Relative paths are resolved against the
+manifest's directory.
+
+Each sample runs in its own worker process of a pool. A reader that aborts
+(`fail` raises ``SystemExit``), raises, or exceeds the per-sample memory limit
+only fails that sample; a worker that dies outright (e.g. killed by the OOM
+killer) breaks the pool, so the samples caught in that are retried one at a
+time in fresh single-worker pools. The outcome of every sample is written to
+``batch_summary.json`` in ``--outdir`` and printed as a table.
+"""
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import sys
+import time
+import traceback
+from argparse import Namespace
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable
+
+SUMMARY_FILE = "batch_summary.json"
+TRUE_STRINGS = ("1", "true", "yes", "y")
+# The `preprocess` options a manifest row may set, and which of them are on/off flags.
+MANIFEST_OPTIONS = (
+    "format",
+    "outdir",
+    "sample-name",
+    "folder",
+    "zarr",
+    "image",
+    "cells",
+    "features",
+    "matrix",
+    "mpp",
+    "pixel-size",
+    "spot-size",
+    "coords-name",
+    "default-feature",
+    "bin-sizes",
+    "segmented",
+    "transcripts",
+    "transcript-bin-um",
+    "convert-8bit",
+    "no-image",
+    "precompress",
+    "pack",
+    "profile",
+    "workers",
+)
+FLAGS = {"segmented", "convert-8bit", "no-image", "precompress", "pack", "profile"}
+
+
+def read_manifest(path: Path, parser: argparse.ArgumentParser, defaults: Namespace) -> list[Namespace]:
+    """Parse `path` into one argument namespace per sample.
+
+    Each row starts from `defaults` (the parsed command line); its keys are
+    `MANIFEST_OPTIONS` (``sample-name`` and ``sample_name`` are equivalent). Flags
+    take a boolean; every other value is handed to `parser` as the option's
+    command-line arguments (space-separated in a CSV cell, or a JSON list, for
+    multi-value options), so a row means exactly what the same options would mean
+    on the command line.
+    """
+    if path.suffix == ".json":
+        rows = json.loads(path.read_text())
+        if not isinstance(rows, list):
+            sys.exit(f"manifest {path} must hold a JSON list of objects")
+    else:
+        with path.open(newline="") as fh:
+            rows = list(csv.DictReader(fh))
+    if not rows:
+        sys.exit(f"manifest {path} lists no samples")
+
+    out = []
+    for i, row in enumerate(rows, 1):
+        args = Namespace(**vars(defaults))
+        argv = ["--outdir", str(defaults.outdir)]  # the parser requires it; a row may still override it
+        given = []
+        for key, value in row.items():
+            option = key.strip().lstrip("-").replace("_", "-")
+            if option not in MANIFEST_OPTIONS:
+                sys.exit(f"manifest {path} row {i}: unknown option '{key}'")
+            if value is None or (isinstance(value, str) and not value.strip()):
+                continue
+            if option in FLAGS:
+                flag = value if isinstance(value, bool) else str(value).strip().lower() in TRUE_STRINGS
+                setattr(args, option.replace("-", "_"), flag)
+                continue
+            items = value.split() if isinstance(value, str) else value if isinstance(value, list) else [value]
+            argv += [f"--{option}", *(str(v) for v in items)]
+            given.append(option.replace("-", "_"))
+        try:
+            parser.parse_args(argv, namespace=args)
+        except SystemExit:
+            sys.exit(f"manifest {path} row {i}: invalid options (see above)")
+        for dest in given:  # relative paths are relative to the manifest
+            value = getattr(args, dest)
+            if isinstance(value, Path) and not value.is_absolute():
+                setattr(args, dest, path.parent / value)
+        if not args.sample_name or not args.format:
+            sys.exit(f"manifest {path} row {i}: sample_name and format are required")
+        out.append(args)
+
+    names = [a.sample_name for a in out]
+    dupes = sorted({n for n in names if names.count(n) > 1})
+    if dupes:
+        sys.exit(f"manifest {path}: duplicate sample names {dupes}")
+    return out
+
+
+def _limit_memory(max_memory_gb: float | None) -> None:
+    """Cap the worker's address space so a runaway sample raises MemoryError (POSIX only)."""
+    if not max_memory_gb:
+        return
+    try:
+        import resource
+
+        limit = int(max_memory_gb * 1024**3)
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError) as e:
+        print(f"warning: cannot apply --max-memory-gb in this worker: {e}", file=sys.stderr)
+
+
+def _run_isolated(run: Callable[[Namespace], None], args: Namespace) -> dict[str, Any]:
+    """Run one sample, turning every failure into a result record instead of raising."""
+    start = time.perf_counter()
+    result: dict[str, Any] = {
+        "sample": args.sample_name,
+        "format": args.format,
+        "status": "ok",
+        "error": None,
+    }
+    try:
+        run(args)
+    except SystemExit as e:  # readers abort through `fail`
+        result.update(status="failed", error=str(e.code))
+    except MemoryError:
+        result.update(status="failed", error="out of memory (exceeded --max-memory-gb)")
+    except Exception as e:  # noqa: BLE001 - one bad sample must not stop the cohort
+        result.update(status="failed", error=f"{type(e).__name__}: {e}")
+        traceback.print_exc()
+    result["seconds"] = round(time.perf_counter() - start, 2)
+    return result
+
+
+def _pool(jobs: int, max_memory_gb: float | None) -> ProcessPoolExecutor:
+    """A pool whose workers each handle one sample, so memory is returned between samples."""
+    kwargs: dict[str, Any] = {"max_workers": jobs, "initializer": _limit_memory, "initargs": (max_memory_gb,)}
+    if sys.version_info >= (3, 11):
+        kwargs["max_tasks_per_child"] = 1
+    return ProcessPoolExecutor(**kwargs)
+
+
+def run_batch(
+    samples: list[Namespace],
+    run: Callable[[Namespace], None],
+    *,
+    jobs: int,
+    max_memory_gb: float | None = None,
+) -> list[dict[str, Any]]:
+    """Run `run(args)` for every sample across a process pool; return one result per sample.
+
+    `run` must be a picklable module-level function. Results are in manifest order.
+    """
+    results: dict[str, dict[str, Any]] = {}
+    crashed: list[Namespace] = []
+    with _pool(jobs, max_memory_gb) as pool:
+        futures: dict[Future[dict[str, Any]], Namespace] = {
+            pool.submit(_run_isolated, run, args): args for args in samples
+        }
+        for fut in as_completed(futures):
+            args = futures[fut]
+            try:
+                results[args.sample_name] = fut.result()
+                status = results[args.sample_name]["status"]
+            except BrokenProcessPool:
+                crashed.append(args)
+                status = "worker died; will retry"
+            print(f"[{len(results) + len(crashed)}/{len(samples)}] {args.sample_name}: {status}")
+
+    # A dead worker takes the whole pool down; retry those samples one at a time so
+    # only the sample that actually kills its worker is reported as crashed.
+    for args in crashed:
+        with _pool(1, max_memory_gb) as pool:
+            try:
+                results[args.sample_name] = pool.submit(_run_isolated, run, args).result()
+            except BrokenProcessPool:
+                results[args.sample_name] = {
+                    "sample": args.sample_name,
+                    "format": args.format,
+                    "status": "crashed",
+                    "error": "worker process died (killed, e.g. by the OOM killer, or crashed)",
+                    "seconds": None,
+                }
+    return [results[a.sample_name] for a in samples]
+
+
+def write_summary(results: list[dict[str, Any]], outdir: Path) -> Path:
+    """Write `results` to `outdir / SUMMARY_FILE` and print them as a table."""
+    outdir.mkdir(parents=True, exist_ok=True)
+    path = outdir / SUMMARY_FILE
+    path.write_text(json.dumps(results, indent=2))
+
+    width = max(len("sample"), *(len(r["sample"]) for r in results))
+    print(f"\n{'sample':<{width}}  {'format':<11}  {'status':<7}  {'seconds':>8}  error")
+    for r in results:
+        seconds = "" if r["seconds"] is None else f"{r['seconds']:.1f}"
+        error = r["error"] or ""
+        print(f"{r['sample']:<{width}}  {r['format']:<11}  {r['status']:<7}  {seconds:>8}  {error}")
+    n_ok = sum(r["status"] == "ok" for r in results)
+    print(f"\n{n_ok}/{len(results)} samples succeeded; summary written to {path}")
+    return path
@@ -4,14 +4,22 @@ This is the glue between the readers and loopy: it drives loopy's `Sample`
 (`add_coords` / `add_chunked_feature` / `add_image` / `set_default_feature` /
 `write`) rather than re-implementing any of the coordinate join, chunked-feature
 compression or image tiling — loopy owns those.
+
+Feature groups are independent of each other, so `Sample.write` runs them (and
+the image's COG conversion) on a thread pool once the coords are written; the
+CSV encoding holds the GIL but gzip and the GDAL writes release it. The write
+and its stages are recorded with `loopy.profiling.stage` (`preprocess --profile`
+prints them).
 """
 from __future__ import annotations
 
+import os
 import sys
 from pathlib import Path
 
 import pandas as pd
 
+from loopy.profiling import stage
 from loopy.sample import Sample
 
 from .common import FeatureGroup, SpatialSample
@@ -47,29 +55,51 @@ def build_sample(
     outdir: Path,
     name: str,
     convert_8bit: bool = False,
+    workers: int | None = None,
+    precompress: bool = False,
+    pack: bool = False,
 ) -> None:
     """Write `s` as a loopy Sample folder at `outdir / name`.
 
-    Adds the coordinate set, each non-empty feature group (loopy joins it to the
-    coords and chunk-compresses it), and, if present, the background image
-    (degrading to image-less on any decode/IO failure rather than aborting the
-    run). Nothing is written until loopy's lazy `Sample.write()` at the end.
+    Adds the coordinate set (plus any `extra_coords`), each non-empty feature
+    group (loopy joins it to its coords and chunk-compresses it), and, if
+    present, the background image (degrading to image-less on any decode/IO
+    failure rather than aborting the run). Nothing but the image read happens
+    until loopy's lazy `Sample.write()` at the end, which writes the feature
+    groups and image on up to `workers` threads (default: one per group and
+    image, capped at the CPU count). With `precompress`, `.br`/`.gz` sidecars of
+    the text assets are written too, for `loopy serve` to negotiate. With
+    `pack`, the folder is also packed into `<name>.zip` beside it, which
+    `loopy serve` serves like the folder.
     """
     outdir.mkdir(parents=True, exist_ok=True)
     if s.coords.index.duplicated().any():
         sys.exit(f"duplicate observation ids in coords for sample '{name}'")
 
     sample = Sample(name=name, path=outdir / name)
+    coord_sets = {s.coords_name: s.coords}
     sample = sample.add_coords(
         s.coords[["x", "y"]], name=s.coords_name, mPerPx=s.mpp, size=s.spot_size
     )
+    for extra in s.extra_coords:
+        if extra.name in coord_sets:
+            sys.exit(f"duplicate coord set name '{extra.name}' in sample '{name}'")
+        if extra.coords.index.duplicated().any():
+            sys.exit(f"duplicate observation ids in coord set '{extra.name}' of sample '{name}'")
+        coord_sets[extra.name] = extra.coords
+        sample = sample.add_coords(
+            extra.coords[["x", "y"]], name=extra.name, mPerPx=s.mpp, size=extra.spot_size
+        )
 
     for fg in s.features:
         if fg.df.shape[1] == 0:
             continue
-        _check_overlap(fg, s.coords.index)
+        coords_name = fg.coords_name or s.coords_name
+        if coords_name not in coord_sets:
+            sys.exit(f"feature group '{fg.name}' targets unknown coord set '{coords_name}'")
+        _check_overlap(fg, coord_sets[coords_name].index)
         sample = sample.add_chunked_feature(
-            fg.df, name=fg.name, coordName=s.coords_name,
+            fg.df, name=fg.name, coordName=coords_name,
             sparse=fg.sparse, dataType=fg.data_type, unit=fg.unit,
         )
 
@@ -84,10 +114,15 @@ def build_sample(
     if s.default_feature:
         sample = sample.set_default_feature(group=s.default_feature[0], feature=s.default_feature[1])
 
-    sample.write()
+    if workers is None:
+        workers = min(os.cpu_count() or 1, max(1, len(sample.queue_) - 1))
+    with stage("sample write"):
+        sample.write(workers=workers, precompress=precompress, pack=pack)
+
     n_feat = sum(g.df.shape[1] for g in s.features)
     print(
         f"Wrote sample '{name}' to {outdir / name}\n"
         f"  observations: {len(s.coords)}; feature groups: {len(s.features)} "
         f"({n_feat} features); image: {'yes' if has_image else 'no'}"
+        + (f"; extra coord sets: {', '.join(c.name for c in s.extra_coords)}" if s.extra_coords else "")
     )
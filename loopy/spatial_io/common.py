@@ -19,6 +19,9 @@ from typing import TYPE_CHECKING, NoReturn
 import numpy as np
 import pandas as pd
 from scipy.io import mmread
+from scipy.sparse import csc_matrix, csr_matrix
+
+from loopy.profiling import stage
 
 if TYPE_CHECKING:
     import anndata
@@ -38,6 +41,16 @@ class FeatureGroup:
     data_type: str = "quantitative"  # or "categorical"
     sparse: bool = False
     unit: str | None = None
+    coords_name: str | None = None  # the coord set it overlays; None = the sample's own coords
+
+
+@dataclass
+class CoordSet:
+    """An additional coordinate set (e.g. a finer bin size) that feature groups can target."""
+
+    name: str
+    coords: pd.DataFrame  # str index = observation id; columns x, y (pixels, same mpp as the sample)
+    spot_size: float  # marker diameter in meters
 
 
 @dataclass
@@ -52,6 +65,7 @@ class SpatialSample:
     image: Path | None = None
     channels: list[str] | None = None
     default_feature: tuple[str, str] | None = None  # (group, feature)
+    extra_coords: list[CoordSet] = field(default_factory=list)
 
 
 def fail(msg: str) -> NoReturn:
@@ -75,6 +89,39 @@ def drop_control_columns(df: pd.DataFrame) -> pd.DataFrame:
     return df[keep]
 
 
+def read_table(
+    path: Path,
+    columns: list[str] | None = None,
+    *,
+    equals: dict[str, object] | None = None,
+) -> pd.DataFrame:
+    """Read a Parquet or CSV(.gz) table, loading only `columns` and rows matching `equals`.
+
+    Requested columns absent from the file are skipped (callers check for the ones
+    they need). For Parquet the projection and the ``column == value`` filters are
+    pushed down to pyarrow, which then skips unrequested column chunks and row
+    groups whose statistics exclude the value, and the file is memory-mapped rather
+    than read into a buffer. For CSV, `usecols` still avoids parsing the other
+    columns; the filter is applied after the read.
+    """
+    if path.suffix == ".parquet":
+        import pyarrow.parquet as pq
+
+        if columns is not None:
+            present = set(pq.read_schema(path, memory_map=True).names)
+            columns = [c for c in columns if c in present]
+        filters = [(k, "==", v) for k, v in equals.items()] if equals else None
+        return pq.read_table(path, columns=columns, filters=filters, memory_map=True).to_pandas()
+
+    wanted = set(columns) | set(equals or ()) if columns is not None else None
+    df = pd.read_csv(path, usecols=(lambda c: c in wanted) if wanted is not None else None)
+    for k, v in (equals or {}).items():
+        df = df[df[k] == v]
+    if columns is not None:  # drop filter-only columns, as the Parquet projection does
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+
 def read_mex(mex_dir: Path) -> tuple[pd.DataFrame, pd.Series]:
     """Read a gzipped MatrixMarket triplet (features x cells) into obs x features.
 
@@ -105,21 +152,20 @@ def read_mex(mex_dir: Path) -> tuple[pd.DataFrame, pd.Series]:
     return df, ftype
 
 
-def read_10x_h5(path: Path) -> tuple[pd.DataFrame, pd.Series]:
-    """Read a 10x CSC HDF5 matrix (/matrix, features x cells) into obs x features.
+def read_10x_h5_csc(path: Path) -> tuple[csc_matrix, pd.Index, list[str], pd.Series]:
+    """Read a 10x CSC HDF5 matrix (/matrix, features x cells) as a scipy obs x features CSC.
 
-    Returned as a sparse-backed DataFrame: densifying here would need tens of GB for
-    large panels (e.g. Xenium Prime, ~9.5k genes x ~400k cells), so the matrix stays
-    sparse all the way through `expression_group` and loopy's chunked-feature writer.
+    Returns (matrix, barcodes, feature names, feature_types). The on-disk CSC arrays
+    are reinterpreted as the transposed CSR and converted once, so callers that work
+    on the matrix directly (e.g. transforming ``.data`` in place) never see a DataFrame.
     """
     import h5py
-    from scipy.sparse import csc_matrix
 
     with h5py.File(path, "r") as f:
         g = f["matrix"]
         data, indices, indptr = g["data"][:], g["indices"][:], g["indptr"][:]
-        shape = tuple(g["shape"][:])  # (n_features, n_obs)
-        mat = csc_matrix((data, indices, indptr), shape=shape)  # features x obs
+        n_features, n_obs = tuple(g["shape"][:])
+        mat = csr_matrix((data, indices, indptr), shape=(n_obs, n_features)).tocsc()  # obs x features
         barcodes = [b.decode() if isinstance(b, bytes) else str(b) for b in g["barcodes"][:]]
         names = [n.decode() if isinstance(n, bytes) else str(n) for n in g["features"]["name"][:]]
         ftype_raw = g["features"].get("feature_type")
@@ -129,8 +175,19 @@ def read_10x_h5(path: Path) -> tuple[pd.DataFrame, pd.Series]:
             else [np.nan] * len(names)
         )
 
-    df = pd.DataFrame.sparse.from_spmatrix(mat.T.tocsc(), index=as_str_index(barcodes), columns=names)
-    return df, pd.Series(ftype, index=names)
+    return mat, as_str_index(barcodes), names, pd.Series(ftype, index=names)
+
+
+def read_10x_h5(path: Path) -> tuple[pd.DataFrame, pd.Series]:
+    """Read a 10x CSC HDF5 matrix (/matrix, features x cells) into obs x features.
+
+    Returned as a sparse-backed DataFrame: densifying here would need tens of GB for
+    large panels (e.g. Xenium Prime, ~9.5k genes x ~400k cells), so the matrix stays
+    sparse all the way through `expression_group` and loopy's chunked-feature writer.
+    """
+    mat, barcodes, names, ftype = read_10x_h5_csc(path)
+    df = pd.DataFrame.sparse.from_spmatrix(mat, index=barcodes, columns=names)
+    return df, ftype
 
 
 def expression_group(
@@ -141,11 +198,12 @@ def expression_group(
     unit: str = "counts",
 ) -> FeatureGroup:
     """Filter to biological genes and wrap as a sparse quantitative feature group."""
-    if feature_types is not None and feature_types.notna().any():
-        genes = feature_types.index[feature_types == GENE_EXPRESSION]
-        counts = counts.loc[:, counts.columns.isin(genes)]
-    counts = drop_control_columns(counts)
-    counts = counts.loc[:, ~counts.columns.duplicated()]
+    with stage("control filtering"):
+        if feature_types is not None and feature_types.notna().any():
+            genes = feature_types.index[feature_types == GENE_EXPRESSION]
+            counts = counts.loc[:, counts.columns.isin(genes)]
+        counts = drop_control_columns(counts)
+        counts = counts.loc[:, ~counts.columns.duplicated()]
     return FeatureGroup(name=name, df=counts, data_type="quantitative", sparse=True, unit=unit)
 
 
@@ -178,6 +236,19 @@ def read_anndata(path: Path) -> "anndata.AnnData":
     return ad.read_h5ad(path)
 
 
+def anndata_expression(adata: "anndata.AnnData", obs_ids: pd.Index) -> pd.DataFrame:
+    """`adata.X` as an observations x genes frame indexed by `obs_ids`.
+
+    A scipy-sparse X stays sparse-backed (see read_10x_h5), so memory is
+    proportional to nnz; a dense X stays dense.
+    """
+    var_names = as_str_index(adata.var_names)
+    X = adata.X
+    if hasattr(X, "toarray"):  # scipy sparse
+        return pd.DataFrame.sparse.from_spmatrix(X, index=obs_ids, columns=var_names)
+    return pd.DataFrame(np.asarray(X), index=obs_ids, columns=var_names)
+
+
 def anndata_to_sample(
     adata: "anndata.AnnData",
     *,
@@ -185,27 +256,26 @@ def anndata_to_sample(
     coords_name: str,
     spot_size: float,
     spatial_key: str = "spatial",
+    coords: pd.DataFrame | None = None,
 ) -> SpatialSample:
     """Convert an AnnData table to a `SpatialSample` (used by the SpatialData reader).
 
-    Coordinates come from `obsm[spatial_key]` (first two columns), expression from
-    `X` (filtered to genes and wrapped as one sparse quantitative group), and the
-    categorical/object `obs` columns become a single categorical Annotations group.
+    Coordinates come from `obsm[spatial_key]` (first two columns) unless `coords`
+    is given (one row per observation, in `adata` order; its index then becomes the
+    observation id). Expression comes from `X` (filtered to genes and wrapped as one
+    sparse quantitative group), and the categorical/object `obs` columns become a
+    single categorical Annotations group.
     """
-    obs_ids = as_str_index(adata.obs_names)
-    if spatial_key not in adata.obsm:
-        fail(f"AnnData has no obsm['{spatial_key}']; cannot place observations")
-    xy = np.asarray(adata.obsm[spatial_key])[:, :2]
-    coords = pd.DataFrame({"x": xy[:, 0], "y": xy[:, 1]}, index=obs_ids)
-
-    # Keep a sparse X sparse-backed (see read_10x_h5); a dense X stays dense.
-    var_names = as_str_index(adata.var_names)
-    X = adata.X
-    if hasattr(X, "toarray"):  # scipy sparse
-        expr = pd.DataFrame.sparse.from_spmatrix(X, index=obs_ids, columns=var_names)
+    if coords is None:
+        obs_ids = as_str_index(adata.obs_names)
+        if spatial_key not in adata.obsm:
+            fail(f"AnnData has no obsm['{spatial_key}']; cannot place observations")
+        xy = np.asarray(adata.obsm[spatial_key])[:, :2]
+        coords = pd.DataFrame({"x": xy[:, 0], "y": xy[:, 1]}, index=obs_ids)
     else:
-        expr = pd.DataFrame(np.asarray(X), index=obs_ids, columns=var_names)
-    groups = [expression_group(expr, None)]
+        obs_ids = coords.index
+
+    groups = [expression_group(anndata_expression(adata, obs_ids), None)]
 
     cat = [c for c in adata.obs.columns if str(adata.obs[c].dtype) in ("category", "object")]
     if cat:
@@ -20,6 +20,7 @@ from .common import (
     fail,
     read_10x_h5,
     read_mex,
+    read_table,
 )
 
 ID_ALIASES = ("id", "cell_id", "barcode", "cell", "obs", "observation_id")
@@ -28,10 +29,8 @@ Y_ALIASES = ("y", "y_centroid", "center_y", "px_y", "pxl_row_in_fullres")
 
 
 def _read_table(path: Path) -> pd.DataFrame:
-    """Read a CSV or Parquet table into a DataFrame."""
-    if path.suffix == ".parquet":
-        return pd.read_parquet(path)
-    return pd.read_csv(path)
+    """Read a CSV or Parquet table into a DataFrame (every column is used downstream)."""
+    return read_table(path)
 
 
 def _pick(cols: dict[str, str], aliases: tuple[str, ...]) -> str | None:
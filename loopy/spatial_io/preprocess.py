@@ -11,21 +11,32 @@ Every mode produces the same intermediate (coordinates + feature groups + image)
 which is written as sample.json plus the image/coords/feature assets. The Samui viewer
 that opens this folder is co-hosted alongside it by the workflow (see modules/site.nf).
 
+With --manifest, a whole cohort is processed in one invocation: every row of the
+CSV/JSON manifest is one sample (same option names as above, command-line values
+as defaults), run across a process pool with failures isolated per sample (see
+`loopy.spatial_io.batch`).
+
+--transcripts adds a transcript-density grid streamed from the platform's
+transcript table (see `loopy.spatial_io.transcripts`) to any mode.
+
 Installed as the `preprocess` console script; the Nextflow module invokes it.
 """
 import argparse
+import os
+import sys
 from pathlib import Path
 
+from loopy.profiling import PROFILE_FILE, profiling, stage
 from loopy.spatial_io import detect_format, get_reader
 from loopy.spatial_io.build import build_sample
+from loopy.spatial_io.transcripts import add_transcript_grid, find_transcripts
 
 
-def main() -> None:
-    """Parse CLI arguments, dispatch to the format reader, apply overrides, and build the sample."""
+def _parser() -> argparse.ArgumentParser:
     p = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
-    p.add_argument("--format", required=True, help="platform/mode, or 'auto' to detect from --folder")
+    p.add_argument("--format", help="platform/mode, or 'auto' to detect from --folder")
     p.add_argument("--outdir", type=Path, required=True, help="parent directory of the sample folder")
-    p.add_argument("--sample-name", required=True)
+    p.add_argument("--sample-name")
 
     # Input sources (which one is used depends on --format).
     p.add_argument("--folder", type=Path, help="platform output directory (named platform or auto)")
@@ -41,20 +52,67 @@ def main() -> None:
     p.add_argument("--spot-size", type=float, default=None, help="marker diameter in meters")
     p.add_argument("--coords-name", default=None, help="name of the coordinate set")
     p.add_argument("--default-feature", default=None, help="feature shown by default on load")
+    p.add_argument(
+        "--bin-sizes", type=int, nargs="+", default=None,
+        help="visium_hd: re-bin the 2 µm bins into these sizes (µm); the coarsest is shown by default",
+    )
+    p.add_argument(
+        "--segmented", action="store_true", help="visium_hd: read the segmented cells instead of bins"
+    )
+    p.add_argument(
+        "--transcripts", default=None,
+        help="transcript table to bin into a density grid, or 'auto' to find it in --folder",
+    )
+    p.add_argument("--transcript-bin-um", type=float, default=10.0, help="transcript grid square size (µm)")
 
     # Image / output.
     p.add_argument("--convert-8bit", action="store_true", help="downcast the image to 8-bit")
     p.add_argument("--no-image", action="store_true", help="skip the background image")
-    args = p.parse_args()
+    p.add_argument(
+        "--precompress", action="store_true", help="write .br/.gz sidecars of the JSON/CSV assets for serving"
+    )
+    p.add_argument(
+        "--pack", action="store_true", help="also pack the sample into one servable <name>.zip"
+    )
+    p.add_argument(
+        "--profile", action="store_true", help=f"print the per-stage profile (always saved to {PROFILE_FILE})"
+    )
+    p.add_argument(
+        "--workers", type=int, default=None,
+        help="threads writing feature groups and the image (default: CPUs, or CPUs / --jobs in batch mode)",
+    )
+
+    # Batch mode.
+    p.add_argument("--manifest", type=Path, help="CSV/JSON list of samples to process in one run")
+    p.add_argument(
+        "--jobs", type=int, default=None, help="batch mode: parallel worker processes (default: CPUs)"
+    )
+    p.add_argument(
+        "--max-memory-gb", type=float, default=None, help="batch mode: per-sample address-space limit (POSIX)"
+    )
+    return p
+
 
+def run_one(args: argparse.Namespace) -> None:
+    """Build one sample, saving its per-stage profile next to its sample.json."""
+    with profiling() as prof:
+        _run_one(args)
+    prof.write(args.outdir / args.sample_name / PROFILE_FILE)
+    if args.profile:
+        prof.print_table()
+
+
+def _run_one(args: argparse.Namespace) -> None:
+    """Dispatch one sample's arguments to the format reader, apply overrides, and build the sample."""
     fmt = args.format
     if fmt == "auto":
         if not args.folder:
-            p.error("--format auto requires --folder")
+            sys.exit("--format auto requires --folder")
         fmt = detect_format(args.folder)
         print(f"auto-detected format: {fmt}")
 
-    sample = get_reader(fmt)(args)
+    with stage("reader I/O"):
+        sample = get_reader(fmt)(args)
 
     # Apply explicit CLI overrides on top of the reader's defaults.
     if args.mpp is not None:
@@ -68,14 +126,52 @@ def main() -> None:
     if args.default_feature and sample.features:
         group = next((g.name for g in sample.features if g.data_type == "quantitative"), sample.features[0].name)
         sample.default_feature = (group, args.default_feature)
+    if args.transcripts:
+        if args.transcripts == "auto":
+            if not args.folder:
+                sys.exit("--transcripts auto requires --folder")
+            path = find_transcripts(args.folder)
+        else:
+            path = Path(args.transcripts)
+        add_transcript_grid(sample, path, bin_um=args.transcript_bin_um)
 
     build_sample(
         sample,
         outdir=args.outdir,
         name=args.sample_name,
         convert_8bit=args.convert_8bit,
+        workers=args.workers,
+        precompress=args.precompress,
+        pack=args.pack,
     )
 
 
+def main() -> None:
+    """Parse CLI arguments and build one sample, or every sample of a --manifest."""
+    p = _parser()
+    args = p.parse_args()
+
+    if args.manifest is None:
+        if not args.format or not args.sample_name:
+            p.error("--format and --sample-name are required (or pass --manifest)")
+        run_one(args)
+        return
+
+    from loopy.spatial_io.batch import read_manifest, run_batch, write_summary
+
+    samples = read_manifest(args.manifest, p, args)
+    cpus = os.cpu_count() or 1
+    jobs = min(args.jobs or cpus, len(samples))
+    for sample in samples:  # share the CPUs between the jobs rather than giving each all of them
+        if sample.workers is None:
+            sample.workers = max(1, cpus // jobs)
+    print(f"batch: {len(samples)} samples from {args.manifest} on {jobs} worker(s)")
+    results = run_batch(samples, run_one, jobs=jobs, max_memory_gb=args.max_memory_gb)
+    write_summary(results, args.outdir)
+    n_failed = sum(r["status"] != "ok" for r in results)
+    if n_failed:
+        sys.exit(f"{n_failed} of {len(results)} samples failed; see {args.outdir / 'batch_summary.json'}")
+
+
 if __name__ == "__main__":
     main()
@@ -7,6 +7,10 @@ and per-observation coordinates from either the table's ``obsm['spatial']`` or
 the centroids of the matching ``shapes`` element joined on the table's
 instance key.
 
+Only what is exported is opened: the ``tables`` group is read first, and the
+table's region then decides which single ``shapes`` element to load. Images,
+labels and points are never opened (nor, for a ``.zarr.zip``, extracted).
+
 Coordinates live in the element's coordinate system (microns for the test
 stores), so ``mpp`` defaults to 1e-6 m/px unless ``--pixel_size`` overrides it.
 
@@ -16,97 +20,172 @@ chosen scale/coordinate-system. ``image`` is left None for now.
 """
 from __future__ import annotations
 
+import shutil
 import tempfile
+import warnings
 import zipfile
 from argparse import Namespace
 from contextlib import contextmanager
+from dataclasses import dataclass, field
 from pathlib import Path
 from typing import TYPE_CHECKING, Generator
 
-import numpy as np
 import pandas as pd
 
-from .common import (
-    FeatureGroup,
-    SpatialSample,
-    anndata_to_sample,
-    as_str_index,
-    expression_group,
-    fail,
-)
+from .common import SpatialSample, anndata_to_sample, as_str_index, fail
 
 if TYPE_CHECKING:
     import anndata
-    import spatialdata as sd
+    import geopandas as gpd
 
 DEFAULT_MPP = 1e-6  # meters/px when no pixel_size is given (coords assumed in microns)
 DEFAULT_SPOT_SIZE = 1e-5  # marker diameter in meters
+ZARR_GROUP_METADATA = ("zarr.json", ".zgroup", ".zattrs", ".zmetadata")
+
+
+def _zip_store_root(names: list[str]) -> str:
+    """Return the member prefix of the store root inside a zip ('' if unwrapped).
+
+    Zips may wrap the store in one or more directories; the root is the shallowest
+    directory holding group metadata (``zarr.json`` for v3, ``.zgroup`` for v2).
+    """
+    roots = [n.rpartition("/")[0] for n in names if n.rpartition("/")[2] in ("zarr.json", ".zgroup")]
+    if not roots:
+        fail("zip archive contains no zarr group metadata (zarr.json / .zgroup)")
+    root = min(roots, key=lambda r: (r.count("/") if r else -1, r))
+    return f"{root}/" if root else ""
+
+
+@dataclass
+class _Store:
+    """A SpatialData store as a local directory that ``sd.read_zarr`` can open.
+
+    `fetch` makes one element subtree (e.g. ``tables`` or ``shapes/cells``)
+    available under `root` and returns its path. For a ``.zarr`` directory that is
+    a no-op; for a ``.zarr.zip`` the subtree's members (and the group metadata of
+    its parents) are extracted on first use, so images, labels and points that are
+    never fetched are never decompressed.
+    """
+
+    root: Path
+    zf: zipfile.ZipFile | None = None
+    prefix: str = ""
+    fetched: set[str] = field(default_factory=set)
+
+    def fetch(self, element: str) -> Path:
+        target = self.root.joinpath(*element.split("/"))
+        if self.zf is None or element in self.fetched:
+            return target
+        parts = element.split("/")
+        parents = {"/".join(parts[:i]) for i in range(len(parts))}
+        for info in self.zf.infolist():
+            if info.is_dir() or not info.filename.startswith(self.prefix):
+                continue
+            rel = info.filename[len(self.prefix) :]
+            if ".." in rel.split("/"):
+                continue  # never write outside the scratch dir
+            head, _, base = rel.rpartition("/")
+            if rel.startswith(f"{element}/") or (head in parents and base in ZARR_GROUP_METADATA):
+                out = self.root.joinpath(*rel.split("/"))
+                out.parent.mkdir(parents=True, exist_ok=True)
+                with self.zf.open(info) as src, out.open("wb") as dst:
+                    shutil.copyfileobj(src, dst)
+        self.fetched.add(element)
+        return target
 
 
 @contextmanager
-def _opened_store(path: Path) -> Generator[Path, None, None]:
-    """Yield a directory path that ``sd.read_zarr`` can open.
+def _opened_store(path: Path) -> Generator[_Store, None, None]:
+    """Open a ``.zarr`` directory in place or a ``.zarr.zip`` over a scratch dir.
 
-    A ``.zarr`` directory is used in place; a ``.zarr.zip`` is extracted to a
-    temporary directory first (read_zarr expects a directory store).
+    Only the elements the caller `fetch`es are extracted from a zip (read_zarr
+    expects a directory store), so scratch usage scales with what is exported.
     """
     if path.is_dir():
-        yield path
+        yield _Store(path)
         return
     if path.suffix == ".zip" or zipfile.is_zipfile(path):
-        with tempfile.TemporaryDirectory() as tmp:
-            with zipfile.ZipFile(path) as zf:
-                zf.extractall(tmp)
-            extracted = Path(tmp)
-            # Zips may wrap the store in a single top-level directory.
-            entries = [p for p in extracted.iterdir() if not p.name.startswith(".")]
-            if len(entries) == 1 and entries[0].is_dir():
-                extracted = entries[0]
-            yield extracted
+        with tempfile.TemporaryDirectory() as tmp, zipfile.ZipFile(path) as zf:
+            yield _Store(Path(tmp), zf, _zip_store_root(zf.namelist()))
         return
     fail(f"spatialdata format requires a .zarr directory or .zarr.zip file; got {path}")
 
 
-def _read_zarr_sanitized(store: Path) -> "sd.SpatialData":
-    """Read a store whose table keys violate spatialdata's naming rules.
+def _read_tables(store: _Store) -> dict[str, "anndata.AnnData"]:
+    """Read only the store's ``tables`` group, sanitizing keys if needed.
 
     spatialdata >=0.7 validates element/column names at ``SpatialData``
     construction, rejecting otherwise-valid stores whose ``obs``/``var`` names
-    contain characters outside ``[A-Za-z0-9_.-]`` (e.g. 'µm', '^2', 'a/b').
-    Read the non-table elements normally, then attach each table after
-    running it through spatialdata's own sanitizer, which replaces invalid
-    characters with underscores (and de-duplicates any resulting collisions).
+    contain characters outside ``[A-Za-z0-9_.-]`` (e.g. 'µm', '^2', 'a/b'). On
+    that error each table is re-read directly and run through spatialdata's own
+    sanitizer, which replaces invalid characters with underscores (and
+    de-duplicates any resulting collisions).
     """
     import anndata as ad
     import spatialdata as sd
+    from spatialdata._core.validation import ValidationError
 
-    sdata = sd.read_zarr(store, selection=("images", "labels", "points", "shapes"))
-    tables_dir = store / "tables"
+    tables_dir = store.fetch("tables")
+    try:
+        with warnings.catch_warnings():
+            # The annotated region elements are deliberately not loaded here.
+            warnings.filterwarnings("ignore", message="The table is annotating", category=UserWarning)
+            return dict(sd.read_zarr(store.root, selection=("tables",)).tables)
+    except ValidationError:
+        pass
+
+    tables = {}
     if tables_dir.is_dir():
         for table_dir in sorted(p for p in tables_dir.iterdir() if p.is_dir()):
             table = ad.read_zarr(table_dir)
             sd.sanitize_table(table, inplace=True)
-            sdata.tables[table_dir.name] = table
-    return sdata
+            tables[table_dir.name] = table
+    return tables
+
 
+def _read_shapes(store: _Store, name: str) -> "gpd.GeoDataFrame | None":
+    """Read the single shapes element `name`, or None if the store has no such element.
+
+    Current stores (shapes format >=0.2) keep the element as one GeoParquet file,
+    read directly with geopandas. Older stores encode the geometry as Zarr arrays;
+    those go through the public ``read_zarr`` of the ``shapes`` group, which also
+    reads the store's other shapes elements.
+    """
+    element = store.fetch(f"shapes/{name}")
+    if not element.is_dir():
+        return None
+    if (element / "shapes.parquet").is_file():
+        import geopandas as gpd
 
-def _coords_from_shapes(sdata: "sd.SpatialData", table: "anndata.AnnData") -> pd.DataFrame | None:
-    """Centroids of the table's region shapes, indexed by the instance key."""
+        return gpd.read_parquet(element / "shapes.parquet")
+
+    import spatialdata as sd
+
+    return sd.read_zarr(store.root, selection=("shapes",)).shapes.get(name)
+
+
+def _coords_from_shapes(store: _Store, table: "anndata.AnnData") -> pd.DataFrame | None:
+    """Centroids of the table's region shapes, indexed by the instance key.
+
+    Only the shapes elements the table annotates are loaded.
+    """
     attrs = table.uns.get("spatialdata_attrs", {})
     region = attrs.get("region")
     instance_key = attrs.get("instance_key")
     if not region or not instance_key or instance_key not in table.obs:
         return None
     regions = [region] if isinstance(region, str) else list(region)
-    shape_names = [r for r in regions if r in sdata.shapes]
-    if not shape_names:
+    shapes = {r: gdf for r in regions if (gdf := _read_shapes(store, r)) is not None}
+    if not shapes:
         return None
+    shape_names = list(shapes)
 
-    geoms = pd.concat([sdata.shapes[r].geometry for r in shape_names])
+    geoms = pd.concat([gdf.geometry for gdf in shapes.values()])
     centroids = geoms.centroid
-    by_instance = pd.Series(
-        {str(i): (g.x, g.y) for i, g in zip(centroids.index, centroids)}
+    by_instance = pd.DataFrame(
+        {"x": centroids.x.to_numpy(), "y": centroids.y.to_numpy()}, index=as_str_index(centroids.index)
     )
+    by_instance = by_instance[~by_instance.index.duplicated(keep="last")]
 
     instances = as_str_index(table.obs[instance_key])
     missing = instances.difference(by_instance.index)
@@ -115,8 +194,7 @@ def _coords_from_shapes(sdata: "sd.SpatialData", table: "anndata.AnnData") -> pd
             f"{len(missing)} table observations have no matching shape in "
             f"{shape_names}; cannot place them"
         )
-    xy = np.array([by_instance[i] for i in instances])
-    return pd.DataFrame({"x": xy[:, 0], "y": xy[:, 1]}, index=instances)
+    return by_instance.loc[instances]
 
 
 def read(args: Namespace) -> SpatialSample:
@@ -127,54 +205,26 @@ def read(args: Namespace) -> SpatialSample:
     absent, the centroids of the matching `shapes` element joined on the instance key.
     Images are not exported (see the module docstring).
     """
-    import spatialdata as sd
-    from spatialdata._core.validation import ValidationError
-
     path = Path(args.zarr)
     mpp = (args.pixel_size * 1e-6) if args.pixel_size else DEFAULT_MPP
     spot_size = args.spot_size or DEFAULT_SPOT_SIZE
 
     with _opened_store(path) as store:
-        try:
-            sdata = sd.read_zarr(store)
-        except ValidationError:
-            sdata = _read_zarr_sanitized(store)
-
-        if not sdata.tables:
+        tables = _read_tables(store)
+        if not tables:
             fail(f"SpatialData store {path} has no tables; nothing to export")
-        table_key, table = next(iter(sdata.tables.items()))
+        table_key, table = next(iter(tables.items()))
         region = table.uns.get("spatialdata_attrs", {}).get("region")
         coords_name = region if isinstance(region, str) else table_key
 
         if "spatial" in table.obsm:
-            return anndata_to_sample(
-                table, mpp=mpp, coords_name=coords_name, spot_size=spot_size
-            )
+            return anndata_to_sample(table, mpp=mpp, coords_name=coords_name, spot_size=spot_size)
 
-        coords = _coords_from_shapes(sdata, table)
+        coords = _coords_from_shapes(store, table)
         if coords is None:
             fail(
                 "table has no obsm['spatial'] and no matching shapes element; "
                 "labels-based centroid fallback is not implemented"
             )
 
-        obs_ids = coords.index
-        mat = table.X
-        if hasattr(mat, "toarray"):
-            mat = mat.toarray()
-        expr = pd.DataFrame(np.asarray(mat), index=obs_ids, columns=as_str_index(table.var_names))
-        groups = [expression_group(expr, None)]
-
-        cat = [c for c in table.obs.columns if str(table.obs[c].dtype) in ("category", "object")]
-        if cat:
-            ann = table.obs[cat].astype(str)
-            ann.index = obs_ids
-            groups.append(FeatureGroup("Annotations", ann, data_type="categorical"))
-
-        return SpatialSample(
-            coords=coords,
-            mpp=mpp,
-            coords_name=coords_name,
-            spot_size=spot_size,
-            features=groups,
-        )
+        return anndata_to_sample(table, mpp=mpp, coords_name=coords_name, spot_size=spot_size, coords=coords)
@@ -16,6 +16,7 @@ from .common import (
     read_10x_clusters,
     read_10x_h5,
     read_mex,
+    read_table,
 )
 
 SPOT_DIAMETER_UM = 55.0  # a Visium spot is 55 microns across
@@ -48,13 +49,19 @@ def _expression(outs: Path) -> FeatureGroup:
     return expression_group(counts, ftype)
 
 
-def _positions(spatial: Path) -> pd.DataFrame:
-    """Read tissue_positions (parquet / headered csv / legacy list), normalized to `POSITION_COLUMNS`."""
+def read_positions(spatial: Path, *, in_tissue: bool = False) -> pd.DataFrame:
+    """Read tissue_positions (parquet / headered csv / legacy list), normalized to `POSITION_COLUMNS`.
+
+    With `in_tissue`, only in-tissue spots are returned. Parquet (the large Space
+    Ranger v2+ table) is read with the columns projected to `POSITION_COLUMNS` and
+    the filter pushed down to pyarrow; the CSVs keep the positional fallback below.
+    """
     parquet = spatial / "tissue_positions.parquet"
     csv_headered = spatial / "tissue_positions.csv"
     csv_legacy = spatial / "tissue_positions_list.csv"
+    equals = {"in_tissue": 1} if in_tissue else None
     if parquet.exists():
-        df = pd.read_parquet(parquet)
+        df = read_table(parquet, POSITION_COLUMNS, equals=equals)
     elif csv_headered.exists():
         df = pd.read_csv(csv_headered)
     elif csv_legacy.exists():
@@ -68,7 +75,7 @@ def _positions(spatial: Path) -> pd.DataFrame:
     if list(df.columns)[: len(POSITION_COLUMNS)] != POSITION_COLUMNS:
         df = df.iloc[:, : len(POSITION_COLUMNS)]
         df.columns = POSITION_COLUMNS
-    return df
+    return df[df["in_tissue"] == 1] if in_tissue else df
 
 
 def _calibration(spatial: Path, override: float | None) -> float:
@@ -98,8 +105,7 @@ def read(args: Namespace) -> SpatialSample:
     outs = _outs(folder)
     spatial = outs / "spatial"
 
-    positions = _positions(spatial)
-    positions = positions[positions["in_tissue"] == 1]
+    positions = read_positions(spatial, in_tissue=True)
     if positions.empty:
         fail("no in-tissue spots found in tissue positions")
     coords = pd.DataFrame(
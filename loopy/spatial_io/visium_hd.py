@@ -5,19 +5,36 @@ Uses the binned outputs at the coarsest available bin (prefer square_016um, else
 from `spatial/tissue_positions.parquet` in full-res image pixels; calibration uses
 the `microns_per_pixel` key in `scalefactors_json.json`.
 
-Segmented single cells (`segmented_outputs/`) are a possible future extension: it
-would require parsing `cell_segmentations.geojson` centroids and mapping the integer
-geojson cell ids to the matrix barcodes (`cellid_00000000N-1`). Not implemented here.
+With --bin-sizes, the finest bin (square_002um) is re-binned instead: each
+requested size (a multiple of 2 µm) groups the 2 µm bins by
+``array_row // k, array_col // k`` and sums their counts with one sparse
+aggregation-matrix product; its position is the mean of its 2 µm bins. The
+coarsest requested size is the sample's coord set (shown by default), and the
+finer ones are extra coord sets with their own expression group.
+
+With --segmented (or when there is no binned_outputs/), the segmented single
+cells of `segmented_outputs/` are read instead. Their positions are the polygon
+centroids of `cell_segmentations.geojson`, which holds one polygon per cell and
+can run to 500k+ cells. It is streamed one feature at a time, and the centroids
+are computed for all polygons at once with the shoelace formula. The geojson's
+integer `cell_id`s are matched to the matrix barcodes (``cellid_000000123-1``)
+by parsing the barcodes' integer ids, not by formatting one string per polygon.
 """
 from __future__ import annotations
 
+import gzip
 import json
 from argparse import Namespace
 from pathlib import Path
+from typing import Any, Iterator
 
+import numpy as np
 import pandas as pd
+from scipy.sparse import csc_matrix, csr_matrix
 
 from .common import (
+    GENE_EXPRESSION,
+    CoordSet,
     FeatureGroup,
     SpatialSample,
     as_str_index,
@@ -25,9 +42,14 @@ from .common import (
     fail,
     read_10x_clusters,
     read_10x_h5,
+    read_10x_h5_csc,
+    read_table,
 )
 
 BIN_PREFERENCE = ("square_016um", "square_008um", "square_002um")
+BASE_BIN_UM = 2
+SEGMENTATION_FILES = ("cell_segmentations.geojson", "cell_segmentations.geojson.gz")
+GEOJSON_READ_SIZE = 1 << 22  # characters per read while streaming
 
 
 def _bin_dir(folder: Path) -> Path:
@@ -59,12 +81,19 @@ def _calibration(bin_dir: Path, bin_size_um: float, override: float | None) -> f
 
 
 def _coords(bin_dir: Path) -> pd.DataFrame:
-    """Read in-tissue bin coordinates (full-res pixels) from the bin's tissue_positions.parquet."""
+    """Read in-tissue bin coordinates (full-res pixels) from the bin's tissue_positions.parquet.
+
+    At 2 µm this table has millions of rows, so only the barcode and pixel columns
+    of in-tissue bins are read (projection and filter pushed down to pyarrow).
+    """
     positions = bin_dir / "spatial" / "tissue_positions.parquet"
     if not positions.exists():
         fail(f"missing {positions}")
-    df = pd.read_parquet(positions)
-    df = df[df["in_tissue"] == 1]
+    columns = ["barcode", "pxl_row_in_fullres", "pxl_col_in_fullres"]
+    df = read_table(positions, columns, equals={"in_tissue": 1})
+    missing = [c for c in columns if c not in df.columns]
+    if missing:
+        fail(f"{positions} has no {missing} column(s)")
     if df.empty:
         fail(f"no in_tissue bins in {positions}")
     return pd.DataFrame(
@@ -73,16 +102,251 @@ def _coords(bin_dir: Path) -> pd.DataFrame:
     )
 
 
+def rebin(
+    counts: csc_matrix, rows: np.ndarray, cols: np.ndarray, xy: np.ndarray, factor: int
+) -> tuple[csc_matrix, np.ndarray, np.ndarray, np.ndarray]:
+    """Sum `counts` (bins x genes) over `factor` x `factor` blocks of the bin grid.
+
+    Returns the binned counts, each new bin's grid row and column, and the mean
+    `xy` (pixel position) of its member bins. The grouping is a single sparse
+    product with a one-hot aggregation matrix (new bins x old bins).
+    """
+    r, c = rows.astype(np.int64) // factor, cols.astype(np.int64) // factor
+    width = int(c.max()) + 1
+    keys, inverse = np.unique(r * width + c, return_inverse=True)
+    n_old, n_new = len(rows), len(keys)
+    agg = csr_matrix((np.ones(n_old, dtype=counts.dtype), (inverse, np.arange(n_old))), shape=(n_new, n_old))
+    members = np.bincount(inverse, minlength=n_new)
+    centers = np.column_stack(
+        [np.bincount(inverse, weights=xy[:, i], minlength=n_new) / members for i in range(2)]
+    )
+    return (agg @ counts).tocsc(), keys // width, keys % width, centers
+
+
+def _read_rebinned(folder: Path, bin_sizes: list[int], pixel_size: float | None) -> SpatialSample:
+    """Re-bin square_002um into each of `bin_sizes` (see the module docstring)."""
+    bad = [b for b in bin_sizes if b < BASE_BIN_UM or b % BASE_BIN_UM]
+    if bad:
+        fail(f"--bin-sizes must be multiples of {BASE_BIN_UM} µm; got {bad}")
+    bin_dir = folder / "binned_outputs" / f"square_{BASE_BIN_UM:03d}um"
+    h5 = bin_dir / "filtered_feature_bc_matrix.h5"
+    if not h5.exists():
+        fail(f"--bin-sizes needs the 2 µm bins; missing {h5}")
+    print(f"visium_hd: re-binning {bin_dir.name} into {sorted(set(bin_sizes))} µm bins")
+
+    counts, barcodes, names, ftype = read_10x_h5_csc(h5)
+    if ftype.notna().any():
+        keep = np.flatnonzero(ftype.to_numpy() == GENE_EXPRESSION)
+        counts, names = counts[:, keep], [names[i] for i in keep]
+
+    positions = bin_dir / "spatial" / "tissue_positions.parquet"
+    if not positions.exists():
+        fail(f"missing {positions}")
+    pos = read_table(
+        positions, ["barcode", "array_row", "array_col", "pxl_row_in_fullres", "pxl_col_in_fullres"]
+    ).set_index("barcode")
+    pos.index = as_str_index(pos.index)
+    missing = barcodes.difference(pos.index)
+    if len(missing):
+        fail(f"{len(missing)} barcodes of {h5} have no position in {positions}, e.g. {list(missing[:3])}")
+    pos = pos.loc[barcodes]
+    rows, cols = pos["array_row"].to_numpy(), pos["array_col"].to_numpy()
+    xy = pos[["pxl_col_in_fullres", "pxl_row_in_fullres"]].to_numpy(dtype=float)
+
+    levels = []
+    for size in sorted(set(bin_sizes), reverse=True):
+        binned, brow, bcol, centers = rebin(counts, rows, cols, xy, size // BASE_BIN_UM)
+        ids = as_str_index([f"s_{size:03d}um_{r:05d}_{c:05d}-1" for r, c in zip(brow, bcol)])
+        coords = pd.DataFrame({"x": centers[:, 0], "y": centers[:, 1]}, index=ids)
+        df = pd.DataFrame.sparse.from_spmatrix(binned, index=ids, columns=names)
+        levels.append((f"bins_{size:03d}um", size, coords, df))
+
+    features, extra = [], []
+    for name, size, coords, df in levels:
+        group = expression_group(df, None, name=f"Gene expression {size:03d}um")
+        if name != levels[0][0]:  # the coarsest follows the sample's coords, even when renamed
+            group.coords_name = name
+            extra.append(CoordSet(name, coords, spot_size=size * 1e-6))
+        features.append(group)
+
+    mpp_um = _calibration(bin_dir, BASE_BIN_UM, pixel_size)
+    coarsest = levels[0]
+    return SpatialSample(
+        coords=coarsest[2],
+        mpp=mpp_um * 1e-6,
+        coords_name=coarsest[0],
+        spot_size=coarsest[1] * 1e-6,
+        features=features,
+        image=None,
+        extra_coords=extra,
+    )
+
+
+def _iter_geojson_features(path: Path) -> Iterator[dict[str, Any]]:
+    """Yield the members of a FeatureCollection's ``features`` array one at a time.
+
+    The file is read in `GEOJSON_READ_SIZE` pieces and each feature is decoded as
+    soon as it is complete, so memory holds one piece rather than the whole
+    collection.
+    """
+    decoder = json.JSONDecoder()
+    opener = gzip.open if path.suffix == ".gz" else open
+    with opener(path, "rt") as fh:
+        buf, pos, eof = "", 0, False
+
+        def more() -> bool:
+            nonlocal buf, pos, eof
+            chunk = fh.read(GEOJSON_READ_SIZE)
+            eof = not chunk
+            buf, pos = buf[pos:] + chunk, 0
+            return not eof
+
+        while (start := buf.find('"features"')) < 0:
+            if not more():
+                fail(f"{path} is not a GeoJSON FeatureCollection (no 'features' array)")
+        pos = start + len('"features"')
+        while (bracket := buf.find("[", pos)) < 0:
+            if not more():
+                fail(f"{path}: truncated 'features' array")
+        pos = bracket + 1
+
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos == len(buf):
+                if not more():
+                    fail(f"{path}: truncated 'features' array")
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                feature, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if not more():
+                    raise
+                continue
+            yield feature
+
+
+def _polygon_centroids(path: Path) -> pd.DataFrame:
+    """Area centroids (x, y) of the cell polygons in `path`, indexed by integer `cell_id`.
+
+    Exterior rings of every Polygon / MultiPolygon are gathered into one vertex
+    array; the signed area and centroid of every ring come from a single shoelace
+    pass with `np.add.reduceat`, and multi-part cells are combined area-weighted.
+    """
+    ids: list[int] = []
+    owners: list[int] = []  # cell position of each ring
+    lengths: list[int] = []  # vertices per ring
+    vertices: list[list[float]] = []
+    for feature in _iter_geojson_features(path):
+        geom = feature.get("geometry") or {}
+        props = feature.get("properties") or {}
+        if "cell_id" not in props or geom.get("type") not in ("Polygon", "MultiPolygon"):
+            continue
+        polygons = [geom["coordinates"]] if geom["type"] == "Polygon" else geom["coordinates"]
+        for polygon in polygons:
+            ring = polygon[0] if polygon else []  # exterior; holes are negligible for a centroid
+            if not ring:
+                continue
+            owners.append(len(ids))
+            lengths.append(len(ring))
+            vertices.extend(ring)
+        ids.append(int(props["cell_id"]))
+    if not vertices:
+        fail(f"no cell polygons with a cell_id in {path}")
+
+    xy = np.asarray(vertices, dtype=float)[:, :2]
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    nxt = np.arange(len(xy)) + 1
+    nxt[np.cumsum(lengths) - 1] = starts  # wrap each ring to its first vertex
+    x0, y0, x1, y1 = xy[:, 0], xy[:, 1], xy[nxt, 0], xy[nxt, 1]
+    cross = x0 * y1 - x1 * y0
+    area = np.add.reduceat(cross, starts) / 2
+    extent = np.add.reduceat(np.abs(cross), starts) / 2  # what `area` would be with no cancellation
+    cx = np.add.reduceat((x0 + x1) * cross, starts)
+    cy = np.add.reduceat((y0 + y1) * cross, starts)
+
+    owners_arr = np.asarray(owners)
+    n = len(ids)
+    total = np.bincount(owners_arr, weights=area, minlength=n)
+    x = np.bincount(owners_arr, weights=cx, minlength=n) / 6
+    y = np.bincount(owners_arr, weights=cy, minlength=n) / 6
+    # Zero-area cells (collinear or self-cancelling rings, up to rounding) fall back to their mean vertex.
+    flat = np.abs(total) <= 1e-9 * np.bincount(owners_arr, weights=extent, minlength=n)
+    x[~flat] /= total[~flat]
+    y[~flat] /= total[~flat]
+    if flat.any():
+        per_ring = np.repeat(owners_arr, lengths)
+        counts = np.bincount(per_ring, minlength=n)
+        with np.errstate(divide="ignore", invalid="ignore"):  # a cell whose rings were all empty
+            x[flat] = (np.bincount(per_ring, weights=x0, minlength=n) / counts)[flat]
+            y[flat] = (np.bincount(per_ring, weights=y0, minlength=n) / counts)[flat]
+
+    df = pd.DataFrame({"x": x, "y": y}, index=pd.Index(ids, name="cell_id"))
+    empty = df["x"].isna()
+    if empty.any():
+        print(f"visium_hd: skipping {int(empty.sum())} cell polygons without vertices in {path.name}")
+        df = df[~empty]
+    return df[~df.index.duplicated(keep="last")]
+
+
+def _read_segmented(folder: Path, pixel_size: float | None) -> SpatialSample:
+    """Read the segmented cells of `segmented_outputs/` (see the module docstring)."""
+    seg = folder / "segmented_outputs"
+    h5 = seg / "filtered_feature_cell_matrix.h5"
+    geojson = next((seg / f for f in SEGMENTATION_FILES if (seg / f).exists()), None)
+    if not h5.exists() or geojson is None:
+        fail(f"segmented cells need {h5.name} and {SEGMENTATION_FILES[0]} in {seg}")
+    print(f"visium_hd: using segmented cells from {seg}")
+
+    counts, ftype = read_10x_h5(h5)
+    features = [expression_group(counts, ftype)]
+    clusters = read_10x_clusters(seg / "analysis")
+    if clusters is not None:
+        features.append(clusters)
+
+    centroids = _polygon_centroids(geojson)
+    cell_ids = counts.index.str.extract(r"^cellid_0*(\d+)-\d+$", expand=False)
+    if cell_ids.isna().any():
+        bad = counts.index[cell_ids.isna()]
+        fail(f"{len(bad)} matrix barcodes are not cellid_<N>-<k>, e.g. {list(bad[:3])}")
+    rows = centroids.index.get_indexer(cell_ids.astype(np.int64))
+    if (rows < 0).any():
+        fail(f"{int((rows < 0).sum())} cells of {h5.name} have no polygon in {geojson.name}")
+    coords = pd.DataFrame(centroids.to_numpy()[rows], columns=["x", "y"], index=counts.index)
+
+    # Calibration lives with the full-res image, shared by every bin and the cells.
+    spatial_dir = seg if (seg / "spatial").is_dir() else folder / "binned_outputs" / "square_002um"
+    mpp_um = _calibration(spatial_dir, BASE_BIN_UM, pixel_size)
+    return SpatialSample(
+        coords=coords,
+        mpp=mpp_um * 1e-6,
+        coords_name="cells",
+        spot_size=10e-6,
+        features=features,
+        image=None,
+    )
+
+
 def read(args: Namespace) -> SpatialSample:
     """Read a 10x Visium HD output directory into a `SpatialSample`.
 
     Uses the coarsest available bin (see `BIN_PREFERENCE`); coordinates are the
     in-tissue bins' full-resolution pixel positions, feature groups are gene
-    expression and 10x clusters (if present). No image is attached.
+    expression and 10x clusters (if present). No image is attached. With
+    `--bin-sizes`, the 2 µm bins are re-binned instead, and with `--segmented` the
+    segmented cells are read (see the module docstring).
     """
     folder = args.folder
     if not folder or not folder.is_dir():
         fail("visium_hd format requires --folder pointing at a Space Ranger output directory")
+    if getattr(args, "segmented", False) or (
+        not (folder / "binned_outputs").is_dir() and (folder / "segmented_outputs").is_dir()
+    ):
+        return _read_segmented(folder, args.pixel_size)
+    if getattr(args, "bin_sizes", None):
+        return _read_rebinned(folder, args.bin_sizes, args.pixel_size)
 
     bin_dir = _bin_dir(folder)
     bin_size_um = float(bin_dir.name.removeprefix("square_").removesuffix("um"))
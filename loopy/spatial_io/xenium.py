@@ -16,6 +16,7 @@ from .common import (
     read_10x_clusters,
     read_10x_h5,
     read_mex,
+    read_table,
 )
 
 DEFAULT_PIXEL_SIZE = 0.2125  # microns/px
@@ -39,15 +40,20 @@ def _pixel_size(folder: Path, override: float | None) -> float:
 
 
 def _cells(folder: Path) -> pd.DataFrame:
-    """Read the per-cell table (cells.parquet or cells.csv.gz), indexed by `cell_id`."""
+    """Read the per-cell table (cells.parquet or cells.csv.gz), indexed by `cell_id`.
+
+    Only the id, centroid and QC columns are loaded.
+    """
+    columns = ["cell_id", "x_centroid", "y_centroid", *QC_COLUMNS]
     if (folder / "cells.parquet").exists():
-        df = pd.read_parquet(folder / "cells.parquet")
+        df = read_table(folder / "cells.parquet", columns)
     elif (folder / "cells.csv.gz").exists():
-        df = pd.read_csv(folder / "cells.csv.gz")
+        df = read_table(folder / "cells.csv.gz", columns)
     else:
         fail(f"missing cells.parquet / cells.csv.gz in {folder}")
-    if "cell_id" not in df.columns:
-        fail(f"cells table has no 'cell_id' column; found {list(df.columns)}")
+    missing = [c for c in columns[:3] if c not in df.columns]
+    if missing:
+        fail(f"cells table has no {missing} column(s); found {list(df.columns)}")
     df.index = as_str_index(df["cell_id"])
     return df
 
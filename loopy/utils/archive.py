@@ -0,0 +1,71 @@
+"""Pack a sample folder into one uncompressed, range-addressable ZIP.
+
+A sample is `sample.json` plus coordinate CSVs, chunked `.bin`/`.json` pairs
+and several COGs. Copying a folder like that to object storage or over NFS
+costs one round of metadata operations per file. `pack_sample` writes all of
+it as a single `<sample>.zip`, in one sequential write, with every member
+*stored* (not deflated): the assets are already compressed, and a stored
+member is a contiguous byte range of the archive. `read_index` recovers those
+ranges from the ZIP's central directory, which is how `loopy serve` answers
+range requests for `/<sample>/<file>` from inside the archive.
+
+Any ZIP tool can list or extract the archive. Members are written with
+`sample.json` first and then smallest first, so headers and coordinates sit
+at the front.
+"""
+from __future__ import annotations
+
+import os
+import struct
+import zipfile
+from pathlib import Path
+from typing import Optional
+
+ARCHIVE_SUFFIX = ".zip"
+LOCAL_HEADER = struct.Struct("<4sHHHHHIIIHH")  # ZIP local file header, before the name and extra field
+LOCAL_SIGNATURE = b"PK\x03\x04"
+
+
+def pack_sample(folder: Path, dest: Optional[Path] = None) -> Path:
+    """Write the files of the sample `folder` to `dest` (default `<folder>.zip` beside it).
+
+    Hidden files and unfinished `.tmp` writes are skipped. The archive is
+    written to a temporary name and moved into place, so a server never sees
+    a partial archive.
+    """
+    if not (folder / "sample.json").is_file():
+        raise ValueError(f"{folder} is not a sample folder (no sample.json)")
+    dest = dest if dest is not None else folder.with_name(folder.name + ARCHIVE_SUFFIX)
+    files = [p for p in folder.iterdir() if p.is_file() and not p.name.startswith(".") and p.suffix != ".tmp"]
+    files.sort(key=lambda p: (p.name != "sample.json", p.stat().st_size, p.name))
+
+    tmp = dest.with_name(dest.name + ".tmp")
+    try:
+        with zipfile.ZipFile(tmp, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+            for path in files:
+                zf.write(path, arcname=path.name)
+        os.replace(tmp, dest)
+    finally:
+        tmp.unlink(missing_ok=True)
+    return dest
+
+
+def read_index(path: Path) -> dict[str, tuple[int, int]]:
+    """Member name -> (offset of its data in the archive, size) for the stored members of `path`.
+
+    Deflated members (the archive was not written by `pack_sample`) are left
+    out, since their bytes cannot be served as ranges.
+    """
+    index = {}
+    with open(path, "rb") as fh, zipfile.ZipFile(fh) as zf:
+        for info in zf.infolist():
+            if info.is_dir() or info.compress_type != zipfile.ZIP_STORED:
+                continue
+            fh.seek(info.header_offset)
+            header = LOCAL_HEADER.unpack(fh.read(LOCAL_HEADER.size))
+            if header[0] != LOCAL_SIGNATURE:
+                raise ValueError(f"{path}: bad local header for {info.filename}")
+            name_len, extra_len = header[-2:]
+            offset = info.header_offset + LOCAL_HEADER.size + name_len + extra_len
+            index[info.filename] = (offset, info.file_size)
+    return index
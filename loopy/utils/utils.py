@@ -2,6 +2,8 @@
 import gzip
 import hashlib
 import json
+import os
+import shutil
 from pathlib import Path
 from typing import Any, Callable, Literal, Protocol, Union
 
@@ -89,6 +91,42 @@ def concat(objs: list[Any], f: Callable[[Any], bytes] = lambda x: x) -> tuple[np
     return ptr, outbytes
 
 
+SIDECAR_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+BROTLI_QUALITY = 9  # 11 is ~10x slower for a few % on large coordinate CSVs
+
+
+def write_sidecars(path: Path) -> list[Path]:
+    """Write precompressed `.br` / `.gz` copies of `path` next to it for the server to negotiate.
+
+    `.br` is only written if the optional `brotli` package is installed. Sidecars
+    are written to a temporary name and renamed, so a reader never sees a partial
+    file, and they are always newer than `path` (the server ignores stale ones).
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    written = []
+    for encoding, suffix in SIDECAR_SUFFIXES.items():
+        if encoding == "br" and brotli is None:
+            continue
+        out = path.with_name(path.name + suffix)
+        tmp = out.with_name(out.name + ".tmp")
+        with open(path, "rb") as src, open(tmp, "wb") as dst:
+            if encoding == "gzip":
+                with gzip.GzipFile(filename="", mode="wb", fileobj=dst, compresslevel=9, mtime=0) as gz:
+                    shutil.copyfileobj(src, gz, 1 << 20)
+            else:
+                comp = brotli.Compressor(quality=BROTLI_QUALITY)
+                while block := src.read(1 << 20):
+                    dst.write(comp.process(block))
+                dst.write(comp.finish())
+        os.replace(tmp, out)
+        written.append(out)
+    return written
+
+
 def check_md5(path: Path, md5: str) -> bool:
     with open(path, "rb") as f:
         return hashlib.md5(f.read()).hexdigest() == md5
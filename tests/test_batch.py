@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import json
+import os
+import sys
+from argparse import Namespace
+from pathlib import Path
+
+import pytest
+
+from loopy.spatial_io.batch import SUMMARY_FILE, read_manifest, run_batch, write_summary
+from loopy.spatial_io.preprocess import _parser
+
+
+def _defaults(tmp_path: Path, *extra: str) -> Namespace:
+    return _parser().parse_args(["--outdir", str(tmp_path / "out"), *extra])
+
+
+def test_read_manifest_csv_converts_like_the_cli(tmp_path: Path) -> None:
+    manifest = tmp_path / "runs" / "manifest.csv"
+    manifest.parent.mkdir()
+    manifest.write_text(
+        "sample_name,format,folder,pixel-size,bin-sizes,no-image\n"
+        "a,xenium,slide_a,0.2125,,yes\n"
+        "b,visium_hd,/data/b,,8 16,\n"
+    )
+    a, b = read_manifest(manifest, _parser(), _defaults(tmp_path, "--convert-8bit", "--workers", "3"))
+
+    assert (a.sample_name, a.format, a.folder) == ("a", "xenium", manifest.parent / "slide_a")
+    assert a.pixel_size == 0.2125 and a.no_image and a.bin_sizes is None
+    assert b.folder == Path("/data/b") and b.bin_sizes == [8, 16] and not b.no_image
+    # Command-line values are every row's defaults.
+    assert a.convert_8bit and b.convert_8bit and a.workers == b.workers == 3
+    assert a.outdir == b.outdir == tmp_path / "out"
+
+
+def test_read_manifest_json_and_errors(tmp_path: Path) -> None:
+    manifest = tmp_path / "manifest.json"
+    manifest.write_text(
+        json.dumps([{"sample-name": "a", "format": "cosmx", "precompress": True, "workers": 2}])
+    )
+    (a,) = read_manifest(manifest, _parser(), _defaults(tmp_path))
+    assert a.precompress and a.workers == 2
+
+    for rows, message in [
+        ([{"sample_name": "a", "format": "cosmx", "colour": "red"}], "unknown option 'colour'"),
+        ([{"sample_name": "a"}], "sample_name and format are required"),
+        (
+            [{"sample_name": "a", "format": "x"}, {"sample_name": "a", "format": "x"}],
+            "duplicate sample names",
+        ),
+        ([{"sample_name": "a", "format": "x", "workers": "many"}], "row 1: invalid options"),
+    ]:
+        manifest.write_text(json.dumps(rows))
+        with pytest.raises(SystemExit, match=message):
+            read_manifest(manifest, _parser(), _defaults(tmp_path))
+
+
+def _run(args: Namespace) -> None:
+    if args.sample_name == "crash":
+        os._exit(1)  # like a worker killed by the OOM killer
+    if args.sample_name == "abort":
+        sys.exit("reader aborted")
+
+
+def test_run_batch_isolates_failures_and_retries_after_a_dead_worker() -> None:
+    samples = [Namespace(sample_name=n, format="x") for n in ("ok1", "crash", "abort", "ok2")]
+    results = run_batch(samples, _run, jobs=2)
+
+    assert [r["sample"] for r in results] == ["ok1", "crash", "abort", "ok2"]
+    assert [r["status"] for r in results] == ["ok", "crashed", "failed", "ok"]
+    assert results[1]["seconds"] is None and "worker process died" in results[1]["error"]
+    assert results[2]["error"] == "reader aborted"
+
+
+def test_write_summary(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    results = [
+        {"sample": "a", "format": "xenium", "status": "ok", "error": None, "seconds": 1.25},
+        {"sample": "bb", "format": "cosmx", "status": "crashed", "error": "worker died", "seconds": None},
+    ]
+    path = write_summary(results, tmp_path / "out")
+
+    assert path == tmp_path / "out" / SUMMARY_FILE and json.loads(path.read_text()) == results
+    out = capsys.readouterr().out
+    assert "a       xenium       ok            1.2" in out and "worker died" in out
+    assert "1/2 samples succeeded" in out
@@ -8,13 +8,16 @@ from typing import Any, List
 import numpy as np
 import pandas as pd
 import pytest
+from scipy.sparse import csc_matrix, csr_matrix
 
 from loopy.feature import (
     ChunkedCSVHeader,
     ChunkedCSVParams,
     FeatureAndGroup,
     compress_chunked_features,
+    iter_csc_column_blocks,
     join_idx,
+    sparse_compress_chunked_blocks,
     sparse_compress_chunked_features,
 )
 from loopy.utils.utils import Url
@@ -122,6 +125,46 @@ def test_sparse_compress_chunked_features_rejects_unknown_mode() -> None:
         sparse_compress_chunked_features(df, mode="coo")
 
 
+@pytest.mark.parametrize("fmt", ["csr", "csc", "dense"])
+def test_sparse_compress_chunked_blocks_matches_dataframe_path(fmt: str) -> None:
+    df = pd.DataFrame({"a": [0, 1, 0], "b": [2, 0, 3], "c": [0, 0, 0], "d": [4, 0, 0.5]})
+    X = {"csr": csr_matrix(df.to_numpy()), "csc": csc_matrix(df.to_numpy()), "dense": df.to_numpy()}[fmt]
+
+    blocks = list(iter_csc_column_blocks(X, block_size=3))
+    header, data = sparse_compress_chunked_blocks(blocks, names=list(df.columns))
+    expected_header, expected = sparse_compress_chunked_features(df, mode="csc")
+
+    assert [b.shape for b in blocks] == [(3, 3), (3, 1)]
+    assert header == expected_header
+    # gzip headers carry a timestamp, so compare the decompressed chunks.
+    for start, end in zip(header.ptr[:-1], header.ptr[1:]):
+        if end > start:
+            assert gzip.decompress(bytes(data[start:end])) == gzip.decompress(bytes(expected[start:end]))
+
+
+@pytest.mark.parametrize("block_size", [1, 3, 64])
+def test_iter_csc_column_blocks_streams_backed_csr(tmp_path: Path, block_size: int) -> None:
+    ad = pytest.importorskip("anndata")
+    rng = np.random.default_rng(0)
+    X = csr_matrix(rng.poisson(0.3, size=(40, 7)).astype(np.float32))
+    ad.AnnData(X).write_h5ad(tmp_path / "x.h5ad")
+
+    backed = ad.read_h5ad(tmp_path / "x.h5ad", backed="r")
+    try:
+        blocks = list(iter_csc_column_blocks(backed.X, block_size=block_size))
+    finally:
+        backed.file.close()
+
+    assert [b.shape[1] for b in blocks] == [min(block_size, 7 - s) for s in range(0, 7, block_size)]
+    assert all(isinstance(b, csc_matrix) and b.has_sorted_indices for b in blocks)
+    np.testing.assert_array_equal(np.hstack([b.toarray() for b in blocks]), X.toarray())
+
+
+def test_sparse_compress_chunked_blocks_checks_names() -> None:
+    with pytest.raises(ValueError, match="2 names"):
+        sparse_compress_chunked_blocks([csc_matrix([[1, 0, 2]])], names=["a", "b"])
+
+
 def test_chunked_csv_params_default_header_and_write(tmp_path: Path) -> None:
     params = ChunkedCSVParams(name="genes", url=Url("genes.csv"), coordName="spots")
 
@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pandas as pd
+
+from loopy.profiling import profiling, stage
+from loopy.sample import Sample
+
+
+def test_stage_is_noop_without_profiler() -> None:
+    with stage("anything") as st:
+        st.add_file(Path("does-not-exist"))
+
+    assert not st.active and st.bytes_written == 0
+
+
+def test_repeated_stages_accumulate() -> None:
+    with profiling() as prof:
+        for _ in range(3):
+            with stage("gzip") as st:
+                st.add_bytes(5)
+
+    rec = prof.records["gzip"]
+    assert rec.calls == 3
+    assert rec.bytes_written == 15
+    assert rec.wall_s >= 0 and rec.cpu_s >= 0
+    assert prof.wall_s is not None
+
+
+def test_profiles_sample_write(tmp_path: Path) -> None:
+    idx = pd.Index(["a", "b"], dtype=object)
+    sample = Sample(name="demo", path=tmp_path / "demo")
+    sample.add_coords(pd.DataFrame({"x": [0, 1], "y": [1, 2]}, index=idx), name="spots")
+    sample.add_chunked_feature(pd.DataFrame({"g": [1.0, 2.0]}, index=idx), name="genes", coordName="spots")
+
+    with profiling() as prof:
+        sample.write()
+    prof.write(tmp_path / "profile.json")
+
+    stages = {r["stage"]: r for r in json.loads((tmp_path / "profile.json").read_text())["stages"]}
+    assert {"coord write", "join", "chunk encode", "gzip", "chunk write"} <= set(stages)
+    assert stages["coord write"]["bytes_written"] == (sample.path / "spots.csv").stat().st_size
+    assert stages["chunk write"]["bytes_written"] == sum(
+        (sample.path / f).stat().st_size for f in ["genes.json", "genes.bin"]
+    )
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import gzip
 import json
 from pathlib import Path
 from typing import Any, Callable, List, Tuple
@@ -7,9 +8,10 @@ from typing import Any, Callable, List, Tuple
 import numpy as np
 import pandas as pd
 import pytest
+from scipy.sparse import csc_matrix
 
-from loopy.feature import ChunkedCSVHeader
-from loopy.sample import OverlayParams, Sample
+from loopy.feature import ChunkedCSVHeader, iter_csc_column_blocks
+from loopy.sample import OverlayParams, Queued, Sample
 from loopy.utils.utils import Url
 
 
@@ -154,6 +156,33 @@ def test_add_chunked_feature_sparse_path(monkeypatch: pytest.MonkeyPatch, tmp_pa
     assert (sample.path / "gene_sparse.bin").read_bytes() == payload
 
 
+def test_add_chunked_feature_blocks_aligns_rows_to_coords(tmp_path: Path) -> None:
+    sample = Sample(name="demo", path=tmp_path / "demo")
+    sample.add_coords(coord_df(), name="spots")
+    # Rows in reverse coord order plus an id with no coordinate, which is dropped.
+    index = pd.Index(["b", "a", "z"], dtype=object)
+    X = csc_matrix(np.array([[1.0, 0.0], [2.0, 5.0], [9.0, 9.0]]))
+
+    sample.add_chunked_feature_blocks(
+        lambda: iter_csc_column_blocks(X, block_size=1),
+        index=index,
+        names=["g1", "g2"],
+        name="genes",
+        coordName="spots",
+    )
+    assert not (sample.path / "genes.bin").exists()
+    sample.write()
+
+    header = ChunkedCSVHeader.parse_file(sample.path / "genes.json")
+    assert header.names == ["g1", "g2"] and header.length == 2 and header.sparseMode == "array"
+    data = (sample.path / "genes.bin").read_bytes()
+    g1 = gzip.decompress(data[header.ptr[0] : header.ptr[1]]).decode().split()
+    g2 = gzip.decompress(data[header.ptr[1] : header.ptr[2]]).decode().split()
+    assert g1 == ["index,value", "0,2.0", "1,1.0"]
+    assert g2 == ["index,value", "0,5.0"]
+    assert sample.featParams and sample.featParams[-1].name == "genes"
+
+
 def test_write_executes_queued_operations(tmp_path: Path) -> None:
     sample = Sample(name="demo", path=tmp_path / "demo")
     called: List[str] = []
@@ -165,6 +194,40 @@ def test_write_executes_queued_operations(tmp_path: Path) -> None:
     assert (sample.path / "sample.json").exists()
 
 
+def test_write_with_workers_writes_coords_first(tmp_path: Path) -> None:
+    sample = Sample(name="demo", path=tmp_path / "demo")
+    for name in ["g1", "g2", "g3"]:
+        sample.queue_.append(Queued(f"features {name}", lambda: None, "feature"))
+    sample.add_coords(coord_df(), name="spots")  # queued last, but the features are joined against it
+    for name in ["g1", "g2", "g3"]:
+        sample.add_chunked_feature(feature_df(), name=name, coordName="spots")
+
+    assert [t.kind for t in sample.queue_] == ["feature"] * 3 + ["coords"] + ["feature"] * 3
+    sample.write(workers=3)
+
+    assert not sample.queue_
+    for name in ["g1", "g2", "g3"]:
+        header = ChunkedCSVHeader.parse_file(sample.path / f"{name}.json")
+        assert header.names == ["gene"] and header.length == 2
+
+
+def test_write_precompress_writes_sidecars_for_text_assets(tmp_path: Path) -> None:
+    sample = Sample(name="demo", path=tmp_path / "demo")
+    sample.add_coords(coord_df(), name="spots")
+    sample.add_chunked_feature(feature_df(), name="genes", coordName="spots")
+    sample.add_csv_feature(feature_df(), name="plain", coordName="spots")
+
+    sample.write(precompress=True)
+
+    assert [p.name for p in sample.text_assets()] == ["sample.json", "spots.csv", "genes.json", "plain.csv"]
+    for asset in sample.text_assets():
+        assert gzip.decompress(asset.with_name(asset.name + ".gz").read_bytes()) == asset.read_bytes()
+    assert not (sample.path / "genes.bin.gz").exists()
+
+    sample.delete_feature("plain")
+    assert not (sample.path / "plain.csv.gz").exists()
+
+
 def test_do_not_execute_previous_pops_queue(tmp_path: Path) -> None:
     sample = Sample(name="demo", path=tmp_path / "demo")
     sample.queue_.append(("first", lambda: None))
@@ -0,0 +1,547 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import io
+import json
+import os
+import socket
+import urllib.request
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip("anyio")
+
+from loopy.sample import Sample
+from loopy.server import static
+from loopy.server.cache import RangeCache
+from loopy.server.metrics import MetricsMiddleware, ServerMetrics, asset_type
+from loopy.server.query import FeatureQuery
+from loopy.server.registry import SampleRegistry
+from loopy.server.static import RangeFiles, accepted_encodings, parse_range
+from loopy.server.tiles import TileRenderer
+from loopy.utils.archive import pack_sample, read_index
+from loopy.utils.utils import write_sidecars
+
+
+def _request(
+    app: Any, path: str, *, method: str = "GET", **headers: str
+) -> tuple[int, dict[str, str], bytes]:
+    """Run one HTTP request through an ASGI app; return status, headers and body."""
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query.encode(),
+        "headers": [(k.replace("_", "-").lower().encode(), v.encode()) for k, v in headers.items()],
+    }
+    messages: list[dict[str, Any]] = []
+
+    async def receive() -> dict[str, Any]:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: dict[str, Any]) -> None:
+        messages.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    start = messages[0]
+    body = b"".join(m.get("body", b"") for m in messages[1:])
+    return start["status"], {k.decode(): v.decode() for k, v in start["headers"]}, body
+
+
+@pytest.fixture
+def files(tmp_path: Path) -> RangeFiles:
+    (tmp_path / "s").mkdir()
+    (tmp_path / "s" / "genes.bin").write_bytes(bytes(range(256)) * 4)
+    (tmp_path / "s" / "sample.json").write_text('{"name": "s"}')
+    return RangeFiles(tmp_path)
+
+
+def test_parse_range() -> None:
+    assert parse_range("bytes=0-9", 100) == [(0, 9)]
+    assert parse_range("bytes=-5", 100) == [(95, 99)]
+    assert parse_range("bytes=90-200", 100) == [(90, 99)]
+    assert parse_range("bytes=0-1,1-3,10-12", 100) == [(0, 3), (10, 12)]
+    assert parse_range("bytes=100-", 100) == []
+    assert parse_range("bytes=3-1", 100) is None
+    assert parse_range("items=0-1", 100) is None
+
+
+def test_full_and_single_range(files: RangeFiles) -> None:
+    status, headers, body = _request(files, "/s/genes.bin")
+    assert status == 200 and len(body) == 1024
+    assert headers["accept-ranges"] == "bytes" and headers["cache-control"] == "no-cache"
+
+    status, headers, body = _request(files, "/s/genes.bin", range="bytes=10-19")
+    assert status == 206
+    assert headers["content-range"] == "bytes 10-19/1024"
+    assert body == bytes(range(10, 20))
+
+
+def test_multi_range_is_multipart(files: RangeFiles) -> None:
+    status, headers, body = _request(files, "/s/genes.bin", range="bytes=0-1,-2")
+    boundary = headers["content-type"].split("boundary=")[1]
+
+    assert status == 206
+    assert int(headers["content-length"]) == len(body)
+    parts = body.split(f"--{boundary}".encode())
+    assert b"Content-Range: bytes 0-1/1024\r\n\r\n\x00\x01\r\n" in parts[1]
+    assert b"Content-Range: bytes 1022-1023/1024\r\n\r\n\xfe\xff\r\n" in parts[2]
+    assert parts[3] == b"--\r\n"
+
+
+def test_conditional_requests(files: RangeFiles) -> None:
+    _, headers, _ = _request(files, "/s/genes.bin")
+    etag, modified = headers["etag"], headers["last-modified"]
+
+    assert _request(files, "/s/genes.bin", if_none_match=etag)[0] == 304
+    assert _request(files, "/s/genes.bin", if_modified_since=modified)[0] == 304
+    assert _request(files, "/s/genes.bin", if_none_match='"other"')[0] == 200
+    # A stale If-Range validator means the client gets the whole (changed) file.
+    assert _request(files, "/s/genes.bin", range="bytes=0-3", if_range='"other"')[0] == 200
+    assert _request(files, "/s/genes.bin", range="bytes=0-3", if_range=etag)[0] == 206
+
+
+def test_errors(files: RangeFiles) -> None:
+    status, headers, _ = _request(files, "/s/genes.bin", range="bytes=5000-")
+    assert status == 416 and headers["content-range"] == "bytes */1024"
+    assert _request(files, "/s/missing.bin")[0] == 404
+    assert _request(files, "/s/../../etc/passwd")[0] == 404
+    assert _request(files, "/s/genes.bin", method="POST")[0] == 405
+    status, headers, body = _request(files, "/s/genes.bin", method="HEAD", range="bytes=0-9")
+    assert status == 206 and headers["content-length"] == "10" and body == b""
+
+
+def test_only_immutable_directories_are_cached_forever(tmp_path: Path) -> None:
+    for rel in ["_app/immutable/chunks/app.3f2a9c1d.js", "s/genes-deadbeef12.bin", "s/cafe0123abcd.json"]:
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_bytes(b"{}")
+    files = RangeFiles(tmp_path)
+
+    assert "immutable" in _request(files, "/_app/immutable/chunks/app.3f2a9c1d.js")[1]["cache-control"]
+    # Hex-looking names outside immutable/ are ordinary sample assets, rewritten in place.
+    assert _request(files, "/s/genes-deadbeef12.bin")[1]["cache-control"] == "no-cache"
+    assert _request(files, "/s/cafe0123abcd.json")[1]["cache-control"] == "no-cache"
+
+
+def test_ranges_without_os_pread(files: RangeFiles, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(static, "_os_pread", None)  # as on Windows: seek + read on a per-request fd
+    monkeypatch.setattr(static, "CHUNK_SIZE", 7)
+
+    assert _request(files, "/s/genes.bin", range="bytes=10-29")[2] == bytes(range(10, 30))
+    status, _, body = _request(files, "/s/genes.bin", range="bytes=0-1,-2")
+    assert status == 206 and b"\x00\x01\r\n" in body and b"\xfe\xff\r\n" in body
+    assert static._read_span(files.root / "s" / "genes.bin", (254, 257)) == bytes([254, 255, 0, 1])
+
+
+def test_range_cache_evicts_least_recently_used() -> None:
+    cache = RangeCache(10, max_item_bytes=6)
+    cache.put(("a", "e", 0, 3), b"aaaa")
+    cache.put(("b", "e", 0, 3), b"bbbb")
+    assert cache.get(("a", "e", 0, 3)) == b"aaaa"  # a is now the most recent
+    cache.put(("c", "e", 0, 3), b"cccc")
+    cache.put(("d", "e", 0, 6), b"ddddddd")  # over max_item_bytes: not cached
+
+    assert cache.get(("b", "e", 0, 3)) is None
+    assert cache.get(("d", "e", 0, 6)) is None
+    assert cache.stats.entries == 2 and cache.stats.bytes == 8 and cache.stats.evictions == 1
+    assert cache.stats.hits == 1 and cache.stats.misses == 2
+
+
+def test_cached_ranges_follow_file_changes(tmp_path: Path) -> None:
+    path = tmp_path / "genes.bin"
+    path.write_bytes(b"0123456789")
+    files = RangeFiles(tmp_path, cache=RangeCache(1024))
+
+    assert _request(files, "/genes.bin", range="bytes=0-3")[2] == b"0123"
+    assert _request(files, "/genes.bin", range="bytes=0-3,6-7")[0] == 206
+    assert _request(files, "/genes.bin", range="bytes=0-3")[2] == b"0123"
+    assert files.cache is not None and files.cache.stats.hits == 2
+
+    path.write_bytes(b"abcdefghijk")  # new size, so a new ETag
+    assert _request(files, "/genes.bin", range="bytes=0-3")[2] == b"abcd"
+
+
+def test_accepted_encodings() -> None:
+    assert accepted_encodings("gzip, deflate, br;q=0.5") == {"gzip", "deflate", "br"}
+    assert accepted_encodings("br;q=0, gzip;q=1.0") == {"gzip"}
+    assert accepted_encodings("") == set()
+
+
+def test_negotiates_fresh_sidecars(files: RangeFiles) -> None:
+    path = files.root / "s" / "sample.json"
+    write_sidecars(path)
+
+    status, headers, body = _request(files, "/s/sample.json", accept_encoding="gzip")
+    assert status == 200 and headers["content-encoding"] == "gzip"
+    assert headers["vary"] == "Accept-Encoding" and headers["content-type"].startswith("application/json")
+    assert gzip.decompress(body) == path.read_bytes()
+
+    status, headers, body = _request(files, "/s/sample.json")
+    assert "content-encoding" not in headers and body == path.read_bytes()
+    _, headers, _ = _request(files, "/s/sample.json", accept_encoding="gzip", range="bytes=0-1")
+    assert "content-encoding" not in headers
+
+    # A sidecar older than its file (rewritten without precompress) is ignored.
+    os.utime(path, (path.stat().st_mtime + 10,) * 2)
+    assert "content-encoding" not in _request(files, "/s/sample.json", accept_encoding="gzip")[1]
+
+
+def test_serves_packed_samples(files: RangeFiles) -> None:
+    folder = files.root / "s"
+    write_sidecars(folder / "sample.json")
+    archive = pack_sample(folder)
+    index = read_index(archive)
+    assert list(index)[0] == "sample.json" and set(index) == {p.name for p in folder.iterdir()}
+    packed = folder.rename(files.root / "unpacked")
+    data = (packed / "genes.bin").read_bytes()
+
+    status, headers, body = _request(files, "/s/genes.bin")
+    assert status == 200 and body == data and headers["content-type"] == "application/octet-stream"
+    status, headers, body = _request(files, "/s/genes.bin", range="bytes=10-19")
+    assert status == 206 and body == data[10:20] and headers["content-range"] == "bytes 10-19/1024"
+    status, headers, body = _request(files, "/s/genes.bin", range="bytes=0-1, 100-101")
+    assert status == 206 and b"\x00\x01" in body and b"\x64\x65" in body
+    assert _request(files, "/s/genes.bin", if_none_match=headers["etag"])[0] == 304
+    assert headers["etag"] != _request(files, "/s/sample.json")[1]["etag"]
+
+    status, headers, body = _request(files, "/s/sample.json", accept_encoding="gzip")
+    assert headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body) == (packed / "sample.json").read_bytes()
+    assert _request(files, "/s/missing.bin")[0] == 404
+
+    cached = RangeFiles(files.root, cache=RangeCache(2**20))
+    assert _request(cached, "/s/genes.bin", range="bytes=5-9")[2] == data[5:10]
+    assert _request(cached, "/s/genes.bin", range="bytes=5-9")[2] == data[5:10]
+
+    registry = SampleRegistry(files.root)
+    assert registry.names == ["s", "unpacked"]
+    entry = json.loads(registry.index()[0])["samples"][0]
+    assert entry["bytes"] == archive.stat().st_size and entry["files"] == len(index)
+
+
+def test_sample_registry_tracks_new_and_changed_samples(tmp_path: Path) -> None:
+    (tmp_path / "a").mkdir()
+    (tmp_path / "a" / "sample.json").write_text("{}")
+    (tmp_path / "not-a-sample").mkdir()
+    registry = SampleRegistry(tmp_path)
+    _, etag = registry.index()
+
+    assert registry.names == ["a"]
+    assert not registry.refresh()
+
+    (tmp_path / "b").mkdir()
+    (tmp_path / "b" / "genes.bin").write_bytes(b"0" * 100)
+    (tmp_path / "b" / "sample.json").write_text("{}")
+    assert registry.refresh()
+    body, new_etag = registry.index()
+    assert new_etag != etag
+    assert json.loads(body)["samples"][1] == {
+        "name": "b",
+        "modified": (tmp_path / "b" / "sample.json").stat().st_mtime,
+        "bytes": 102,
+        "files": 2,
+    }
+
+    (tmp_path / "a" / "sample.json").unlink()
+    assert registry.refresh() and registry.names == ["b"]
+
+
+def test_sample_registry_skips_rejected_archives_until_they_change(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    import loopy.server.registry as registry_module
+
+    (tmp_path / "junk.zip").write_bytes(b"not a zip")
+    scanned: list[str] = []
+    scan = registry_module._scan_sample
+    monkeypatch.setattr(
+        registry_module, "_scan_sample", lambda path, modified: scanned.append(path.name) or scan(path, modified)
+    )
+    registry = SampleRegistry(tmp_path)
+    assert registry.names == [] and scanned == ["junk.zip"]
+    assert not registry.refresh() and scanned == ["junk.zip"]  # remembered, not re-read
+
+    (tmp_path / "junk").mkdir()
+    (tmp_path / "junk" / "sample.json").write_text("{}")
+    pack_sample(tmp_path / "junk", tmp_path / "junk.zip")
+    for p in (tmp_path / "junk").iterdir():
+        p.unlink()
+    (tmp_path / "junk").rmdir()
+    assert registry.refresh() and registry.names == ["junk"]
+    assert scanned == ["junk.zip", "junk.zip"]
+
+
+def test_metrics_middleware_records_requests(tmp_path: Path) -> None:
+    (tmp_path / "genes.bin").write_bytes(b"0" * 5000)
+    cache = RangeCache(1 << 20)
+    metrics = ServerMetrics(cache)
+    app = MetricsMiddleware(RangeFiles(tmp_path, cache=cache), metrics)
+
+    for _ in range(2):
+        _request(app, "/genes.bin", range="bytes=0-1999")
+    _request(app, "/missing.json")
+    text = metrics.render()
+
+    assert asset_type("/s/genes.bin") == "chunks" and asset_type("/_loopy/samples") == "api"
+    assert 'loopy_requests_total{asset="chunks",status="206"} 2' in text
+    assert 'loopy_requests_total{asset="json",status="404"} 1' in text
+    assert 'loopy_response_bytes_total{asset="chunks"} 4000' in text
+    assert 'loopy_range_response_bytes_bucket{asset="chunks",le="1024"} 0' in text
+    assert 'loopy_range_response_bytes_bucket{asset="chunks",le="4096"} 2' in text
+    assert 'loopy_request_duration_seconds_count{asset="chunks"} 2' in text
+    assert 'quantile="0.99"' in text
+    assert "loopy_cache_hit_ratio 0.5" in text
+
+
+@pytest.mark.parametrize("sparse", [True, False])
+def test_feature_query_matches_the_matrix(tmp_path: Path, sparse: bool) -> None:
+    rng = np.random.default_rng(0)
+    coords = pd.DataFrame(
+        {"x": rng.uniform(0, 100, 500), "y": rng.uniform(0, 100, 500)}, index=[f"c{i}" for i in range(500)]
+    )
+    X = pd.DataFrame(rng.poisson(0.5, (500, 20)).astype(float), index=coords.index)
+    X.columns = [f"g{i}" for i in range(20)]
+    sample = Sample(name="s", path=tmp_path / "s").add_coords(coords, name="cells")
+    sample.add_chunked_feature(X, name="genes", coordName="cells", sparse=sparse).write()
+    query = FeatureQuery(tmp_path)
+    inside = (coords.x <= 40) & (coords.y >= 20)
+
+    rows, values = query.values("s", "genes", "g3", bbox=(0, 20, 40, 100))
+    assert (rows == np.flatnonzero(inside)).all()
+    assert np.allclose(values, X.g3[inside])
+    rows, values = query.values("s", "genes", "g3", ids=["c7", "c2", "unknown"])
+    assert rows.tolist() == [2, 7] and np.allclose(values, X.g3[["c2", "c7"]])
+
+    expected = X[inside].mean().sort_values(ascending=False, kind="stable")[:5]
+    top = query.top("s", "genes", n=5, bbox=(0, 20, 40, 100))
+    assert [k for k, _ in top] == expected.index.tolist()
+    assert np.allclose([v for _, v in top], expected)
+    assert query.cache.stats.hits > 0  # g3 was decoded once
+
+    with pytest.raises(KeyError):
+        query.values("s", "genes", "missing")
+
+
+def test_feature_query_routes_are_opt_in(tmp_path: Path) -> None:
+    pytest.importorskip("fastapi")
+    from loopy.server import _build_app, _shutdown
+
+    coords = pd.DataFrame({"x": [0.0, 1.0, 5.0], "y": [0.0, 1.0, 5.0]}, index=["a", "b", "c"])
+    X = pd.DataFrame({"g1": [1.0, 3.0, 0.0], "g2": [2.0, 0.0, 9.0]}, index=coords.index)
+    sample = Sample(name="s", path=tmp_path / "s").add_coords(coords, name="cells")
+    sample.add_chunked_feature(X, name="genes", coordName="cells").write()
+    url = "/_loopy/query/s/genes/top"
+
+    app, _, _ = _build_app(tmp_path, None)
+    try:
+        assert _request(app, url)[0] == 404
+    finally:
+        _shutdown(app)
+    app, _, _ = _build_app(tmp_path, None, routes=["query"])
+    try:
+        status, _, body = _request(app, f"{url}?n=1&bbox=0,0,2,2")
+    finally:
+        _shutdown(app)
+    assert status == 200 and json.loads(body) == {"cells": 2, "top": [{"name": "g1", "mean": 2.0}]}
+    with pytest.raises(ValueError, match="Unknown routes"):
+        _build_app(tmp_path, None, routes=["nope"])
+
+
+def test_tile_renderer_composites_channels(tmp_path: Path) -> None:
+    tifffile = pytest.importorskip("tifffile")
+    Image = pytest.importorskip("PIL.Image")
+    img = np.zeros((4, 300, 600), dtype=np.uint16)
+    img[0, :100] = 1000  # top band, in the first COG
+    img[3, 200:] = 4000  # bottom band, in the second COG
+    tifffile.imwrite(tmp_path / "in.tif", img)
+    Sample(name="s", path=tmp_path / "s").add_image(tmp_path / "in.tif", channels=list("abcd")).write()
+    renderer = TileRenderer(tmp_path)
+
+    assert renderer.image("s").max_zoom == 2
+    data, etag = renderer.render("s", 0, 0, 0, channels=["a:blue:1000", "d:red"], fmt="png")
+    tile = np.asarray(Image.open(io.BytesIO(data)))
+    # Zoom 0 shows the 600 px image in 150 px; the rest of the tile is empty.
+    assert tile.shape == (256, 256, 3)
+    assert tile[10, 10].tolist() == [0, 0, 255] and tile[70, 10].tolist() == [255, 0, 0]
+    assert not tile[:, 160:].any()
+
+    assert renderer.render("s", 0, 0, 0, channels=["a:blue:1000", "d:red"], fmt="png")[1] == etag
+    assert renderer.etag("s", channels=["a:blue:1000", "d:red"], fmt="png") == etag
+    assert renderer.cache.stats.hits == 1
+    with pytest.raises(KeyError):
+        renderer.render("s", 2, 3, 0)
+    with pytest.raises(ValueError):
+        renderer.render("s", 0, 0, 0, channels=["a:pink"])
+
+
+def test_query_and_tiles_read_packed_samples(tmp_path: Path) -> None:
+    pytest.importorskip("rasterio")
+    tifffile = pytest.importorskip("tifffile")
+    rng = np.random.default_rng(1)
+    ids = [f"c{i}" for i in range(60)]
+    coords = pd.DataFrame({"x": rng.uniform(0, 50, 60), "y": rng.uniform(0, 50, 60)}, index=ids)
+    X = pd.DataFrame(rng.poisson(1.0, (60, 4)).astype(float), index=ids, columns=["a", "b", "c", "d"])
+    tifffile.imwrite(tmp_path / "in.tif", rng.integers(0, 1000, (2, 300, 300), dtype=np.uint16))
+    sample = Sample(name="s", path=tmp_path / "s").add_coords(coords, name="cells")
+    sample.add_chunked_feature(X, name="genes", coordName="cells")
+    sample.add_image(tmp_path / "in.tif", channels=["p", "q"]).write()
+    pack_sample(tmp_path / "s")
+    (tmp_path / "s").rename(tmp_path / "loose")  # the same files, unpacked, to compare with
+
+    query = FeatureQuery(tmp_path)
+    for name in ["s", "loose"]:
+        rows, values = query.values(name, "genes", "c", bbox=(0, 0, 25, 50))
+        assert np.array_equal(rows, np.flatnonzero((coords.x <= 25).to_numpy()))
+        assert np.array_equal(values, X.c.to_numpy()[rows])
+        expected = X.loc[["c1", "c5"]].mean().sort_values(ascending=False, kind="stable")[:2]
+        assert query.top(name, "genes", n=2, ids=["c1", "c5"]) == list(expected.items())
+    assert query.resolve("s", "genes").bin.member == "genes.bin"
+
+    renderer = TileRenderer(tmp_path)
+    assert renderer.image("s").max_zoom == renderer.image("loose").max_zoom == 1
+    assert renderer.render("s", 1, 1, 0, channels=["q:red"], fmt="png")[0] == (
+        renderer.render("loose", 1, 1, 0, channels=["q:red"], fmt="png")[0]
+    )
+    with pytest.raises(KeyError, match="Unknown sample"):
+        query.resolve("nope", "genes")
+
+
+def test_tile_routes_are_opt_in_and_revalidate_without_rendering(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    pytest.importorskip("fastapi")
+    pytest.importorskip("rasterio")
+    tifffile = pytest.importorskip("tifffile")
+    from loopy.server import _build_app, _shutdown
+
+    tifffile.imwrite(tmp_path / "in.tif", np.full((2, 64, 64), 100, dtype=np.uint16))
+    Sample(name="s", path=tmp_path / "s").add_image(tmp_path / "in.tif", channels=["a", "b"]).write()
+    url = "/tiles/s/0/0/0.png?c=a:red"
+
+    app, _, _ = _build_app(tmp_path, None)
+    try:
+        assert _request(app, url)[0] == 404
+    finally:
+        _shutdown(app)
+    app, _, _ = _build_app(tmp_path, None, routes=["tiles"])
+    try:
+        status, headers, body = _request(app, url)
+        assert status == 200 and headers["content-type"] == "image/png" and body
+
+        def render(*args: Any, **kwargs: Any) -> Any:
+            raise AssertionError("rendered a tile the client already has")
+
+        monkeypatch.setattr(app.state.tile_renderer, "render", render)
+        status, headers, body = _request(app, url, if_none_match=headers["etag"])
+        assert status == 304 and body == b""
+        assert _request(app, "/tiles/s/0/0/0.png?c=a:pink")[0] == 400
+    finally:
+        _shutdown(app)
+
+
+def test_background_server_is_ready_on_return_and_skips_busy_ports(tmp_path: Path) -> None:
+    pytest.importorskip("uvicorn")
+    from loopy.server import serve_directory
+
+    (tmp_path / "s").mkdir()
+    (tmp_path / "s" / "sample.json").write_text("{}")
+    with socket.socket() as busy:
+        busy.bind(("127.0.0.1", 0))
+        busy.listen()
+        port = busy.getsockname()[1]
+        handle = serve_directory(tmp_path, port=port, open_browser=False, block=False)
+        assert handle is not None
+        try:
+            assert handle.port > port and handle.url.endswith(f":{handle.port}/")
+            with urllib.request.urlopen(f"{handle.url}s/sample.json", timeout=5) as r:  # no retries needed
+                assert r.read() == b"{}"
+        finally:
+            handle.stop()
+    assert not handle.is_alive()
+
+
+def test_hypercorn_server_serves_ranges_and_stops(tmp_path: Path) -> None:
+    pytest.importorskip("hypercorn")
+    from loopy.server import serve_directory
+    from loopy.server.http2 import _start_hypercorn_server
+
+    (tmp_path / "s").mkdir()
+    (tmp_path / "s" / "sample.json").write_text("{}")
+    (tmp_path / "s" / "genes.bin").write_bytes(bytes(range(256)))
+    handle = _start_hypercorn_server(tmp_path, "127.0.0.1", 0)
+    try:
+        assert handle.backend == "hypercorn" and handle.port > 0 and handle.is_alive()
+        request = urllib.request.Request(f"{handle.url}s/genes.bin", headers={"Range": "bytes=10-19"})
+        with urllib.request.urlopen(request, timeout=5) as r:
+            assert r.status == 206 and r.headers["Content-Range"] == "bytes 10-19/256"
+            assert r.read() == bytes(range(10, 20))
+    finally:
+        handle.stop()
+    assert not handle.is_alive()  # stop() waits for the server thread
+
+    with pytest.raises(ValueError, match="backend='uvicorn'"):
+        serve_directory(tmp_path, port=0, block=False, backend="hypercorn", workers=2)
+
+
+def test_workers_rebuild_the_app_from_the_handed_over_config(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    uvicorn = pytest.importorskip("uvicorn")
+    import loopy.server as server
+
+    (tmp_path / "s").mkdir()
+    (tmp_path / "s" / "sample.json").write_text("{}")
+    handed: dict[str, Any] = {}
+
+    def run(app: str, **kwargs: Any) -> None:  # stands in for the forking uvicorn.run
+        handed.update(kwargs, app=app, config=os.environ[server.WORKER_CONFIG_ENV])
+        with socket.socket(fileno=os.dup(kwargs["fd"])) as sock:
+            handed["socket"] = sock.getsockname()
+
+    monkeypatch.delenv(server.WORKER_CONFIG_ENV, raising=False)
+    monkeypatch.setattr(uvicorn, "run", run)
+    server.serve_directory_fastapi(
+        tmp_path, port=0, open_browser=False, cache_mb=1, routes=["query"], workers=2
+    )
+
+    assert handed["app"] == "loopy.server:_worker_app" and handed["factory"] and handed["workers"] == 2
+    assert handed["socket"][0] == "127.0.0.1" and handed["socket"][1] > 0  # the socket bound up front
+    app = server._worker_app()  # what each worker process runs, reading the same environment
+    try:
+        assert app.state.range_cache is not None and app.state.range_cache.max_bytes == 2**20
+        assert hasattr(app.state, "feature_query") and not hasattr(app.state, "tile_renderer")
+        assert _request(app, "/s/sample.json")[2] == b"{}"
+    finally:
+        server._shutdown(app)
+
+    with pytest.raises(ValueError, match="block=True"):
+        server.serve_directory(tmp_path, port=0, block=False, workers=2)
+
+
+@pytest.mark.parametrize("windows", [False, True])
+def test_bind_socket_never_shares_a_port_on_windows(monkeypatch: pytest.MonkeyPatch, windows: bool) -> None:
+    from loopy.server import _bind_socket
+
+    options: list[int] = []
+
+    class Socket(socket.socket):
+        def setsockopt(self, level: int, option: int, value: Any, *args: Any) -> None:
+            options.append(option)
+            super().setsockopt(level, socket.SO_REUSEADDR, value, *args)  # valid here for either option
+
+    exclusive = -5  # a stand-in for Windows' SO_EXCLUSIVEADDRUSE (which is negative there)
+    if windows:
+        monkeypatch.setattr(socket, "SO_EXCLUSIVEADDRUSE", exclusive, raising=False)
+    else:
+        monkeypatch.delattr(socket, "SO_EXCLUSIVEADDRUSE", raising=False)
+    monkeypatch.setattr(socket, "socket", Socket)
+
+    with _bind_socket("127.0.0.1", 0):
+        pass
+    assert options == ([exclusive] if windows else [socket.SO_REUSEADDR])
@@ -1,12 +1,12 @@
 from __future__ import annotations
 
+import gzip
 import json
 from pathlib import Path
 from typing import Any, Dict, List
 
 import numpy as np
 import pandas as pd
-import pytest
 
 from loopy.drivers import spaceranger
 
@@ -16,33 +16,6 @@ class DummyAnnData:
         self.obs = pd.DataFrame(index=pd.Index(["spot1", "spot2"], dtype=object))
         self.obs_names = self.obs.index
         self.obsm: Dict[str, Any] = {"spatial": np.array([[0, 1], [2, 3]], dtype=float)}
-        self.X = type("Dummy", (), {"data": np.array([1.0, 3.0])})()
-        self.var_names = pd.Index(["gene1", "gene2"])
-        self._var_names_unique = False
-
-    def var_names_make_unique(self) -> None:
-        self._var_names_unique = True
-
-    def to_df(self) -> pd.DataFrame:
-        return pd.DataFrame({"gene1": [1.0, 3.0], "gene2": [2.0, 4.0]}, index=self.obs.index)
-
-
-def test_better_visium_joins_features(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
-    base = tmp_path / "sample"
-    (base / "outs/analysis/clustering/kmeans_2_clusters").mkdir(parents=True)
-    clusters = pd.DataFrame({"column": ["a", "b"]}, index=["spot1", "spot2"])
-    clusters.to_csv(base / spaceranger.analyses["kmeans2"], index=True)
-
-    def fake_read_visium(path: Path) -> DummyAnnData:
-        assert path == base / "outs"
-        return DummyAnnData()
-
-    monkeypatch.setattr(spaceranger, "read_visium", fake_read_visium)
-
-    vis = spaceranger.better_visium(base, {"kmeans2": spaceranger.analyses["kmeans2"]})
-
-    assert "kmeans2" in vis.obs.columns
-    assert vis.obs.loc["spot1", "kmeans2"] == "a"
 
 
 def test_gen_coords_exports_dataframe(tmp_path: Path) -> None:
@@ -56,51 +29,83 @@ def test_gen_coords_exports_dataframe(tmp_path: Path) -> None:
     assert list(df.index) == ["spot1", "spot2"]
 
 
-def test_run_spaceranger_creates_outputs(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+def write_spaceranger_run(outs: Path) -> None:
+    """Minimal Space Ranger `outs/`: 10x h5 (features x spots), positions, scalefactors, clusters."""
+    import h5py
+
+    counts = np.array([[0, 3], [1, 0], [7, 7], [2, 0]], dtype=np.int32)  # genes x spots
+    (outs / "spatial").mkdir(parents=True)
+    with h5py.File(outs / "filtered_feature_bc_matrix.h5", "w") as f:
+        g = f.create_group("matrix")
+        nz = counts.T != 0  # CSC of genes x spots == CSR of spots x genes
+        g["data"] = counts.T[nz]
+        g["indices"] = np.nonzero(nz)[1]
+        g["indptr"] = np.concatenate([[0], np.cumsum(nz.sum(axis=1))])
+        g["shape"] = np.array(counts.shape)
+        g["barcodes"] = np.array([b"spot1", b"spot2"])
+        feats = g.create_group("features")
+        feats["name"] = np.array([b"gene1", b"gene2", b"gene1", b"ab"])
+        feats["feature_type"] = np.array([b"Gene Expression"] * 3 + [b"Antibody Capture"])
+
+    pd.DataFrame(
+        {
+            "barcode": ["spot0", "spot2", "spot1"],
+            "in_tissue": [0, 1, 1],
+            "array_row": [0, 0, 1],
+            "array_col": [0, 1, 0],
+            "pxl_row_in_fullres": [5, 30, 10],
+            "pxl_col_in_fullres": [6, 40, 20],
+        }
+    ).to_csv(outs / "spatial" / "tissue_positions.csv", index=False)
+    (outs / "spatial" / "scalefactors_json.json").write_text(json.dumps({"spot_diameter_fullres": 2}))
+
+    clusters = outs / "analysis" / "clustering" / "graphclust"
+    clusters.mkdir(parents=True)
+    clustering = pd.DataFrame({"Barcode": ["spot1", "spot2"], "Cluster": [1, 2]})
+    clustering.to_csv(clusters / "clusters.csv", index=False)
+
+    pd.DataFrame({"reads": [123.456], "spots": [987]}).to_csv(outs / "metrics_summary.csv", index=False)
+    (outs / "web_summary.html").write_text("<html>")
+
+
+def read_chunk(sample_dir: Path, name: str, i: int) -> List[str]:
+    header = json.loads((sample_dir / f"{name}.json").read_text())
+    data = (sample_dir / f"{name}.bin").read_bytes()
+    return gzip.decompress(data[header["ptr"][i] : header["ptr"][i + 1]]).decode().split()
+
+
+def test_run_spaceranger_creates_outputs(tmp_path: Path) -> None:
     root = tmp_path / "input"
     name = "demo"
     out_dir = tmp_path / "loopy"
+    write_spaceranger_run(root / name / "outs")
 
-    metrics = pd.DataFrame({"reads": [123.456], "spots": [987]})
-    spatial_dir = root / name / "outs" / "spatial"
-    spatial_dir.mkdir(parents=True)
-    metrics.to_csv(root / name / "outs" / "metrics_summary.csv", index=False)
-    (root / name / "outs" / "web_summary.html").write_text("<html>")
-    (spatial_dir / "scalefactors_json.json").write_text(json.dumps({"spot_diameter_fullres": 2}))
-
-    monkeypatch.setattr(spaceranger, "better_visium", lambda path, features: DummyAnnData())
-
-    recorded_calls: List[str] = []
-
-    class DummySample:
-        def __init__(self, **kwargs: Any) -> None:
-            self.kwargs = kwargs
-            self.path = kwargs["path"]
+    sample = spaceranger.run_spaceranger(name, root, out_dir, tif=None)
 
-        def add_image(self, *args: Any, **kwargs: Any) -> "DummySample":
-            recorded_calls.append("add_image")
-            return self
+    sample_dir = out_dir / name
+    assert (sample_dir / "metadata.md").exists()
+    assert (sample_dir / "web_summary.html").exists()
+    assert json.loads((sample_dir / "sample.json").read_text())["name"] == name
+    assert sample.featParams and [f.name for f in sample.featParams] == ["genes", "clusters"]
 
-        def add_coords(self, df: pd.DataFrame, **kwargs: Any) -> "DummySample":
-            recorded_calls.append("add_coords")
-            assert list(df.columns) == ["x", "y"]
-            return self
+    coords = pd.read_csv(sample_dir / "spots.csv", index_col=0)
+    assert list(coords.index) == ["spot1", "spot2"]
+    assert coords.loc["spot2"].tolist() == [40, 30]
 
-        def add_chunked_feature(self, df: pd.DataFrame, **kwargs: Any) -> "DummySample":
-            recorded_calls.append("add_chunked_feature")
-            return self
+    header = json.loads((sample_dir / "genes.json").read_text())
+    # Antibody capture dropped, duplicate gene names made unique.
+    assert header["names"] == ["gene1", "gene2", "gene1-1"]
+    assert header["length"] == 2
+    # log2(x + 1) of the nonzeros only; spot1 has gene2 = 1 -> 1.0, spot2 has gene1 = 3 -> 2.0
+    assert read_chunk(sample_dir, "genes", 0) == ["index,value", "1,2.0"]
+    assert read_chunk(sample_dir, "genes", 1) == ["index,value", "0,1.0"]
+    assert read_chunk(sample_dir, "genes", 2) == ["index,value", "0,3.0", "1,3.0"]
 
-        def write(self) -> "DummySample":
-            recorded_calls.append("write")
-            return self
 
-    monkeypatch.setattr(spaceranger, "Sample", DummySample)
+def test_run_spaceranger_without_log_transform(tmp_path: Path) -> None:
+    write_spaceranger_run(tmp_path / "input" / "demo" / "outs")
 
-    sample = spaceranger.run_spaceranger(name, root, out_dir, tif=None)
+    sample = spaceranger.run_spaceranger("demo", tmp_path / "input", tmp_path / "loopy", logTransform=False)
 
-    assert isinstance(sample, DummySample)
-    assert (out_dir / name / "metadata.md").exists()
-    assert (out_dir / name / "web_summary.html").exists()
-    assert recorded_calls[-1] == "write"
-    assert "add_coords" in recorded_calls
-    assert "add_chunked_feature" in recorded_calls
+    assert sample.featParams and sample.featParams[0].unit == "Counts"
+    assert read_chunk(tmp_path / "loopy" / "demo", "genes", 2) == ["index,value", "0,7", "1,7"]
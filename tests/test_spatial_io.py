@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from loopy.spatial_io import detect_format
+from loopy.spatial_io.common import read_table
+
+CELLS = pd.DataFrame(
+    {
+        "cell_id": ["a", "b", "c", "d"],
+        "in_tissue": [1, 0, 1, 1],
+        "x": [0.5, 1.5, 2.5, 3.5],
+        "y": [4.0, 5.0, 6.0, 7.0],
+        "notes": ["w", "x", "y", "z"],
+    }
+)
+
+
+@pytest.mark.parametrize("suffix", [".parquet", ".csv", ".csv.gz"])
+def test_read_table_projects_columns_and_filters_rows(tmp_path: Path, suffix: str) -> None:
+    path = tmp_path / f"cells{suffix}"
+    if suffix == ".parquet":
+        CELLS.to_parquet(path, index=False, row_group_size=2)
+    else:
+        CELLS.to_csv(path, index=False)
+
+    df = read_table(path, ["cell_id", "x", "y", "missing"], equals={"in_tissue": 1})
+
+    assert list(df.columns) == ["cell_id", "x", "y"]  # absent columns are skipped
+    assert df["cell_id"].tolist() == ["a", "c", "d"]
+    assert df["x"].tolist() == [0.5, 2.5, 3.5]
+    assert read_table(path).shape == CELLS.shape
+
+
+def _tree(root: Path, *paths: str) -> Path:
+    """Create `paths` under `root`; a trailing slash makes a directory."""
+    for p in paths:
+        target = root / p
+        if p.endswith("/"):
+            target.mkdir(parents=True, exist_ok=True)
+        else:
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.touch()
+    return root
+
+
+@pytest.mark.parametrize(
+    "paths, expected",
+    [
+        (["experiment.xenium"], "xenium"),
+        (["cell_feature_matrix.h5", "cells.csv.gz"], "xenium"),
+        (["binned_outputs/square_008um/"], "visium_hd"),
+        (["square_016um/", "square_002um/"], "visium_hd"),
+        (["spatial/tissue_positions.parquet", "filtered_feature_bc_matrix.h5"], "visium"),
+        (["spatial/tissue_positions_list.csv"], "visium"),
+        (["slide_exprMat_file.csv", "slide_metadata_file.csv"], "cosmx"),
+        (["outs/spatial/tissue_positions.csv", ".DS_Store"], "visium"),  # a Space Ranger wrapper
+    ],
+)
+def test_detect_format(tmp_path: Path, paths: list[str], expected: str) -> None:
+    assert detect_format(_tree(tmp_path / "run", *paths)) == expected
+
+
+def test_detect_format_rejects_a_lone_bin_folder_and_unknown_layouts(tmp_path: Path) -> None:
+    bins = _tree(
+        tmp_path / "square_016um", "spatial/tissue_positions.parquet", "filtered_feature_bc_matrix.h5"
+    )
+    with pytest.raises(SystemExit, match="single Visium HD bin folder"):
+        detect_format(bins)
+    with pytest.raises(SystemExit, match="could not auto-detect"):
+        detect_format(_tree(tmp_path / "other", "spatial/", "notes.txt"))
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import zipfile
+from argparse import Namespace
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sd = pytest.importorskip("spatialdata")
+
+from loopy.spatial_io import spatialdata as reader
+
+
+def write_store(path: Path) -> None:
+    """A store whose table has sparse X and no obsm['spatial'], annotating polygon shapes."""
+    import anndata as ad
+    import geopandas as gpd
+    from scipy.sparse import csr_matrix
+    from shapely.geometry import Point, Polygon
+    from spatialdata.models import Image2DModel, ShapesModel, TableModel
+
+    squares = [Polygon([(0, 0), (2, 0), (2, 2), (0, 2)]), Polygon([(10, 10), (14, 10), (14, 12), (10, 12)])]
+    cells = ShapesModel.parse(gpd.GeoDataFrame(geometry=squares, index=[7, 3]))
+    other = ShapesModel.parse(gpd.GeoDataFrame({"radius": [1.0]}, geometry=[Point(0, 0)], index=[0]))
+    obs = pd.DataFrame(
+        {"region": pd.Categorical(["cells", "cells"]), "cell_id": [3, 7], "kind": ["a", "b"]},
+        index=["c3", "c7"],
+    )
+    X = csr_matrix(np.array([[0, 2, 0], [1, 0, 5]], dtype=np.float32))
+    var = pd.DataFrame(index=["g1", "NegControl1", "g3"])
+    table = TableModel.parse(
+        ad.AnnData(X, obs=obs, var=var), region="cells", region_key="region", instance_key="cell_id"
+    )
+    image = Image2DModel.parse(np.zeros((1, 4, 4), dtype=np.uint8), dims=("c", "y", "x"))
+    sd.SpatialData(
+        images={"img": image}, shapes={"cells": cells, "other": other}, tables={"table": table}
+    ).write(path)
+
+
+def zip_store(store: Path, dest: Path, wrapper: str = "data.zarr") -> Path:
+    with zipfile.ZipFile(dest, "w") as zf:
+        for p in sorted(store.rglob("*")):
+            if p.is_file():
+                zf.write(p, f"{wrapper}/{p.relative_to(store).as_posix()}")
+    return dest
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    path = tmp_path_factory.mktemp("sdata") / "s.zarr"
+    write_store(path)
+    return path
+
+
+def test_zip_store_root() -> None:
+    assert reader._zip_store_root(["zarr.json", "tables/zarr.json"]) == ""
+    assert (
+        reader._zip_store_root(["out/data.zarr/zarr.json", "out/data.zarr/tables/zarr.json"])
+        == "out/data.zarr/"
+    )
+    assert reader._zip_store_root([".zgroup", "a/.zgroup"]) == ""
+    with pytest.raises(SystemExit):
+        reader._zip_store_root(["readme.txt"])
+
+
+def test_zip_store_extracts_only_fetched_elements(store: Path, tmp_path: Path) -> None:
+    archive = zip_store(store, tmp_path / "s.zarr.zip")
+    with reader._opened_store(archive) as opened:
+        assert reader._read_tables(opened).keys() == {"table"}
+        shapes = reader._read_shapes(opened, "cells")
+        assert reader._read_shapes(opened, "missing") is None
+        extracted = {p.relative_to(opened.root).parts[:2] for p in opened.root.rglob("*") if p.is_file()}
+
+    assert shapes is not None and list(shapes.index) == [7, 3]
+    assert ("images",) not in {e[:1] for e in extracted} and ("shapes", "other") not in extracted
+    assert ("shapes", "cells") in extracted and ("tables", "table") in extracted
+
+
+@pytest.mark.parametrize("zipped", [False, True])
+def test_read_places_table_on_shape_centroids(store: Path, tmp_path: Path, zipped: bool) -> None:
+    path = zip_store(store, tmp_path / "s.zarr.zip") if zipped else store
+    sample = reader.read(Namespace(zarr=str(path), pixel_size=None, spot_size=None))
+
+    assert sample.coords_name == "cells" and sample.mpp == reader.DEFAULT_MPP
+    # Rows follow the table's instance ids (3, 7), not the shapes' order (7, 3).
+    assert list(sample.coords.index) == ["3", "7"]
+    np.testing.assert_allclose(sample.coords[["x", "y"]].to_numpy(), [[12, 11], [1, 1]])
+
+    expression, annotations = sample.features
+    assert list(expression.df.columns) == ["g1", "g3"]  # the control probe is dropped
+    assert all(isinstance(t, pd.SparseDtype) for t in expression.df.dtypes)
+    assert expression.df.sparse.to_dense().to_numpy().tolist() == [[0, 0], [1, 5]]
+    assert annotations.df["kind"].tolist() == ["a", "b"]
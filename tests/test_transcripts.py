@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from loopy.spatial_io import transcripts
+from loopy.spatial_io.common import SpatialSample
+
+# Three squares of a 10 px grid: (0, 0), (1, 0) and (-1, 2); the last row fails Xenium's qv cut.
+POINTS = pd.DataFrame(
+    {
+        "gene": ["A", "B", "A", "A", "B", "NegControlProbe_1", "A", "A"],
+        "x": [1.0, 2.0, 9.9, 15.0, 12.0, 3.0, -0.5, 1.0],
+        "y": [1.0, 5.0, 0.0, 3.0, 9.0, 4.0, 25.0, 1.0],
+        "qv": [30.0, 30.0, 30.0, 30.0, 25.0, 40.0, 20.0, 5.0],
+    }
+)
+EXPECTED = {"0_0": {"A": 2, "B": 1}, "1_0": {"A": 1, "B": 1}, "-1_2": {"A": 1}}
+
+
+def write_table(folder: Path, platform: str) -> Path:
+    """`POINTS` as `platform`'s transcript table, in pixels (CosMx) or in microns at 2 px/um."""
+    layout = transcripts.LAYOUTS[platform]
+    scale = 1.0 if layout.unit == "px" else 0.5
+    df = pd.DataFrame(
+        {layout.gene: POINTS["gene"], layout.x: POINTS["x"] * scale, layout.y: POINTS["y"] * scale}
+    )
+    if platform == "xenium":
+        df["qv"] = POINTS["qv"]
+        path = folder / "transcripts.parquet"
+        df.to_parquet(path, index=False)
+    elif platform == "cosmx":
+        df = df.iloc[:-1]  # no qv column: drop the low-quality row up front
+        path = folder / "Run5_tx_file.csv"
+        df.to_csv(path, index=False)
+    else:
+        df = df.iloc[:-1]
+        path = folder / "detected_transcripts.csv.gz"
+        df.to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("platform", ["xenium", "cosmx", "merfish"])
+def test_bin_transcripts_per_layout(tmp_path: Path, monkeypatch: pytest.MonkeyPatch, platform: str) -> None:
+    monkeypatch.setattr(transcripts, "BATCH_ROWS", 3)  # counts for one square span batches
+    path = write_table(tmp_path, platform)
+    assert transcripts.find_transcripts(tmp_path) == path
+    assert transcripts.detect_layout(path) == transcripts.LAYOUTS[platform]
+
+    px_per_unit = 1.0 if platform == "cosmx" else 2.0
+    coords, df = transcripts.bin_transcripts(path, bin_px=10, px_per_unit=px_per_unit)
+
+    dense = df.sparse.to_dense()
+    got = {sq: {g: n for g, n in row.items() if n} for sq, row in dense.iterrows()}
+    assert {sq: {g: n for g, n in c.items() if not g.startswith("Neg")} for sq, c in got.items()} == EXPECTED
+    assert coords.loc["-1_2"].tolist() == [-5.0, 25.0] and coords.loc["1_0"].tolist() == [15.0, 5.0]
+
+
+def test_bin_transcripts_rejects_grids_beyond_the_packed_key(tmp_path: Path) -> None:
+    path = tmp_path / "detected_transcripts.csv"
+    table = pd.DataFrame({"gene": ["A", "A"], "global_x": [0.0, 5e7], "global_y": [0.0, 0.0]})
+    table.to_csv(path, index=False)
+
+    with pytest.raises(SystemExit, match="coarser bin size"):
+        transcripts.bin_transcripts(path, bin_px=1, px_per_unit=1.0)
+    assert len(transcripts.bin_transcripts(path, bin_px=100, px_per_unit=1.0)[0]) == 2
+
+
+def test_merge_counts() -> None:
+    keys, counts = transcripts._merge_counts(
+        np.array([2, 5, 9]), np.array([1, 1, 1]), np.array([1, 5, 10]), np.array([4, 2, 3])
+    )
+    assert keys.tolist() == [1, 2, 5, 9, 10] and counts.tolist() == [4, 1, 3, 1, 3]
+
+
+def test_add_transcript_grid(tmp_path: Path) -> None:
+    path = write_table(tmp_path, "xenium")
+    cells = pd.DataFrame({"x": [0.0], "y": [0.0]}, index=pd.Index(["c1"]))
+    sample = SpatialSample(coords=cells, mpp=0.5e-6)  # 2 px/um
+
+    transcripts.add_transcript_grid(sample, path, bin_um=5)
+
+    (grid,) = sample.extra_coords
+    (group,) = sample.features
+    assert grid.name == group.coords_name == transcripts.COORDS_NAME and grid.spot_size == pytest.approx(5e-6)
+    assert list(grid.coords.index) == list(group.df.index) and len(grid.coords) == 3
+    assert group.name == "Transcripts"
+    assert list(group.df.columns) == ["A", "B"]  # the control probe is dropped
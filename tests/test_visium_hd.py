@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import gzip
+import json
+from argparse import Namespace
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from loopy.spatial_io import visium_hd
+from loopy.spatial_io.preprocess import _parser, run_one
+
+GENES = ["g1", "g2", "NegControl"]
+
+
+def write_10x_h5(path: Path, counts: np.ndarray, barcodes: list[str], names: list[str] = GENES) -> None:
+    """A 10x CSC HDF5 matrix (features x barcodes) from a dense barcodes x features array."""
+    import h5py
+
+    nz = counts != 0  # CSR of barcodes x features == CSC of features x barcodes
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with h5py.File(path, "w") as f:
+        g = f.create_group("matrix")
+        g["data"] = counts[nz]
+        g["indices"] = np.nonzero(nz)[1]
+        g["indptr"] = np.concatenate([[0], np.cumsum(nz.sum(axis=1))])
+        g["shape"] = np.array([counts.shape[1], counts.shape[0]])
+        g["barcodes"] = np.array([b.encode() for b in barcodes])
+        feats = g.create_group("features")
+        feats["name"] = np.array([n.encode() for n in names])
+        feats["feature_type"] = np.array([b"Gene Expression"] * (len(names) - 1) + [b"Antibody Capture"])
+
+
+def write_bins(folder: Path, name: str, positions: pd.DataFrame, counts: np.ndarray) -> None:
+    bin_dir = folder / "binned_outputs" / name
+    (bin_dir / "spatial").mkdir(parents=True)
+    positions.to_parquet(bin_dir / "spatial" / "tissue_positions.parquet", index=False)
+    (bin_dir / "spatial" / "scalefactors_json.json").write_text(json.dumps({"microns_per_pixel": 0.5}))
+    write_10x_h5(bin_dir / "filtered_feature_bc_matrix.h5", counts, positions["barcode"].tolist())
+
+
+@pytest.fixture
+def run(tmp_path: Path) -> Path:
+    """A Visium HD run with a 4 x 4 grid of 2 µm bins and a 16 µm level whose last bin is off tissue."""
+    folder = tmp_path / "run"
+    rows, cols = np.divmod(np.arange(16), 4)
+    fine = pd.DataFrame(
+        {
+            "barcode": [f"s_002um_{r:05d}_{c:05d}-1" for r, c in zip(rows, cols)],
+            "in_tissue": 1,
+            "array_row": rows,
+            "array_col": cols,
+            "pxl_row_in_fullres": rows * 4.0,
+            "pxl_col_in_fullres": cols * 4.0,
+        }
+    )
+    counts = np.zeros((16, 3), dtype=np.int32)
+    counts[:, 0] = 1  # g1: one count per 2 µm bin
+    counts[rows >= 2, 1] = 2  # g2: the bottom half
+    write_bins(folder, "square_002um", fine, counts)
+
+    coarse = pd.DataFrame(
+        {
+            "barcode": ["s_016um_00000_00000-1", "s_016um_00000_00001-1"],
+            "in_tissue": [1, 0],
+            "array_row": [0, 0],
+            "array_col": [0, 1],
+            "pxl_row_in_fullres": [10.0, 10.0],
+            "pxl_col_in_fullres": [20.0, 52.0],
+        }
+    )
+    write_bins(folder, "square_016um", coarse, np.array([[3, 0, 0], [1, 1, 0]], dtype=np.int32))
+    return folder
+
+
+def test_reads_the_coarsest_bin_in_tissue_only(run: Path) -> None:
+    sample = visium_hd.read(Namespace(folder=run, pixel_size=None, segmented=False, bin_sizes=None))
+
+    assert sample.coords_name == "bins" and sample.spot_size == pytest.approx(16e-6)
+    assert sample.mpp == pytest.approx(0.5e-6)
+    assert list(sample.coords.index) == ["s_016um_00000_00000-1"]
+    assert sample.coords.loc["s_016um_00000_00000-1"].tolist() == [20.0, 10.0]
+
+
+def test_rebin_sums_counts_and_averages_positions() -> None:
+    from scipy.sparse import csc_matrix
+
+    rows, cols = np.divmod(np.arange(16), 4)
+    counts = csc_matrix(np.arange(16, dtype=np.float32).reshape(16, 1))
+    xy = np.column_stack([cols * 4.0, rows * 4.0])
+    binned, brow, bcol, centers = visium_hd.rebin(counts, rows, cols, xy, 2)
+
+    assert list(zip(brow, bcol)) == [(0, 0), (0, 1), (1, 0), (1, 1)]
+    sums = [0 + 1 + 4 + 5, 2 + 3 + 6 + 7, 8 + 9 + 12 + 13, 10 + 11 + 14 + 15]
+    assert binned.toarray().ravel().tolist() == sums
+    np.testing.assert_allclose(centers, [[2, 2], [10, 2], [2, 10], [10, 10]])
+
+
+def test_read_rebinned_levels(run: Path) -> None:
+    sample = visium_hd.read(Namespace(folder=run, pixel_size=None, segmented=False, bin_sizes=[4, 8]))
+
+    assert sample.coords_name == "bins_008um" and len(sample.coords) == 1
+    assert [c.name for c in sample.extra_coords] == ["bins_004um"]
+    coarse, fine = sample.features
+    assert coarse.coords_name is None and fine.coords_name == "bins_004um"
+    assert list(coarse.df.columns) == ["g1", "g2"]  # only Gene Expression features
+    assert coarse.df.sparse.to_dense().iloc[0].tolist() == [16, 16]
+    assert fine.df.sparse.to_dense()["g2"].tolist() == [0, 0, 8, 8]
+
+    with pytest.raises(SystemExit, match="multiples of 2"):
+        visium_hd.read(Namespace(folder=run, pixel_size=None, segmented=False, bin_sizes=[5]))
+
+
+def test_bin_sizes_with_a_renamed_coord_set(run: Path, tmp_path: Path) -> None:
+    args = _parser().parse_args(
+        [
+            "--format", "visium_hd", "--folder", str(run), "--outdir", str(tmp_path / "out"),
+            "--sample-name", "hd", "--bin-sizes", "4", "8", "--coords-name", "spots",
+        ]
+    )  # fmt: skip
+    run_one(args)
+
+    meta = json.loads((tmp_path / "out" / "hd" / "sample.json").read_text())
+    assert [c["name"] for c in meta["coordParams"]] == ["spots", "bins_004um"]
+    assert {f["name"]: f["coordName"] for f in meta["featParams"]} == {
+        "Gene expression 008um": "spots",
+        "Gene expression 004um": "bins_004um",
+    }
+
+
+def test_polygon_centroids(tmp_path: Path) -> None:
+    def polygon(*rings: list[list[float]]) -> dict:
+        return {"type": "Polygon", "coordinates": list(rings)}
+
+    square = [[0, 0], [2, 0], [2, 2], [0, 2], [0, 0]]
+    triangle = [[0, 0], [3, 0], [0, 3], [0, 0]]
+    features = [
+        {"type": "Feature", "geometry": polygon(square), "properties": {"cell_id": 1}},
+        {"type": "Feature", "geometry": polygon(triangle), "properties": {"cell_id": 2}},
+        {  # two parts, weighted by area: a unit square at (10, 0) and a 2 x 2 square at (0, 10)
+            "type": "Feature",
+            "geometry": {
+                "type": "MultiPolygon",
+                "coordinates": [
+                    [[[10, 0], [11, 0], [11, 1], [10, 1], [10, 0]]],
+                    [[[0, 10], [2, 10], [2, 12], [0, 12], [0, 10]]],
+                ],
+            },
+            "properties": {"cell_id": 3},
+        },
+        {"type": "Feature", "geometry": polygon([[5, 5], [7, 5], [5, 5]]), "properties": {"cell_id": 4}},
+        {"type": "Feature", "geometry": polygon(square), "properties": {}},  # no cell_id: skipped
+    ]
+    path = tmp_path / "cells.geojson.gz"
+    with gzip.open(path, "wt") as fh:
+        json.dump({"type": "FeatureCollection", "features": features}, fh)
+
+    centroids = visium_hd._polygon_centroids(path)
+
+    assert list(centroids.index) == [1, 2, 3, 4]
+    expected = [[1, 1], [1, 1], [(10.5 + 4 * 1) / 5, (0.5 + 4 * 11) / 5], [17 / 3, 5]]
+    np.testing.assert_allclose(centroids[["x", "y"]].to_numpy(), expected)
+
+
+def test_polygon_centroids_of_zero_area_cells(tmp_path: Path, capsys: pytest.CaptureFixture[str]) -> None:
+    def cell(cell_id: int, *polygons: list[list[list[float]]]) -> dict:
+        geometry = {"type": "MultiPolygon", "coordinates": list(polygons)}
+        return {"type": "Feature", "geometry": geometry, "properties": {"cell_id": cell_id}}
+
+    ccw = [[0.1, 0.1], [1.1, 0.1], [1.1, 1.1], [0.1, 1.1], [0.1, 0.1]]
+    features = [
+        cell(1, [[[0.1, 0.3], [0.4, 0.6], [0.7, 0.9], [0.1, 0.3]]]),  # collinear: rounds to a tiny area
+        cell(2, [ccw], [[[x + 2, y] for x, y in reversed(ccw)]]),  # opposite windings cancel out
+        cell(3, []),  # no vertices: dropped
+        cell(4, [ccw]),
+    ]
+    path = tmp_path / "cells.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}))
+
+    centroids = visium_hd._polygon_centroids(path)
+
+    assert list(centroids.index) == [1, 2, 4]
+    expected = [[0.325, 0.525], [1.5, 0.5], [0.6, 0.6]]  # mean vertices (closing one included), area centroid
+    np.testing.assert_allclose(centroids[["x", "y"]].to_numpy(), expected)
+    assert "skipping 1 cell polygons without vertices" in capsys.readouterr().out
+
+
+def test_iter_geojson_features_streams_across_reads(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(visium_hd, "GEOJSON_READ_SIZE", 7)
+    features = [{"type": "Feature", "properties": {"cell_id": i}, "geometry": None} for i in range(5)]
+    path = tmp_path / "cells.geojson"
+    path.write_text(json.dumps({"type": "FeatureCollection", "features": features}, indent=1))
+
+    assert list(visium_hd._iter_geojson_features(path)) == features
+
+
+def test_read_segmented_cells(run: Path) -> None:
+    seg = run / "segmented_outputs"
+    write_10x_h5(
+        seg / "filtered_feature_cell_matrix.h5",
+        np.array([[1, 0, 0], [0, 3, 1]], dtype=np.int32),
+        ["cellid_000000012-1", "cellid_000000003-1"],
+    )
+    features = [
+        {
+            "type": "Feature",
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "properties": {"cell_id": i},
+        }
+        for i, ring in [
+            (3, [[0, 0], [4, 0], [4, 4], [0, 4], [0, 0]]),
+            (12, [[10, 10], [12, 10], [12, 12], [10, 12], [10, 10]]),
+            (99, [[0, 0], [1, 0], [1, 1], [0, 0]]),  # a polygon without a matrix column is ignored
+        ]
+    ]
+    collection = {"type": "FeatureCollection", "features": features}
+    (seg / "cell_segmentations.geojson").write_text(json.dumps(collection))
+
+    sample = visium_hd.read(Namespace(folder=run, pixel_size=None, segmented=True, bin_sizes=None))
+
+    assert sample.coords_name == "cells" and sample.mpp == pytest.approx(0.5e-6)
+    assert sample.coords.loc["cellid_000000012-1"].tolist() == [11, 11]
+    assert sample.coords.loc["cellid_000000003-1"].tolist() == [2, 2]
+    assert list(sample.features[0].df.columns) == ["g1", "g2"]